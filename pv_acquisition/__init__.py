@@ -0,0 +1,46 @@
+"""Building blocks for real-time acquisition of photovoltaic data with a LabJack T7.
+
+The names below are imported from their module on first access, so importing
+the package (e.g. for ``python -m pv_acquisition``) loads nothing until a
+command needs it.
+"""
+
+import importlib
+
+_EXPORTS = {
+    "adaptive": ["AdaptiveRate"],
+    "aggregate": ["AggregateRecord", "AggregationEngine"],
+    "archive": ["ArchiveWriter", "read_archive"],
+    "calibration": ["Calibration", "ChannelCalibration", "channel_calibration", "load_calibration"],
+    "channels": ["BatchedReader", "Channel", "ChannelMap", "DEFAULT_CHANNELS", "load_channel_map"],
+    "dashboard": ["Dashboard", "LiveBuffer", "lttb"],
+    "device": ["StreamAcquisition", "StreamBlock", "load_ljm", "open_device"],
+    "metrics": ["MetricsRegistry", "MetricsServer"],
+    "pipeline": ["AcquisitionPipeline", "DeadlineScheduler", "RingQueue", "Sample", "StreamPipeline"],
+    "plotting": ["HeadlessPlot", "LivePlot", "create_plot"],
+    "recovery": ["Backoff", "DeviceUnavailable", "DurableStoreWriter", "Gap", "ReconnectingReader",
+                 "SampleLog"],
+    "ringbuffer": ["RingBuffer"],
+    "simulator": ["FakeLJM", "RecordedSignal", "time_scaled"],
+    "solar": ["SolarSchedule"],
+    "storage": ["BatchWriter", "BufferedSQLiteWriter"],
+    "store": ["StoreWriter", "TimeSeriesStore", "import_legacy_db", "read_legacy_db"],
+    "supervisor": ["DeviceConfig", "DeviceSupervisor", "device_config", "load_device_configs",
+                   "supervise_into_store"],
+}
+_MODULES = {name: module for module, names in _EXPORTS.items() for name in names}
+
+__all__ = sorted(_MODULES)
+
+
+def __getattr__(name):
+    module = _MODULES.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value  # later lookups skip __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
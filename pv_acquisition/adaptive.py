@@ -0,0 +1,75 @@
+"""Adaptive sampling interval driven by changes of current and voltage between readings."""
+
+import math
+
+
+class AdaptiveRate:
+    """Pick the interval before the next reading from the readings seen so far.
+
+    ``intervals`` are the allowed sampling intervals in seconds. When the
+    current or voltage changes by more than ``current_threshold`` (A) or
+    ``voltage_threshold`` (V) between two consecutive readings, sampling jumps
+    straight to the shortest interval to follow the transient (passing
+    clouds). The change is not divided by the time between the readings: a
+    rate threshold would need a full-scale step to trigger at the 60 s level,
+    so a cloud would never bring sampling back down. After
+    ``steady_samples`` readings in a row below both thresholds it steps back
+    one level at a time to the longest interval. With a SolarSchedule, readings
+    within ``twilight_minutes`` of sunrise or sunset never use an interval
+    shorter than ``twilight_interval`` (default: the longest), since there is
+    little power to measure then. The sunrise/sunset times come from the
+    schedule's precomputed table, so nothing is computed with ephem per reading.
+    """
+
+    def __init__(self, intervals=(1.0, 5.0, 15.0, 60.0), initial=None, current_threshold=0.15,
+                 voltage_threshold=1.0, steady_samples=6, current_index=0, voltage_index=1,
+                 schedule=None, twilight_minutes=30, twilight_interval=None):
+        self.intervals = sorted(float(interval) for interval in intervals)
+        if not self.intervals or self.intervals[0] <= 0:
+            raise ValueError("intervals must be positive")
+        if initial is None:
+            initial = self.intervals[len(self.intervals) // 2]
+        self.level = min(range(len(self.intervals)), key=lambda i: abs(self.intervals[i] - initial))
+        self.current_threshold = current_threshold
+        self.voltage_threshold = voltage_threshold
+        self.steady_samples = steady_samples
+        self.current_index = current_index
+        self.voltage_index = voltage_index
+        self.schedule = schedule
+        self.twilight = twilight_minutes * 60.0
+        self.twilight_interval = (twilight_interval if twilight_interval is not None
+                                  else self.intervals[-1])
+        self.transients = 0
+        self._steady = 0
+        self._last = None
+
+    @property
+    def interval(self):
+        return self.intervals[self.level]
+
+    def update(self, timestamp, values):
+        """Take one reading (epoch seconds, channel values) and return the next interval."""
+        current = float(values[self.current_index])
+        voltage = float(values[self.voltage_index])
+        if self._last is not None:
+            last_current, last_voltage = self._last
+            # NaN comparisons are False: a missing value is not a transient
+            if (abs(current - last_current) > self.current_threshold
+                    or abs(voltage - last_voltage) > self.voltage_threshold):
+                self.transients += 1
+                self._steady = 0
+                self.level = 0
+            else:
+                self._steady += 1
+                if self._steady >= self.steady_samples and self.level < len(self.intervals) - 1:
+                    self.level += 1
+                    self._steady = 0
+        if not (math.isnan(current) and math.isnan(voltage)):
+            self._last = (current, voltage)
+
+        interval = self.interval
+        if self.schedule is not None:
+            distance = self.schedule.sun_event_distance(timestamp)
+            if distance is not None and distance < self.twilight:
+                interval = max(interval, self.twilight_interval)
+        return interval
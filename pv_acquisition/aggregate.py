@@ -0,0 +1,143 @@
+"""Online per-minute/per-hour statistics and energy of the PV string."""
+
+import collections
+
+import numpy as np
+
+QUANTITIES = ("current", "voltage", "power")
+
+# Statistics of one time bucket; times in epoch milliseconds, energy in watt-hours
+AggregateRecord = collections.namedtuple(
+    "AggregateRecord",
+    ["period", "start_ms", "count"]
+    + [f"{quantity}_{stat}" for quantity in QUANTITIES for stat in ("min", "max", "mean")]
+    + ["energy_wh"],
+)
+
+
+class _Bucket:
+    def __init__(self, start):
+        self.start = start
+        self.count = 0
+        self.valid = np.zeros(3)
+        self.sums = np.zeros(3)
+        self.mins = np.full(3, np.nan)
+        self.maxs = np.full(3, np.nan)
+        self.energy = 0.0
+
+    def update(self, quantities, energy):
+        valid = ~np.isnan(quantities)
+        self.count += len(quantities)
+        self.valid += valid.sum(axis=0)
+        self.sums += np.where(valid, quantities, 0.0).sum(axis=0)
+        # fmin/fmax ignore NaN (missing samples) without warnings
+        self.mins = np.fmin(self.mins, np.fmin.reduce(quantities, axis=0))
+        self.maxs = np.fmax(self.maxs, np.fmax.reduce(quantities, axis=0))
+        self.energy += float(energy.sum())
+
+    def record(self, period):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = np.where(self.valid > 0, self.sums / self.valid, np.nan)
+        stats = []
+        for i in range(3):
+            stats += [float(self.mins[i]), float(self.maxs[i]), float(means[i])]
+        return AggregateRecord(period, int(round(self.start * 1000)), self.count, *stats, self.energy)
+
+
+class BucketAggregator:
+    """Min/max/mean and energy over consecutive buckets of ``period`` seconds.
+
+    Buckets are aligned on multiples of the period in epoch time. Each sample
+    only updates running sums and extrema, so the cost per sample is constant;
+    a record is emitted when the first sample of the next bucket arrives.
+    """
+
+    def __init__(self, period):
+        self.period = period
+        self._bucket = None
+
+    def add_block(self, timestamps, quantities, energy):
+        """Add samples (time order) and return the records of the buckets they completed."""
+        completed = []
+        keys = np.floor(timestamps / self.period) * self.period
+        # Runs of consecutive samples falling in the same bucket
+        boundaries = np.flatnonzero(np.diff(keys)) + 1
+        for run in np.split(np.arange(len(keys)), boundaries):
+            if not len(run):
+                continue
+            key = keys[run[0]]
+            if self._bucket is not None and self._bucket.start != key:
+                completed.append(self._bucket.record(self.period))
+                self._bucket = None
+            if self._bucket is None:
+                self._bucket = _Bucket(key)
+            self._bucket.update(quantities[run], energy[run])
+        return completed
+
+    def flush(self):
+        """Return the record of the current, partly filled bucket (if any) and reset."""
+        if self._bucket is None:
+            return []
+        record = self._bucket.record(self.period)
+        self._bucket = None
+        return [record]
+
+
+class AggregationEngine:
+    """Feed raw samples, get per-period statistics of current, voltage and power plus energy.
+
+    Power is current x voltage. Energy is integrated with the trapezoidal rule
+    between consecutive samples and credited to the bucket of the later sample.
+    Intervals longer than ``max_gap`` seconds (night, outages) are not
+    integrated, and neither are intervals touching a missing value.
+    """
+
+    def __init__(self, periods=(60, 3600), current_index=0, voltage_index=1, max_gap=300.0):
+        self.aggregators = [BucketAggregator(period) for period in periods]
+        self.current_index = current_index
+        self.voltage_index = voltage_index
+        self.max_gap = max_gap
+        self.energy_wh = 0.0
+        self._last_time = None
+        self._last_power = None
+
+    def add_block(self, timestamps, values):
+        """Add a block of samples (timestamps in epoch seconds, values (n, channels))."""
+        timestamps = np.asarray(timestamps, dtype=np.float64).reshape(-1)
+        if not len(timestamps):
+            return []
+        values = np.asarray(values, dtype=np.float64).reshape(len(timestamps), -1)
+        current = values[:, self.current_index]
+        voltage = values[:, self.voltage_index]
+        power = current * voltage
+        quantities = np.column_stack((current, voltage, power))
+
+        # Trapezoid between each sample and the one before it (carried over between blocks)
+        previous_time = np.concatenate(([np.nan if self._last_time is None else self._last_time],
+                                        timestamps[:-1]))
+        previous_power = np.concatenate(([np.nan if self._last_power is None else self._last_power],
+                                         power[:-1]))
+        dt = timestamps - previous_time
+        energy = (power + previous_power) / 2.0 * dt / 3600.0
+        energy[~((dt > 0) & (dt <= self.max_gap)) | np.isnan(energy)] = 0.0
+        self.energy_wh += float(energy.sum())
+        self._last_time = timestamps[-1]
+        self._last_power = power[-1]
+
+        completed = []
+        for aggregator in self.aggregators:
+            completed += aggregator.add_block(timestamps, quantities, energy)
+        return completed
+
+    def add_samples(self, samples):
+        if not samples:
+            return []
+        return self.add_block([sample.timestamp for sample in samples],
+                              [sample.values for sample in samples])
+
+    def flush(self):
+        """Records of all partly filled buckets, e.g. at the end of the day."""
+        records = []
+        for aggregator in self.aggregators:
+            records += aggregator.flush()
+        return records
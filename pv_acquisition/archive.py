@@ -0,0 +1,141 @@
+"""Columnar daily archive written in chunks during acquisition.
+
+Data goes to Parquet when pyarrow is installed, otherwise to a compressed NPZ
+file. Both hold a float64 ``timestamp`` column (epoch seconds) and one float32
+column per channel, and both can be read back column by column.
+"""
+
+import importlib.util
+import os
+import zipfile
+
+import numpy as np
+
+PARQUET = "parquet"
+NPZ = "npz"
+
+
+def has_pyarrow():
+    # Only looked up: pyarrow is imported when the first chunk is written
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def _arrow_array(pa, array):
+    """Wrap a NumPy column without copying; pa.array() would probe for (and import) pandas."""
+    array = np.ascontiguousarray(array)
+    return pa.Array.from_buffers(pa.from_numpy_dtype(array.dtype), len(array),
+                                 [None, pa.py_buffer(array)])
+
+
+class ArchiveWriter:
+    """Append acquisition chunks to a columnar file instead of dumping a spreadsheet at sunset.
+
+    Rows are buffered and written every ``chunk_rows`` rows (and on flush or
+    close): as one row group in Parquet, or as one set of arrays appended to the
+    NPZ zip. Memory use is bounded by the chunk size, not the length of the day.
+    """
+
+    def __init__(self, path_base, columns=("current", "voltage"), chunk_rows=10000,
+                 archive_format=None, compression="zstd"):
+        if archive_format is None:
+            archive_format = PARQUET if has_pyarrow() else NPZ
+        if archive_format not in (PARQUET, NPZ):
+            raise ValueError(f"Unknown archive format {archive_format}")
+        self.format = archive_format
+        self.path = f"{path_base}.{archive_format}"
+        self.columns = list(columns)
+        self.chunk_rows = chunk_rows
+        self.compression = compression
+        self.rows_written = 0
+        self.chunks_written = 0
+        self._timestamps = []
+        self._values = []
+        self._buffered = 0
+        self._parquet_writer = None
+
+    def append(self, timestamps, values):
+        """Add a block: timestamps with shape (n,) and values with shape (n, len(columns))."""
+        timestamps = np.asarray(timestamps, dtype=np.float64).reshape(-1)
+        values = np.asarray(values, dtype=np.float32).reshape(len(timestamps), len(self.columns))
+        self._timestamps.append(timestamps)
+        self._values.append(values)
+        self._buffered += len(timestamps)
+        if self._buffered >= self.chunk_rows:
+            self.flush()
+
+    def append_samples(self, samples):
+        if samples:
+            self.append([sample.timestamp for sample in samples],
+                        [sample.values for sample in samples])
+
+    def flush(self):
+        if not self._buffered:
+            return
+        timestamps = np.concatenate(self._timestamps)
+        values = np.concatenate(self._values)
+        if self.format == PARQUET:
+            self._write_parquet(timestamps, values)
+        else:
+            self._write_npz(timestamps, values)
+        self.rows_written += len(timestamps)
+        self.chunks_written += 1
+        self._timestamps = []
+        self._values = []
+        self._buffered = 0
+
+    def close(self):
+        self.flush()
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+            self._parquet_writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _write_parquet(self, timestamps, values):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        arrays = ([_arrow_array(pa, timestamps)]
+                  + [_arrow_array(pa, values[:, i]) for i in range(len(self.columns))])
+        table = pa.Table.from_arrays(arrays, names=["timestamp"] + self.columns)
+        if self._parquet_writer is None:
+            self._parquet_writer = pq.ParquetWriter(self.path, table.schema,
+                                                    compression=self.compression)
+        self._parquet_writer.write_table(table)
+
+    def _write_npz(self, timestamps, values):
+        # An NPZ file is a zip of .npy members, so chunks can be appended as new members
+        chunk = f"{self.chunks_written:05d}"
+        mode = "a" if os.path.exists(self.path) else "w"
+        with zipfile.ZipFile(self.path, mode, compression=zipfile.ZIP_DEFLATED) as archive:
+            members = [("timestamp", timestamps)] + [(name, values[:, i])
+                                                     for i, name in enumerate(self.columns)]
+            for name, array in members:
+                with archive.open(f"{name}.{chunk}.npy", "w", force_zip64=True) as member:
+                    np.lib.format.write_array(member, np.ascontiguousarray(array),
+                                              allow_pickle=False)
+
+
+def read_archive(path, columns=None):
+    """Read an archive back as a dict of NumPy arrays, loading only the requested columns.
+
+    ``timestamp`` is always included.
+    """
+    wanted = None if columns is None else ["timestamp"] + [c for c in columns if c != "timestamp"]
+    if path.endswith("." + PARQUET):
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(path, columns=wanted)
+        return {name: table.column(name).to_numpy() for name in table.column_names}
+
+    chunks = {}
+    with np.load(path, allow_pickle=False) as archive:
+        for member in sorted(archive.files):
+            name, _ = member.rsplit(".", 1)
+            if wanted is None or name in wanted:
+                chunks.setdefault(name, []).append(archive[member])
+    return {name: np.concatenate(arrays) for name, arrays in chunks.items()}
@@ -0,0 +1,334 @@
+"""Throughput and latency benchmarks of the acquisition stages on the simulated LabJack.
+
+Run ``python -m pv_acquisition benchmark`` (``--help`` for the options). Every
+stage is run on its own against FakeLJM, fed with the synthetic day or with a
+replay of recorded runs, and reports samples per second, latency percentiles,
+CPU use and resident memory. ``--json`` saves the results so that a later run
+can be compared against them with ``--compare`` before deploying to the field.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from .aggregate import AggregationEngine
+from .archive import ArchiveWriter
+from .channels import BatchedReader, ChannelMap
+from .device import StreamAcquisition
+from .pipeline import AcquisitionPipeline, Sample
+from .simulator import FakeLJM, RecordedSignal, synthetic_pv_signal, time_scaled
+from .store import TimeSeriesStore
+
+STAGES = ("read", "stream", "pipeline", "store", "archive", "aggregate", "plot")
+
+
+def rss_mb():
+    """Resident set size of this process in MiB (None if it cannot be measured)."""
+    try:
+        with open("/proc/self/statm", "r") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    # Peak rather than current RSS; kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if peak > 2 ** 32 else peak / 2 ** 10
+
+
+def percentiles(seconds):
+    """p50/p95/p99/max of durations given in seconds, in milliseconds."""
+    if not len(seconds):
+        return None
+    values = np.asarray(seconds, dtype=np.float64) * 1000.0
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50": float(p50), "p95": float(p95), "p99": float(p99), "max": float(values.max())}
+
+
+def _measure(name, run):
+    """Run one stage and add wall time, throughput, CPU and RSS to the dict it returns."""
+    rss_before = rss_mb()
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    result = run()
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    rss_after = rss_mb()
+    result["stage"] = name
+    result["seconds"] = wall
+    result["samples_per_s"] = result["samples"] / wall if wall > 0 else None
+    result["cpu_percent"] = 100.0 * cpu / wall if wall > 0 else None
+    result["rss_mb"] = rss_after
+    result["rss_delta_mb"] = (rss_after - rss_before
+                              if rss_after is not None and rss_before is not None else None)
+    return result
+
+
+def simulated_samples(signal, channel_map, count, interval, start=None):
+    """Timestamps and scaled values of ``count`` samples taken every ``interval`` seconds."""
+    start = time.time() if start is None else start
+    timestamps = start + np.arange(count) * interval
+    raw = np.column_stack([np.asarray(signal(channel.ain, timestamps), dtype=np.float64)
+                           * np.ones(count) for channel in channel_map.channels])
+    return timestamps, channel_map.calibration.apply(raw)
+
+
+# Stages
+def bench_read(ljm, channel_map, count):
+    """Back-to-back BatchedReader reads (one eReadAddresses call each)."""
+    handle = ljm.openS("ANY", "ANY", "ANY")
+    reader = BatchedReader(ljm, handle, channel_map)
+    latencies = np.empty(count)
+    for i in range(count):
+        start = time.perf_counter()
+        reader.read()
+        latencies[i] = time.perf_counter() - start
+    ljm.close(handle)
+    return {"samples": count, "latency_ms": percentiles(latencies)}
+
+
+def bench_stream(ljm, channel_map, count, scan_rate=1000, scans_per_read=500):
+    """Stream mode blocks converted to calibrated NumPy arrays (device clock timestamps)."""
+    handle = ljm.openS("ANY", "ANY", "ANY")
+    latencies = []
+    samples = 0
+    with StreamAcquisition(ljm, handle, channel_map, scan_rate=scan_rate,
+                           scans_per_read=scans_per_read) as stream:
+        while samples < count:
+            start = time.perf_counter()
+            block = stream.read()
+            latencies.append(time.perf_counter() - start)
+            samples += len(block.timestamps)
+    ljm.close(handle)
+    return {"samples": samples, "latency_ms": percentiles(latencies)}
+
+
+def bench_pipeline(ljm, channel_map, interval, duration):
+    """Scheduled reads through AcquisitionPipeline to a consumer thread.
+
+    Latency runs from the scheduled tick to the moment the consumer gets the
+    sample; jitter is how far the spacing of the actual reads strays from the
+    interval.
+    """
+    handle = ljm.openS("ANY", "ANY", "ANY")
+    reader = BatchedReader(ljm, handle, channel_map)
+    read_times = []
+    latencies = []
+
+    def read():
+        read_times.append(time.monotonic())
+        return reader.read()
+
+    def consume(samples):
+        now = time.time()
+        latencies.extend(now - sample.timestamp for sample in samples)
+
+    pipeline = AcquisitionPipeline(read, interval)
+    pipeline.add_worker("consumer", consume, poll_interval=0.05)
+    pipeline.start()
+    time.sleep(duration)
+    pipeline.stop()
+    ljm.close(handle)
+    stats = pipeline.stats()
+    return {"samples": stats["samples"],
+            "latency_ms": percentiles(latencies),
+            "jitter_ms": percentiles(np.abs(np.diff(read_times) - interval)),
+            "missed_ticks": stats["missed_ticks"],
+            "dropped": stats["queues"]["consumer"]["dropped"]}
+
+
+def bench_store(timestamps, values, names, directory, batch_size=500):
+    """Rows written through StoreWriter into a fresh TimeSeriesStore."""
+    store = TimeSeriesStore(os.path.join(directory, "benchmark.db"), channels=names)
+    writer = store.writer(batch_size=batch_size, flush_interval=1.0).start()
+    ts_ms = np.round(timestamps * 1000).astype(np.int64).tolist()
+    rows = [(ts,) + tuple(row) for ts, row in zip(ts_ms, values.tolist())]
+    latencies = []
+    for i in range(0, len(rows), batch_size):
+        start = time.perf_counter()
+        writer.write_many(rows[i:i + batch_size])
+        latencies.append(time.perf_counter() - start)
+    writer.close()
+    store.close()
+    return {"samples": writer.rows_written, "latency_ms": percentiles(latencies),
+            "errors": writer.errors}
+
+
+def bench_archive(timestamps, values, names, directory, block=500):
+    """Blocks appended to the daily archive (Parquet, or NPZ without pyarrow)."""
+    archive = ArchiveWriter(os.path.join(directory, "benchmark"), columns=names)
+    latencies = []
+    for i in range(0, len(timestamps), block):
+        start = time.perf_counter()
+        archive.append(timestamps[i:i + block], values[i:i + block])
+        latencies.append(time.perf_counter() - start)
+    archive.close()
+    return {"samples": len(timestamps), "latency_ms": percentiles(latencies),
+            "format": archive.format}
+
+
+def bench_aggregate(timestamps, values, block=500):
+    """Per-minute/per-hour statistics and energy over blocks of samples."""
+    engine = AggregationEngine(periods=(60, 3600))
+    latencies = []
+    for i in range(0, len(timestamps), block):
+        start = time.perf_counter()
+        engine.add_block(timestamps[i:i + block], values[i:i + block])
+        latencies.append(time.perf_counter() - start)
+    engine.flush()
+    return {"samples": len(timestamps), "latency_ms": percentiles(latencies)}
+
+
+def bench_plot(timestamps, values, window=80):
+    """LivePlot redraws on the Agg backend, one new sample per frame."""
+    import matplotlib
+    matplotlib.use("Agg")
+    from .plotting import LivePlot
+
+    plot = LivePlot(window=window, max_fps=None)
+    latencies = []
+    for timestamp, row in zip(timestamps, values):
+        start = time.perf_counter()
+        plot.add_samples([Sample(timestamp, row)])
+        plot.refresh()
+        latencies.append(time.perf_counter() - start)
+    plot.close()
+    return {"samples": len(timestamps), "latency_ms": percentiles(latencies),
+            "full_draws": plot.full_draws, "blits": plot.blits}
+
+
+def run_benchmarks(stages=STAGES, signal=None, channel_map=None, count=20000, interval=0.01,
+                   duration=5.0, read_latency=0.0, plot_frames=200):
+    """Run the selected stages one after the other and return their results."""
+    signal = signal if signal is not None else synthetic_pv_signal
+    channel_map = channel_map if channel_map is not None else ChannelMap()
+    ljm = FakeLJM(signal, realtime=False, read_latency=read_latency)
+    timestamps, values = simulated_samples(signal, channel_map, count, interval)
+    directory = tempfile.mkdtemp(prefix="pv_benchmark_")
+
+    runs = {
+        "read": lambda: bench_read(ljm, channel_map, count),
+        "stream": lambda: bench_stream(ljm, channel_map, count),
+        "pipeline": lambda: bench_pipeline(ljm, channel_map, interval, duration),
+        "store": lambda: bench_store(timestamps, values, channel_map.names, directory),
+        "archive": lambda: bench_archive(timestamps, values, channel_map.names, directory),
+        "aggregate": lambda: bench_aggregate(timestamps, values),
+        "plot": lambda: bench_plot(timestamps[:plot_frames], values[:plot_frames]),
+    }
+    results = []
+    try:
+        for stage in stages:
+            try:
+                results.append(_measure(stage, runs[stage]))
+            except ImportError as e:
+                print(f"Skipping the {stage} benchmark:", str(e))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+
+def format_results(results):
+    def number(value, digits=1):
+        return "-" if value is None else f"{value:.{digits}f}"
+
+    lines = [f"{'stage':<10}{'samples/s':>12}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+             f"{'jitter p99':>12}{'CPU %':>8}{'RSS MiB':>9}"]
+    for result in results:
+        latency = result.get("latency_ms") or {}
+        jitter = result.get("jitter_ms") or {}
+        lines.append(f"{result['stage']:<10}{number(result['samples_per_s'], 0):>12}"
+                     f"{number(latency.get('p50'), 3):>9}{number(latency.get('p99'), 3):>9}"
+                     f"{number(latency.get('max'), 3):>9}{number(jitter.get('p99'), 3):>12}"
+                     f"{number(result['cpu_percent']):>8}{number(result['rss_mb']):>9}")
+    return "\n".join(lines)
+
+
+def compare_results(results, baseline, threshold=0.1):
+    """Compare results with a baseline run (as saved by ``--json``), stage by stage.
+
+    ``slowdown`` is the baseline throughput divided by the current one and
+    ``p99_ratio`` the current p99 latency divided by the baseline's, so values
+    above 1 are worse. A stage is ``slower`` when either exceeds 1 + threshold.
+    Stages missing from the baseline are left out.
+    """
+    def ratio(numerator, denominator):
+        if numerator is None or not denominator:
+            return None
+        return numerator / denominator
+
+    previous = {result["stage"]: result for result in baseline}
+    comparison = []
+    for result in results:
+        before = previous.get(result["stage"])
+        if before is None:
+            continue
+        slowdown = ratio(before["samples_per_s"], result["samples_per_s"])
+        p99_ratio = ratio((result.get("latency_ms") or {}).get("p99"),
+                          (before.get("latency_ms") or {}).get("p99"))
+        slower = any(value is not None and value > 1 + threshold for value in (slowdown, p99_ratio))
+        comparison.append({"stage": result["stage"], "slowdown": slowdown, "p99_ratio": p99_ratio,
+                           "slower": slower})
+    return comparison
+
+
+def format_comparison(comparison):
+    def number(value):
+        return "-" if value is None else f"{value:.2f}x"
+
+    lines = [f"{'stage':<10}{'slowdown':>10}{'p99 ratio':>11}"]
+    for entry in comparison:
+        lines.append(f"{entry['stage']:<10}{number(entry['slowdown']):>10}{number(entry['p99_ratio']):>11}"
+                     + ("  SLOWER" if entry["slower"] else ""))
+    return "\n".join(lines)
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description=__doc__.splitlines()[0])
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--count", type=int, default=20000, help="samples per throughput stage")
+    parser.add_argument("--interval", type=float, default=0.01,
+                        help="sampling interval of the pipeline stage (seconds)")
+    parser.add_argument("--duration", type=float, default=5.0,
+                        help="length of the pipeline stage (seconds)")
+    parser.add_argument("--read-latency", type=float, default=0.0,
+                        help="simulated device round trip per read (seconds)")
+    parser.add_argument("--replay", nargs="+", metavar="DB",
+                        help="replay recorded Muhammed_<datetime>.db runs instead of the synthetic day")
+    parser.add_argument("--speed", type=float, default=1.0, help="play the signal this many times faster")
+    parser.add_argument("--json", metavar="PATH", help="also save the results to this JSON file")
+    parser.add_argument("--compare", metavar="BASELINE", help="compare with the results saved by --json")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="relative slowdown reported as a regression (default: 0.1)")
+    args = parser.parse_args(argv)
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as file:
+            baseline = json.load(file)
+
+    signal = RecordedSignal(args.replay) if args.replay else synthetic_pv_signal
+    if args.speed != 1.0:
+        signal = time_scaled(signal, args.speed)
+    results = run_benchmarks(args.stages, signal, count=args.count, interval=args.interval,
+                             duration=args.duration, read_latency=args.read_latency)
+    print(format_results(results))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+        print("Results saved to", args.json)
+    if baseline is not None:
+        comparison = compare_results(results, baseline, args.threshold)
+        print(format_comparison(comparison))
+        slower = [entry["stage"] for entry in comparison if entry["slower"]]
+        if slower:
+            raise SystemExit(f"Slower than {args.compare}: {', '.join(slower)}")
+
+
+if __name__ == "__main__":
+    main()
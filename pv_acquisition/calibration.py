@@ -0,0 +1,118 @@
+"""Per-channel calibration applied to whole NumPy blocks of raw readings."""
+
+import collections
+import json
+
+import numpy as np
+
+# Calibration of one channel, from the raw AIN volts x to engineering units:
+#   value = offset + gain * (c0 + c1 * x + c2 * x**2 + ...)
+# with polynomial = (c0, c1, ...) defaulting to (0, 1), i.e. value = offset + gain * x.
+# With a temperature coefficient the value is then multiplied by
+#   1 + temperature_coefficient * (T - reference_temperature)
+# where T is the (calibrated) reading of the temperature channel in the same scan.
+ChannelCalibration = collections.namedtuple(
+    "ChannelCalibration",
+    ["gain", "offset", "polynomial", "temperature_coefficient", "reference_temperature"],
+)
+
+
+def channel_calibration(gain=1.0, offset=0.0, polynomial=None, temperature_coefficient=0.0,
+                        reference_temperature=25.0):
+    polynomial = tuple(float(c) for c in polynomial) if polynomial else (0.0, 1.0)
+    return ChannelCalibration(float(gain), float(offset), polynomial, float(temperature_coefficient),
+                              float(reference_temperature))
+
+
+class Calibration:
+    """Calibration of every channel of a scan, compiled into coefficient arrays.
+
+    Gain and offset are folded into the polynomial coefficients, so apply()
+    evaluates one polynomial per channel with Horner's rule over the whole
+    block: one multiply-add per degree for all samples and channels at once,
+    without Python code per sample and without rounding. Purely linear
+    calibrations (the usual case) take a single multiply-add.
+    """
+
+    def __init__(self, names, calibrations, temperature_channel=None):
+        self.names = list(names)
+        self.calibrations = list(calibrations)
+        if len(self.calibrations) != len(self.names):
+            raise ValueError("One calibration per channel is needed")
+        self.temperature_channel = temperature_channel
+
+        degree = max(len(c.polynomial) for c in self.calibrations)
+        coefficients = np.zeros((degree, len(self.names)))
+        for i, calibration in enumerate(self.calibrations):
+            coefficients[:len(calibration.polynomial), i] = calibration.polynomial
+            coefficients[:, i] *= calibration.gain
+            coefficients[0, i] += calibration.offset
+        # Highest degree first for Horner's rule
+        self.coefficients = coefficients[::-1].copy()
+        self.temperature_coefficients = np.array([c.temperature_coefficient for c in self.calibrations])
+        self.reference_temperatures = np.array([c.reference_temperature for c in self.calibrations])
+
+        self.temperature_index = None
+        if temperature_channel is not None and self.temperature_coefficients.any():
+            self.temperature_index = self.names.index(temperature_channel)
+            if self.temperature_coefficients[self.temperature_index]:
+                raise ValueError("The temperature channel cannot be temperature compensated itself")
+        self.linear = degree <= 2 and self.temperature_index is None
+        if self.linear:
+            self.gains = self.coefficients[-2] if degree == 2 else np.zeros(len(self.names))
+            self.offsets = self.coefficients[-1]
+
+    @classmethod
+    def from_scales(cls, names, scales):
+        """Plain scale factors, the original ``data[1] * 18.22`` style scaling."""
+        return cls(names, [channel_calibration(gain=scale) for scale in scales])
+
+    def apply(self, raw):
+        """Calibrate raw readings of shape (channels,) or (samples, channels); returns float64."""
+        raw = np.asarray(raw, dtype=np.float64)
+        if self.linear:
+            return raw * self.gains + self.offsets
+        values = np.broadcast_to(self.coefficients[0], raw.shape).copy()
+        for coefficient in self.coefficients[1:]:
+            values *= raw
+            values += coefficient
+        if self.temperature_index is not None:
+            temperature = values[..., self.temperature_index:self.temperature_index + 1]
+            values *= 1.0 + self.temperature_coefficients * (temperature - self.reference_temperatures)
+        return values
+
+    def to_config(self):
+        return {"temperature_channel": self.temperature_channel,
+                "channels": {name: {"gain": c.gain, "offset": c.offset, "polynomial": list(c.polynomial),
+                                    "temperature_coefficient": c.temperature_coefficient,
+                                    "reference_temperature": c.reference_temperature}
+                             for name, c in zip(self.names, self.calibrations)}}
+
+
+def load_calibration(path, channel_map):
+    """Load the calibration of a channel map from a JSON file such as
+
+    {"temperature_channel": "module_temperature",
+     "channels": {"voltage": {"gain": 18.22, "offset": -0.004},
+                  "current": {"polynomial": [0.002, 0.998, 0.0011],
+                              "temperature_coefficient": -0.0004, "reference_temperature": 25}}}
+
+    Channels missing from the file keep their scale factor from the channel map.
+    """
+    with open(path, "r", encoding="utf-8") as file:
+        config = json.load(file)
+    entries = config.get("channels", {})
+    unknown = set(entries) - set(channel_map.names)
+    if unknown:
+        raise ValueError(f"Calibration for unknown channels {sorted(unknown)}")
+    calibrations = []
+    for channel in channel_map.channels:
+        entry = entries.get(channel.name)
+        if entry is None:
+            calibrations.append(channel_calibration(gain=channel.scale))
+            continue
+        calibrations.append(channel_calibration(entry.get("gain", 1.0), entry.get("offset", 0.0),
+                                                entry.get("polynomial"),
+                                                entry.get("temperature_coefficient", 0.0),
+                                                entry.get("reference_temperature", 25.0)))
+    return Calibration(channel_map.names, calibrations, config.get("temperature_channel"))
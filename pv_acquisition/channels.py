@@ -0,0 +1,105 @@
+"""Channel map configuration and batched command-response reads."""
+
+import collections
+import json
+import time
+
+import numpy as np
+
+from .calibration import Calibration
+
+# One measured quantity: which AIN it is wired to and how to scale the raw volts
+Channel = collections.namedtuple("Channel", ["name", "ain", "scale", "unit"])
+
+# Wiring of the original installation: current sensor on AIN0, voltage divider on AIN1
+DEFAULT_CHANNELS = [
+    Channel("current", 0, 1.0, "A"),
+    Channel("voltage", 1, 18.22, "V"),
+]
+
+
+class ChannelMap:
+    """Channels resolved once into LJM register names, addresses and a scale vector.
+
+    ``calibration`` turns raw readings into engineering values; it applies the
+    scale factors of the channels until a calibration file is loaded into it
+    (see calibration.load_calibration).
+    """
+
+    def __init__(self, channels=DEFAULT_CHANNELS):
+        self.channels = [Channel(*channel) if not isinstance(channel, Channel) else channel
+                         for channel in channels]
+        if not self.channels:
+            raise ValueError("Channel map is empty")
+        names = [channel.name for channel in self.channels]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Duplicate channel names in {names}")
+
+        self.names = names
+        self.units = [channel.unit for channel in self.channels]
+        self.register_names = [f"AIN{channel.ain}" for channel in self.channels]
+        self.scales = np.array([channel.scale for channel in self.channels], dtype=np.float64)
+        self.calibration = Calibration.from_scales(self.names, self.scales)
+        self.addresses = None
+        self.data_types = None
+
+    def __len__(self):
+        return len(self.channels)
+
+    def index(self, name):
+        return self.names.index(name)
+
+    def resolve(self, ljm):
+        """Look up register addresses and data types (done once, not per scan)."""
+        if self.addresses is None:
+            self.addresses, self.data_types = ljm.namesToAddresses(len(self.register_names),
+                                                                   self.register_names)
+        return self.addresses, self.data_types
+
+    def to_config(self):
+        return [channel._asdict() for channel in self.channels]
+
+
+def load_channel_map(path):
+    """Load a channel map from a JSON file holding a list of channel objects.
+
+    Example entry: {"name": "current", "ain": 0, "scale": 1.0, "unit": "A"}
+    """
+    with open(path, "r", encoding="utf-8") as file:
+        entries = json.load(file)
+    return ChannelMap([Channel(entry["name"], int(entry["ain"]), float(entry.get("scale", 1.0)),
+                               entry.get("unit", "V"))
+                       for entry in entries])
+
+
+class BatchedReader:
+    """Read every channel of a ChannelMap in a single eReadAddresses call per scan.
+
+    With a metrics registry the device round trip and the scaling are timed
+    separately (``pv_stage_seconds{stage="read"}`` and ``{stage="scale"}``).
+    """
+
+    def __init__(self, ljm, handle, channel_map=None, metrics=None):
+        self.ljm = ljm
+        self.handle = handle
+        self.channel_map = channel_map if channel_map is not None else ChannelMap()
+        self.addresses, self.data_types = self.channel_map.resolve(ljm)
+        self.count = len(self.addresses)
+        self._read_timer = metrics.stage_timer("read") if metrics is not None else None
+        self._scale_timer = metrics.stage_timer("scale") if metrics is not None else None
+
+    def read_raw(self):
+        return np.asarray(self.ljm.eReadAddresses(self.handle, self.count, self.addresses,
+                                                  self.data_types), dtype=np.float64)
+
+    def read(self):
+        """Return one scan as scaled engineering values (in channel map order)."""
+        if self._read_timer is None:
+            return self.channel_map.calibration.apply(self.read_raw())
+        start = time.perf_counter()
+        raw = self.read_raw()
+        read_done = time.perf_counter()
+        values = self.channel_map.calibration.apply(raw)
+        self._read_timer.observe(read_done - start)
+        self._scale_timer.observe(time.perf_counter() - read_done)
+        return values
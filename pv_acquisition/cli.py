@@ -0,0 +1,548 @@
+"""Command-line entry point: ``python -m pv_acquisition <command>`` (``--help`` for the options).
+
+- ``acquire``: read the LabJack every day from 5 minutes before sunrise to 5
+  minutes after sunset into the store and the daily archive, with the live
+  graph in one twin-axis figure or two figures (``--layout``), or without it
+  (``--headless``), in English or French (``--locale``), from scheduled
+  reads or from the device's hardware-timed stream (``--stream-rate``);
+- ``replay``: the same acquisition against FakeLJM playing recorded runs;
+- ``supervise``: several LabJacks of a JSON device file read concurrently into one store;
+- ``export``: samples or per-period statistics of the store to CSV, Parquet or NPZ;
+- ``benchmark``: the stage benchmarks of benchmark.py.
+
+Each command imports the modules it needs when it runs, so a headless
+acquisition starts without loading matplotlib, the dashboard web server or
+the simulator, and ``labjack.ljm`` is only imported to read a real device.
+"""
+
+import argparse
+import datetime
+import os
+import time
+
+# Plot labels, archive column names, pipeline queue names and messages of each locale
+LOCALES = {
+    "en": {
+        "labels": {},  # plotting.DEFAULT_LABELS
+        "columns": {},
+        "workers": ("storage", "display", "dashboard"),
+        "error": "An error occurred:",
+        "metrics": "Metrics available at",
+        "dashboard": "Dashboard available at",
+        "paused": "Data collection paused until:",
+        "started": "Data collection for {} in progress",
+        "statistics": "Acquisition statistics:",
+        "energy": "Energy produced:",
+        "saved": "Data collection complete. Data saved to {} and {}",
+    },
+    "fr": {
+        "labels": {"time": "Instant de mesure", "current": "Courant (Amperes)",
+                   "voltage": "Tension (Volts)", "title": "Graphique des données en temps réel",
+                   "current_title": "Graphique du courant en temps réel",
+                   "voltage_title": "Graphique de la tension en temps réel"},
+        "columns": {"current": "courant", "voltage": "tension", "interval_s": "intervalle_s"},
+        "workers": ("stockage", "affichage", "tableau_de_bord"),
+        "error": "Une erreur s'est produite :",
+        "metrics": "Métriques disponibles sur",
+        "dashboard": "Tableau de bord disponible sur",
+        "paused": "Collecte de données en pause jusqu'à :",
+        "started": "Collecte de données pour {} en cours",
+        "statistics": "Statistiques d'acquisition :",
+        "energy": "Énergie produite :",
+        "saved": "Les données ont été enregistrées dans {} et {}",
+    },
+}
+
+EXPORT_FORMATS = (".csv", ".parquet", ".npz")
+
+
+def load_channels(options):
+    """Channel map of the run with the calibration file applied if it exists."""
+    from .calibration import load_calibration
+    from .channels import ChannelMap, load_channel_map
+
+    channel_map = load_channel_map(options.channels) if options.channels else ChannelMap()
+    if options.calibration and os.path.exists(options.calibration):
+        # Calibrated values are computed for whole scans at once and stored at full precision
+        channel_map.calibration = load_calibration(options.calibration, channel_map)
+    # The statistics, the adaptive rate and the graph are computed from these two channels
+    missing = [name for name in ("current", "voltage") if name not in channel_map.names]
+    if missing:
+        raise SystemExit(f"{options.channels} has no {' or '.join(missing)} channel")
+    return channel_map
+
+
+def start_services(options):
+    """Metrics endpoint and optional dashboard, shared by every acquisition window of the run."""
+    from .metrics import MetricsRegistry, MetricsServer
+
+    text = LOCALES[options.locale]
+    metrics = MetricsRegistry()
+    if options.metrics_port:
+        print(text["metrics"], MetricsServer(metrics, port=options.metrics_port).start().url)
+
+    live = None
+    if options.dashboard_port:
+        from .dashboard import Dashboard, LiveBuffer
+
+        channel_map = load_channels(options)
+        live = LiveBuffer(channel_map.names, [channel.unit for channel in channel_map.channels])
+        dashboard = Dashboard(live, host=options.dashboard_host, port=options.dashboard_port)
+        print(text["dashboard"], dashboard.start().url)
+    return metrics, live
+
+
+def acquire_window(options, ljm, until, schedule=None, metrics=None, live=None):
+    """Acquire from now until ``until`` (epoch seconds) into the store and a new archive.
+
+    Scans are read on the (adaptive) schedule of an AcquisitionPipeline, or
+    with ``--stream-rate`` clocked by the device itself in stream mode.
+    """
+    from .aggregate import AggregationEngine
+    from .archive import ArchiveWriter
+    from .plotting import create_plot
+    from .store import TimeSeriesStore
+
+    text = LOCALES[options.locale]
+    channel_map = load_channels(options)
+    names = channel_map.names + ["interval_s"]
+
+    # One store for every run plus a columnar archive of the day named after the start time
+    current_datetime = datetime.datetime.now().strftime("%Y_%m_%d__%H_%M_%S")
+    store = TimeSeriesStore(options.database, channels=names)
+    archive = ArchiveWriter(f"{options.archive_prefix}_{current_datetime}",
+                            columns=[text["columns"].get(name, name) for name in names])
+    current, voltage = channel_map.index("current"), channel_map.index("voltage")
+    aggregates = AggregationEngine(periods=(60, 3600), current_index=current, voltage_index=voltage)
+
+    plot = create_plot(headless=options.headless, window=options.window, layout=options.layout,
+                       labels=text["labels"], current_ylim=tuple(options.current_ylim),
+                       voltage_ylim=tuple(options.voltage_ylim), max_fps=options.max_fps,
+                       current_index=current, voltage_index=voltage, metrics=metrics)
+    print(text["started"].format(current_datetime))
+
+    acquire_until = stream_until if options.stream_rate else sample_until
+    stats = acquire_until(options, ljm, channel_map, until, store, archive, aggregates, plot,
+                          schedule, metrics, live)
+    print(text["statistics"], stats)
+    plot.close()
+
+    store.write_aggregates(aggregates.flush())
+    store.close()
+    print(text["energy"], round(aggregates.energy_wh, 1), "Wh")
+
+    archive.close()
+    print(text["saved"].format(options.database, archive.path))
+
+
+def open_writer(options, store, metrics=None):
+    """Writer of the store's rows, after replaying the write-ahead log a crashed run left behind."""
+    from .recovery import DurableStoreWriter
+
+    # Rows are written in batches and logged first to the write-ahead log
+    writer = DurableStoreWriter(store, options.wal, batch_size=500, flush_interval=60,
+                                metrics=metrics, fsync_interval=options.wal_fsync_interval).start()
+    if writer.recovered_since_ms is not None:
+        # The previous run stopped before writing all its statistics, and the rows recovered from
+        # the log were never aggregated: recompute those buckets from the stored samples
+        store.rebuild_aggregates(writer.recovered_since_ms / 1000.0,
+                                 store.last_timestamp() / 1000.0 + 0.001)
+    return writer
+
+
+def sample_until(options, ljm, channel_map, until, store, archive, aggregates, plot, schedule=None,
+                 metrics=None, live=None):
+    """Scheduled command-response reads through an AcquisitionPipeline; returns its statistics."""
+    from .adaptive import AdaptiveRate
+    from .pipeline import AcquisitionPipeline
+    from .recovery import ReconnectingReader
+
+    text = LOCALES[options.locale]
+    storage_name, display_name, dashboard_name = text["workers"]
+
+    # The LabJack is opened by the first read and reopened with exponential backoff after a
+    # failure, so a device missing at sunrise is a gap like any other, not a crash
+    reader = ReconnectingReader(ljm, channel_map, metrics=metrics)
+    writer = open_writer(options, store, metrics)
+
+    def store_samples(samples):
+        rows = [(round(sample.timestamp * 1000),) + tuple(sample.values.tolist()) + (sample.interval,)
+                for sample in samples]
+        writer.write_many(rows)
+        archive.append([sample.timestamp for sample in samples], [row[1:] for row in rows])
+        records = aggregates.add_samples(samples)
+        store.write_aggregates(records)
+        if live is not None:
+            live.add_aggregates(records, aggregates.energy_wh)
+
+    rate = None
+    if options.adaptive:
+        intervals = options.intervals or (1, options.interval, 15, 60)
+        rate = AdaptiveRate(intervals=sorted(set(intervals)), initial=options.interval,
+                            current_index=channel_map.index("current"),
+                            voltage_index=channel_map.index("voltage"), schedule=schedule)
+    pipeline = AcquisitionPipeline(reader.read, interval=options.interval, on_gap=writer.write_gap,
+                                   metrics=metrics, rate=rate)
+    pipeline.add_worker(storage_name, store_samples)
+    # Headless runs have nothing to display, so no queue is filled for it
+    display_queue = None if options.headless else pipeline.subscribe(display_name, maxsize=1000)
+    if live is not None:
+        # The dashboard buffer is filled from its own queue, never from the acquisition thread
+        pipeline.add_worker(dashboard_name, live.add_samples, maxsize=1000)
+
+    pipeline.start()
+    while time.time() <= until:
+        try:
+            if display_queue is None:
+                time.sleep(max(0.0, min(1.0, until - time.time())))
+                continue
+            # Hand the samples acquired since the last pass to the graph, it redraws when due
+            plot.add_samples(display_queue.get_many(timeout=0.1))
+            plot.refresh()
+
+        except Exception as e:
+            print(text["error"], str(e))
+
+    # Stop acquiring and let storage drain its queue
+    pipeline.stop()
+    reader.close()
+    writer.close()
+    return pipeline.stats()
+
+
+def stream_until(options, ljm, channel_map, until, store, archive, aggregates, plot, schedule=None,
+                 metrics=None, live=None):
+    """Hardware-timed stream mode through a StreamPipeline; returns its statistics.
+
+    The stream thread only calls eStreamRead. Every scan of each block is
+    logged and stored through the write-ahead log writer, appended to the
+    archive and aggregated on the storage worker, so no sample is dropped
+    whatever the rate and a slow disk is an error of that worker, not of the
+    device. The graph and the dashboard get one point per block (the mean of
+    its valid values) from their own queues. If the stream fails, the device
+    is reopened with exponential backoff and the interval without data is
+    stored as a gap.
+    """
+    import numpy as np
+
+    from .device import StreamAcquisition
+    from .pipeline import StreamPipeline
+
+    text = LOCALES[options.locale]
+    storage_name, display_name, dashboard_name = text["workers"]
+    scans_per_read = options.scans_per_read or max(1, int(options.stream_rate / 2))
+    writer = open_writer(options, store, metrics)
+
+    def open_stream():
+        handle = ljm.openS("ANY", "ANY", "ANY")
+        try:
+            stream = StreamAcquisition(ljm, handle, channel_map, scan_rate=options.stream_rate,
+                                       scans_per_read=scans_per_read, metrics=metrics)
+            stream.start()
+        except Exception:
+            ljm.close(handle)
+            raise
+        print("Connected to LabJack", ljm.getHandleInfo(handle), "streaming at",
+              round(stream.actual_scan_rate, 3), "Hz")
+        return stream
+
+    def close_stream(stream):
+        try:
+            stream.stop()
+        finally:
+            ljm.close(stream.handle)
+
+    pipeline = StreamPipeline(open_stream, close_stream, on_gap=writer.write_gap, metrics=metrics)
+
+    def store_blocks(blocks):
+        for block in blocks:
+            count = len(block.timestamps)
+            values = np.column_stack([block.values, np.full(count, pipeline.interval)])
+            ts_ms = np.round(block.timestamps * 1000).astype(np.int64)
+            writer.write_many([(ts,) + tuple(row) for ts, row in zip(ts_ms.tolist(), values.tolist())])
+            archive.append(block.timestamps, values)
+            records = aggregates.add_block(block.timestamps, block.values)
+            store.write_aggregates(records)
+            if live is not None:
+                live.add_aggregates(records, aggregates.energy_wh)
+
+    pipeline.add_worker(storage_name, store_blocks)
+    display_queue = None if options.headless else pipeline.subscribe(display_name, maxsize=1000)
+    if live is not None:
+        # The dashboard buffer is filled from its own queue, never from the stream thread
+        pipeline.add_worker(dashboard_name, lambda blocks: live.add_samples(
+            [block_point(block, pipeline.interval) for block in blocks]), maxsize=1000)
+
+    pipeline.start()
+    while time.time() <= until:
+        try:
+            if display_queue is None:
+                time.sleep(max(0.0, min(1.0, until - time.time())))
+                continue
+            blocks = display_queue.get_many(timeout=0.1)
+            plot.add_samples([block_point(block, pipeline.interval) for block in blocks])
+            plot.refresh()
+
+        except Exception as e:
+            print(text["error"], str(e))
+
+    # Stop streaming and let storage drain its queue
+    pipeline.stop()
+    writer.close()
+    return pipeline.stats()
+
+
+def block_point(block, interval):
+    """One point standing for a stream block: its last timestamp and the mean of each channel.
+
+    Skipped (NaN) values are left out of the mean, so one of them does not hide the block.
+    """
+    import warnings
+
+    import numpy as np
+
+    from .pipeline import Sample
+
+    with warnings.catch_warnings():
+        # A channel without any valid value in the block stays NaN
+        warnings.simplefilter("ignore", RuntimeWarning)
+        values = np.nanmean(block.values, axis=0)
+    return Sample(block.timestamps[-1], values, interval)
+
+
+# Commands
+def acquire(options, extra=None):
+    from .device import load_ljm
+    from .solar import SolarSchedule
+
+    text = LOCALES[options.locale]
+    ljm = load_ljm()
+    # Sunrise/sunset times for the whole year, computed once with ephem and cached on disk
+    schedule = SolarSchedule(latitude=options.latitude, longitude=options.longitude,
+                             margin_minutes=options.margin)
+    metrics, live = start_services(options)
+    while True:
+        delay = schedule.seconds_until_active(time.time())
+        if delay > 0:
+            print(text["paused"], datetime.datetime.fromtimestamp(time.time() + delay))
+            time.sleep(delay)
+        until = schedule.active_until(time.time())
+        if until is None:
+            # The window ended while waiting for it: wait for the next one
+            continue
+        acquire_window(options, ljm, until, schedule, metrics, live)
+        if options.once:
+            break
+
+
+def replay(options, extra=None):
+    from .simulator import FakeLJM, RecordedSignal, time_scaled
+
+    signal = RecordedSignal(options.recordings)
+    duration = options.duration or signal.duration / options.speed
+    if options.speed != 1.0:
+        signal = time_scaled(signal, options.speed)
+    metrics, live = start_services(options)
+    # No solar schedule: the replayed day does not follow the sun of the machine clock
+    acquire_window(options, FakeLJM(signal), time.time() + duration, metrics=metrics, live=live)
+
+
+def supervise(options, extra=None):
+    from .device import load_ljm
+    from .supervisor import load_device_configs, supervise_into_store
+
+    devices = load_device_configs(options.devices)
+    supervisor = supervise_into_store(load_ljm(), devices, options.database, options.duration,
+                                      read_timeout=options.read_timeout, retry_delay=options.retry_delay)
+    print(supervisor.rows_written, "rows written to", options.database)
+
+
+def export(options, extra=None):
+    import numpy as np
+
+    from .store import TimeSeriesStore
+
+    if not os.path.exists(options.database):
+        raise SystemExit(f"{options.database} does not exist")
+    start = options.start if options.start is not None else 0.0
+    end = options.end if options.end is not None else time.time() + 86400.0
+
+    store = TimeSeriesStore(options.database, channels=())
+    try:
+        if options.period:
+            data = store.query_aggregates(options.period, start, end)
+            columns = {"timestamp": data.pop("start_ms", np.empty(0, dtype=np.int64)) / 1000.0}
+            columns.update(data)
+        else:
+            names = options.columns or store.channels
+            timestamps_ms, values = store.query(start, end, names)
+            columns = {"timestamp": timestamps_ms / 1000.0}
+            columns.update((name, values[:, i]) for i, name in enumerate(names))
+    except KeyError as e:
+        raise SystemExit(f"{e.args[0]} in {options.database}")
+    finally:
+        store.close()
+    write_columns(options.output, columns)
+    print(len(columns["timestamp"]), "rows exported to", options.output)
+
+
+def benchmark(options, extra=None):
+    from .benchmark import main as run_benchmark
+
+    run_benchmark(extra, prog="python -m pv_acquisition benchmark")
+
+
+def write_columns(path, columns):
+    """Write a dict of equal-length arrays (``timestamp`` in epoch seconds first) by file extension.
+
+    CSV gets an extra local ``time`` column for reading in a spreadsheet.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        pq.write_table(pa.table(columns), path, compression="zstd")
+    elif extension == ".npz":
+        import numpy as np
+
+        np.savez_compressed(path, **columns)
+    elif extension == ".csv":
+        import csv
+
+        names = list(columns)
+        with open(path, "w", newline="", encoding="utf-8") as file:
+            output = csv.writer(file)
+            output.writerow(["time"] + names)
+            for row in zip(*(columns[name].tolist() for name in names)):
+                moment = datetime.datetime.fromtimestamp(row[0])
+                output.writerow([moment.isoformat(sep=" ", timespec="milliseconds")] + list(row))
+    else:
+        raise ValueError(f"Unknown export format {extension!r}, use one of {', '.join(EXPORT_FORMATS)}")
+
+
+# Arguments
+def _limit(text):
+    """Axis limit: a number, or ``auto`` to follow the data."""
+    return None if text == "auto" else float(text)
+
+
+def _moment(text):
+    """Local date or date and time in ISO format, e.g. 2023-06-06 or 2023-06-06T12:00."""
+    return datetime.datetime.fromisoformat(text)
+
+
+def _stream_rate(text):
+    # The store keeps millisecond timestamps, so faster scans would share a timestamp
+    rate = float(text)
+    if not 0 < rate <= 1000:
+        raise argparse.ArgumentTypeError("the stream rate must be above 0 and at most 1000 Hz")
+    return rate
+
+
+def _export_path(text):
+    if os.path.splitext(text)[1].lower() not in EXPORT_FORMATS:
+        raise argparse.ArgumentTypeError(f"the file extension must be one of {', '.join(EXPORT_FORMATS)}")
+    return text
+
+
+def _acquisition_options():
+    """Options shared by acquire and replay."""
+    from .solar import LATITUDE, LONGITUDE
+
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--locale", choices=sorted(LOCALES), default="en",
+                        help="language of the messages, graph labels and archive columns")
+    parser.add_argument("--layout", choices=("twin", "separate"), default="twin",
+                        help="one figure with twin y-axes, or one figure per quantity")
+    parser.add_argument("--headless", action="store_true",
+                        help="no graph, for machines without a display (matplotlib is not loaded)")
+    parser.add_argument("--window", type=int, default=80, help="points shown in the graph")
+    parser.add_argument("--current-ylim", nargs=2, type=_limit, default=(0, None),
+                        metavar=("LOW", "HIGH"), help="current axis limits, a number or auto")
+    parser.add_argument("--voltage-ylim", nargs=2, type=_limit, default=(15, 35),
+                        metavar=("LOW", "HIGH"), help="voltage axis limits, a number or auto")
+    parser.add_argument("--max-fps", type=float, default=2.0, help="graph redraws per second at most")
+    parser.add_argument("--interval", type=float, default=5.0, help="sampling interval (seconds)")
+    parser.add_argument("--stream-rate", type=_stream_rate, metavar="HZ",
+                        help="stream mode: scans clocked by the device at this rate (up to 1000 Hz) "
+                        "instead of scheduled reads")
+    parser.add_argument("--scans-per-read", type=int,
+                        help="scans per stream block (default: half a second of scans)")
+    parser.add_argument("--no-adaptive", dest="adaptive", action="store_false",
+                        help="always sample at --interval")
+    parser.add_argument("--intervals", nargs="+", type=float,
+                        help="intervals of adaptive sampling (default: 1, --interval, 15 and 60 s)")
+    parser.add_argument("--channels", metavar="JSON", help="channel map file (default: current on "
+                        "AIN0, voltage on AIN1)")
+    parser.add_argument("--calibration", default="calibration.json", metavar="JSON",
+                        help="per-channel calibration, used if the file exists")
+    parser.add_argument("--database", default="pv_data.db", help="SQLite store of every run")
+    parser.add_argument("--wal", default="pv_data.wal", help="write-ahead log of the store")
+    parser.add_argument("--wal-fsync-interval", type=float, default=1.0, metavar="SECONDS",
+                        help="sync the write-ahead log to disk at most this often (0: after every write)")
+    parser.add_argument("--archive-prefix", default="Muhammed",
+                        help="the daily archive is named <prefix>_<start time>")
+    parser.add_argument("--metrics-port", type=int, default=9108, help="0 to disable the metrics endpoint")
+    parser.add_argument("--dashboard-port", type=int, help="serve the live web dashboard on this port")
+    parser.add_argument("--dashboard-host", default="0.0.0.0")
+    parser.add_argument("--latitude", default=LATITUDE)
+    parser.add_argument("--longitude", default=LONGITUDE)
+    parser.add_argument("--margin", type=float, default=5,
+                        help="minutes before sunrise and after sunset to acquire")
+    return parser
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m pv_acquisition",
+                                     description="Real-time acquisition of photovoltaic data")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    # A parent parser shares its actions, so each command gets its own (replay changes the defaults)
+    command = commands.add_parser("acquire", parents=[_acquisition_options()],
+                                  help="acquire from the LabJack every day")
+    command.add_argument("--once", action="store_true", help="stop after the current or next day")
+    command.set_defaults(run=acquire)
+
+    command = commands.add_parser("replay", parents=[_acquisition_options()],
+                                  help="acquire from the simulator replaying recorded runs")
+    command.add_argument("recordings", nargs="+", metavar="DB", help="recorded Muhammed_<datetime>.db runs")
+    command.add_argument("--speed", type=float, default=1.0, help="play the recording this many times faster")
+    command.add_argument("--duration", type=float,
+                         help="seconds to acquire (default: the length of the recording)")
+    command.set_defaults(run=replay, database="pv_replay.db", wal="pv_replay.wal",
+                         archive_prefix="Replay", metrics_port=0)
+
+    command = commands.add_parser("supervise", help="acquire from several LabJacks into one store")
+    command.add_argument("devices", metavar="JSON", help="device file (see supervisor.load_device_configs)")
+    command.add_argument("--database", default="pv_plant.db", help="SQLite store of the merged rows")
+    command.add_argument("--duration", type=float, help="seconds to acquire (default: until interrupted)")
+    command.add_argument("--read-timeout", type=float, default=5.0,
+                         help="seconds before an unanswered read marks a device disconnected")
+    command.add_argument("--retry-delay", type=float, default=5.0,
+                         help="seconds before reopening a disconnected device")
+    command.set_defaults(run=supervise)
+
+    command = commands.add_parser("export", help="export the store to CSV, Parquet or NPZ")
+    command.add_argument("output", type=_export_path, help="output file (.csv, .parquet or .npz)")
+    command.add_argument("--database", default="pv_data.db")
+    command.add_argument("--start", type=_moment, help="local date/time, default: the first sample")
+    command.add_argument("--end", type=_moment, help="local date/time (excluded), default: the last sample")
+    command.add_argument("--columns", nargs="+", help="channels to export (default: all)")
+    command.add_argument("--period", type=int, choices=(60, 3600),
+                         help="export the per-minute or per-hour statistics instead of the samples")
+    command.set_defaults(run=export)
+
+    # Its options are parsed by benchmark.main
+    command = commands.add_parser("benchmark", add_help=False,
+                                  help="benchmark the acquisition stages (see benchmark --help)")
+    command.set_defaults(run=benchmark)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    options, extra = parser.parse_known_args(argv)
+    if extra and options.command != "benchmark":
+        parser.error("unrecognized arguments: " + " ".join(extra))
+    options.run(options, extra)
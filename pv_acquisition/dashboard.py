@@ -0,0 +1,449 @@
+"""Optional live web dashboard: LTTB-downsampled data pushed to browsers over WebSocket.
+
+The acquisition side only appends samples to a LiveBuffer (from its own
+pipeline queue, so the device loop is never involved). One broadcaster thread
+downsamples the buffer and encodes the update once per ``update_interval``,
+and the same bytes are sent to every connected viewer, so extra viewers cost a
+socket write each rather than more downsampling and encoding. Only the
+standard library is used: the WebSocket handshake and framing (RFC 6455) are
+implemented here for the server-to-browser direction that is needed.
+"""
+
+import base64
+import hashlib
+import http.server
+import json
+import math
+import socket
+import struct
+import threading
+
+import numpy as np
+
+from .ringbuffer import RingBuffer
+
+_WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+_TEXT = 0x1
+_CLOSE = 0x8
+_PING = 0x9
+_PONG = 0xA
+
+
+def lttb(x, y, threshold):
+    """Indices of the points kept by Largest-Triangle-Three-Buckets downsampling.
+
+    Keeps the first and last points and, from each of ``threshold - 2`` equal
+    buckets in between, the point forming the largest triangle with the point
+    kept in the previous bucket and the average of the next bucket. Peaks and
+    dips survive, unlike with plain decimation. NaN values (gaps) are never
+    picked unless a whole bucket is NaN.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    count = len(x)
+    if threshold >= count or threshold < 3:
+        return np.arange(count)
+
+    every = (count - 2) / (threshold - 2)
+    kept = np.empty(threshold, dtype=np.int64)
+    kept[0] = 0
+    a = 0
+    for i in range(threshold - 2):
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, count)
+        next_y = y[next_start:next_end]
+        next_y = next_y[~np.isnan(next_y)]
+        average_x = x[next_start:next_end].mean()
+        average_y = next_y.mean() if len(next_y) else y[a]
+
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        area = np.abs((x[a] - average_x) * (y[start:end] - y[a])
+                      - (x[a] - x[start:end]) * (average_y - y[a]))
+        a = start + int(np.argmax(np.nan_to_num(area, nan=-1.0)))
+        kept[i + 1] = a
+    kept[-1] = count - 1
+    return kept
+
+
+class LiveBuffer:
+    """Thread-safe ring buffer of recent samples and the latest aggregates, shared by all viewers."""
+
+    def __init__(self, names, units=None, capacity=17280):
+        self.names = list(names)
+        self.units = list(units) if units is not None else [""] * len(self.names)
+        self.buffer = RingBuffer(capacity, 1 + len(self.names))
+        self.aggregates = {}
+        self.energy_wh = None
+        self.version = 0
+        self._lock = threading.Lock()
+
+    def add_samples(self, samples):
+        """Pipeline worker handler: append a batch of Samples."""
+        if not samples:
+            return
+        rows = np.array([(sample.timestamp,) + tuple(sample.values) for sample in samples])
+        with self._lock:
+            self.buffer.extend(rows)
+            self.version += 1
+
+    def add_aggregates(self, records, energy_wh=None):
+        """Keep the most recent AggregateRecord of each period (and the day's energy)."""
+        with self._lock:
+            for record in records:
+                self.aggregates[record.period] = record._asdict()
+            if energy_wh is not None:
+                self.energy_wh = energy_wh
+            if records or energy_wh is not None:
+                self.version += 1
+
+    def snapshot(self, points):
+        """Return (version, payload dict) with each channel downsampled to at most ``points``."""
+        with self._lock:
+            version = self.version
+            data = np.array(self.buffer.view())
+            aggregates = dict(self.aggregates)
+            energy_wh = self.energy_wh
+        timestamps = data[:, 0]
+        series = {}
+        for i, name in enumerate(self.names):
+            values = data[:, i + 1]
+            kept = lttb(timestamps, values, points)
+            series[name] = {"t": timestamps[kept].tolist(), "v": _json_values(values[kept])}
+        latest = None
+        if len(data):
+            latest = {"t": float(timestamps[-1]), "values": dict(zip(self.names, _json_values(data[-1, 1:])))}
+        payload = {"channels": self.names, "units": self.units, "samples": len(data),
+                   "series": series, "latest": latest, "energy_wh": energy_wh,
+                   "aggregates": {str(period): {key: _json_value(value) for key, value in record.items()}
+                                  for period, record in sorted(aggregates.items())}}
+        return version, payload
+
+
+def _json_value(value):
+    # JSON has no NaN; missing values are sent as null
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def _json_values(values):
+    return [None if math.isnan(value) else value for value in values.tolist()]
+
+
+def _frame(opcode, payload):
+    length = len(payload)
+    if length < 126:
+        header = struct.pack("!BB", 0x80 | opcode, length)
+    elif length < 1 << 16:
+        header = struct.pack("!BBH", 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+    return header + payload
+
+
+def _receive(connection, count, stop_event):
+    # The socket has a timeout for sends; keep waiting on the receive side until stopped
+    data = b""
+    while len(data) < count:
+        try:
+            chunk = connection.recv(count - len(data))
+        except socket.timeout:
+            if stop_event.is_set():
+                return None
+            continue
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+
+def _read_frame(connection, stop_event):
+    """Read one client frame; returns (opcode, payload) or None when the connection ends."""
+    header = _receive(connection, 2, stop_event)
+    if header is None:
+        return None
+    opcode = header[0] & 0x0F
+    length = header[1] & 0x7F
+    if length in (126, 127):
+        extended = _receive(connection, 2 if length == 126 else 8, stop_event)
+        if extended is None:
+            return None
+        length = struct.unpack("!H" if length == 126 else "!Q", extended)[0]
+    mask = b"\0\0\0\0"
+    if header[1] & 0x80:
+        mask = _receive(connection, 4, stop_event)
+    payload = _receive(connection, length, stop_event) if length else b""
+    if mask is None or payload is None:
+        return None
+    payload = bytearray(payload)
+    for i in range(len(payload)):
+        payload[i] ^= mask[i % 4]
+    return opcode, bytes(payload)
+
+
+class _Viewer:
+    def __init__(self, connection):
+        self.connection = connection
+        self.lock = threading.Lock()
+
+    def send(self, frame):
+        with self.lock:
+            self.connection.sendall(frame)
+
+
+class Dashboard:
+    """HTTP server with the dashboard page, a JSON snapshot and a WebSocket feed.
+
+    ``/`` serves the page, ``/data`` the latest update as JSON (for polling or
+    scripts) and ``/ws`` a WebSocket on which every update is pushed. Viewers
+    that cannot take an update within ``send_timeout`` seconds are dropped so
+    they never hold up the others.
+    """
+
+    def __init__(self, live, host="127.0.0.1", port=8080, points=500, update_interval=1.0,
+                 send_timeout=2.0):
+        self.live = live
+        self.host = host
+        self.port = port
+        self.points = points
+        self.update_interval = update_interval
+        self.send_timeout = send_timeout
+        self.viewers = set()
+        self.updates = 0
+        self._payload = b"{}"
+        self._version = None
+        self._viewers_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._server = None
+        self._threads = []
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}/"
+
+    def start(self):
+        dashboard = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            # HTTP/1.1 so the WebSocket upgrade is answered as browsers require and
+            # page/data requests can share a kept-alive connection
+            protocol_version = "HTTP/1.1"
+            timeout = 60  # idle kept-alive connections are closed after this
+
+            def do_GET(self):
+                path = self.path.split("?")[0]
+                if path == "/ws" and self.headers.get("Upgrade", "").lower() == "websocket":
+                    dashboard._serve_websocket(self)
+                elif path == "/data":
+                    self._send(dashboard._payload, "application/json")
+                elif path == "/":
+                    self._send(_PAGE.encode("utf-8"), "text/html; charset=utf-8")
+                else:
+                    self.send_error(404)
+
+            def _send(self, body, content_type):
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("Cache-Control", "no-store")
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._stop.clear()
+        self._refresh()
+        self._server = http.server.ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._threads = [threading.Thread(target=self._server.serve_forever, name="dashboard-http",
+                                          daemon=True),
+                         threading.Thread(target=self._broadcast, name="dashboard-broadcast", daemon=True)]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        with self._viewers_lock:
+            viewers, self.viewers = self.viewers, set()
+        for viewer in viewers:
+            try:
+                viewer.send(_frame(_CLOSE, b""))
+                viewer.connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    # Updates
+    def _refresh(self):
+        """Rebuild the shared update if the buffer changed; returns True if it did."""
+        if self.live.version == self._version:
+            return False
+        version, payload = self.live.snapshot(self.points)
+        self._payload = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+        self._version = version
+        self.updates += 1
+        return True
+
+    def _broadcast(self):
+        while not self._stop.wait(self.update_interval):
+            try:
+                if not self._refresh():
+                    continue
+            except Exception as e:
+                print("An error occurred while preparing the dashboard update:", str(e))
+                continue
+            frame = _frame(_TEXT, self._payload)
+            with self._viewers_lock:
+                viewers = list(self.viewers)
+            for viewer in viewers:
+                try:
+                    viewer.send(frame)
+                except OSError:
+                    self._drop(viewer)
+
+    def _drop(self, viewer):
+        with self._viewers_lock:
+            self.viewers.discard(viewer)
+        try:
+            viewer.connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    # WebSocket connections
+    def _serve_websocket(self, handler):
+        key = handler.headers.get("Sec-WebSocket-Key", "")
+        accept = base64.b64encode(hashlib.sha1((key + _WEBSOCKET_GUID).encode("ascii")).digest())
+        handler.send_response(101, "Switching Protocols")
+        handler.send_header("Upgrade", "websocket")
+        handler.send_header("Connection", "Upgrade")
+        handler.send_header("Sec-WebSocket-Accept", accept.decode("ascii"))
+        handler.end_headers()
+        handler.wfile.flush()
+        handler.close_connection = True
+
+        connection = handler.connection
+        connection.settimeout(self.send_timeout)
+        viewer = _Viewer(connection)
+        try:
+            viewer.send(_frame(_TEXT, self._payload))
+        except OSError:
+            return
+        with self._viewers_lock:
+            self.viewers.add(viewer)
+
+        # This thread only answers pings and waits for the browser to close
+        try:
+            while not self._stop.is_set():
+                frame = _read_frame(connection, self._stop)
+                if frame is None or frame[0] == _CLOSE:
+                    break
+                if frame[0] == _PING:
+                    viewer.send(_frame(_PONG, frame[1]))
+        except (OSError, struct.error):
+            pass
+        finally:
+            self._drop(viewer)
+
+
+_PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>PV acquisition</title>
+<style>
+  body { font-family: sans-serif; margin: 1em; color: #222; }
+  canvas { width: 100%; height: 260px; border: 1px solid #ccc; margin-bottom: 1em; }
+  table { border-collapse: collapse; } td, th { padding: 2px 10px; text-align: right; }
+  #status { color: #888; }
+</style>
+</head>
+<body>
+<h2>Real-time PV data <span id="status"></span></h2>
+<div id="latest"></div>
+<div id="charts"></div>
+<h3>Latest statistics</h3>
+<table id="aggregates"></table>
+<script>
+const colors = ["tab:blue", "tab:red", "green", "purple"];
+const palette = {"tab:blue": "#1f77b4", "tab:red": "#d62728", "green": "#2ca02c", "purple": "#9467bd"};
+
+function fmt(v, d) { return v === null || v === undefined ? "-" : Number(v).toFixed(d); }
+
+function draw(canvas, serie, color, label) {
+  const ctx = canvas.getContext("2d");
+  const w = canvas.width = canvas.clientWidth, h = canvas.height = canvas.clientHeight;
+  ctx.clearRect(0, 0, w, h);
+  const pts = serie.t.map((t, i) => [t, serie.v[i]]).filter(p => p[1] !== null);
+  ctx.fillStyle = "#222"; ctx.fillText(label, 50, 14);
+  if (pts.length < 2) return;
+  const t0 = serie.t[0], t1 = serie.t[serie.t.length - 1] || t0 + 1;
+  let lo = Math.min(...pts.map(p => p[1])), hi = Math.max(...pts.map(p => p[1]));
+  if (hi === lo) { hi += 1; lo -= 1; }
+  const x = t => 45 + (w - 55) * (t - t0) / (t1 - t0 || 1);
+  const y = v => h - 20 - (h - 40) * (v - lo) / (hi - lo);
+  ctx.fillText(fmt(hi, 2), 2, y(hi) + 4); ctx.fillText(fmt(lo, 2), 2, y(lo));
+  ctx.fillText(new Date(t0 * 1000).toLocaleTimeString(), 45, h - 4);
+  const end = new Date(t1 * 1000).toLocaleTimeString();
+  ctx.fillText(end, w - 10 - ctx.measureText(end).width, h - 4);
+  ctx.strokeStyle = palette[color]; ctx.beginPath();
+  let pen = false;
+  serie.t.forEach((t, i) => {
+    const v = serie.v[i];
+    if (v === null) { pen = false; return; }
+    if (pen) ctx.lineTo(x(t), y(v)); else ctx.moveTo(x(t), y(v));
+    pen = true;
+  });
+  ctx.stroke();
+}
+
+function update(data) {
+  const charts = document.getElementById("charts");
+  data.channels.forEach((name, i) => {
+    let canvas = document.getElementById("chart-" + name);
+    if (!canvas) { canvas = document.createElement("canvas"); canvas.id = "chart-" + name; charts.appendChild(canvas); }
+    draw(canvas, data.series[name], colors[i % colors.length], name + " (" + data.units[i] + ")");
+  });
+  if (data.latest) {
+    document.getElementById("latest").textContent = new Date(data.latest.t * 1000).toLocaleString() + "  " +
+      data.channels.map((n, i) => n + ": " + fmt(data.latest.values[n], 3) + " " + data.units[i]).join("   ") +
+      (data.energy_wh === null ? "" : "   energy: " + fmt(data.energy_wh, 1) + " Wh");
+  }
+  const rows = Object.entries(data.aggregates).map(([period, r]) =>
+    "<tr><td>" + period + " s</td><td>" + new Date(r.start_ms).toLocaleTimeString() + "</td><td>" +
+    fmt(r.current_mean, 3) + "</td><td>" + fmt(r.voltage_mean, 2) + "</td><td>" + fmt(r.power_max, 1) +
+    "</td><td>" + fmt(r.energy_wh, 2) + "</td></tr>");
+  document.getElementById("aggregates").innerHTML =
+    "<tr><th>period</th><th>start</th><th>mean A</th><th>mean V</th><th>max W</th><th>Wh</th></tr>" + rows.join("");
+}
+
+function poll() {
+  fetch("data").then(r => r.json()).then(update).finally(() => setTimeout(poll, 5000));
+}
+
+function connect() {
+  const status = document.getElementById("status");
+  const ws = new WebSocket((location.protocol === "https:" ? "wss://" : "ws://") + location.host + "/ws");
+  let opened = false;
+  ws.onopen = () => { opened = true; status.textContent = "live"; };
+  ws.onmessage = event => update(JSON.parse(event.data));
+  ws.onclose = () => {
+    status.textContent = "disconnected";
+    if (opened) setTimeout(connect, 2000); else poll();
+  };
+}
+
+if ("WebSocket" in window) connect(); else poll();
+</script>
+</body>
+</html>
+"""
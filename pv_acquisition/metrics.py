@@ -0,0 +1,211 @@
+"""Timing histograms, counters and a Prometheus-style HTTP metrics endpoint.
+
+Components take an optional ``metrics`` registry and record into it from the
+hot path: a histogram observation is a bisect and three additions under a
+lock. The registry renders everything in the Prometheus text format, served
+by MetricsServer on http://127.0.0.1:9108/metrics by default.
+"""
+
+import bisect
+import http.server
+import threading
+
+# Upper bounds (seconds) of the timing histograms: 100 us up to 10 s
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+COUNTER = "counter"
+GAUGE = "gauge"
+HISTOGRAM = "histogram"
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = {key: str(value).replace("\\", "\\\\").replace('"', '\\"') for key, value in labels.items()}
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped.items()) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Counter:
+    """Monotonic count, either incremented or read from ``function`` at render time."""
+
+    def __init__(self, labels, function=None):
+        self.labels = labels
+        self.function = function
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def get(self):
+        return self.function() if self.function is not None else self.value
+
+    def samples(self, name):
+        return [(name + "_total" if not name.endswith("_total") else name, self.labels, self.get())]
+
+
+class Gauge(Counter):
+    """Value that goes up and down; set() or read from ``function`` at render time."""
+
+    def set(self, value):
+        self.value = value
+
+    def samples(self, name):
+        return [(name, self.labels, self.get())]
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count of observed durations."""
+
+    def __init__(self, labels, buckets=DEFAULT_BUCKETS):
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def samples(self, name):
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        samples = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += bucket_count
+            samples.append((name + "_bucket", dict(self.labels, le=_format_value(bound)), cumulative))
+        samples.append((name + "_sum", self.labels, total))
+        samples.append((name + "_count", self.labels, count))
+        return samples
+
+
+class MetricsRegistry:
+    """Named metric families, each holding one metric per label set.
+
+    Asking again for the same name and labels returns the existing metric, so a
+    component that is recreated (e.g. a reader after a reconnect, or the
+    pipeline of the next day) keeps adding to the same series; a counter or
+    gauge read from a function is switched to the new function.
+    """
+
+    def __init__(self):
+        self._families = {}
+        self._lock = threading.Lock()
+
+    def _get(self, kind, name, help_text, labels, factory):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = self._families[name] = (kind, help_text, {})
+            elif family[0] != kind:
+                raise ValueError(f"Metric {name} is already registered as a {family[0]}")
+            metrics = family[2]
+            if key not in metrics:
+                metrics[key] = factory()
+            return metrics[key]
+
+    def counter(self, name, help_text="", function=None, **labels):
+        metric = self._get(COUNTER, name, help_text, labels, lambda: Counter(labels, function))
+        if function is not None:
+            metric.function = function
+        return metric
+
+    def gauge(self, name, help_text="", function=None, **labels):
+        metric = self._get(GAUGE, name, help_text, labels, lambda: Gauge(labels, function))
+        if function is not None:
+            metric.function = function
+        return metric
+
+    def histogram(self, name, help_text="", buckets=DEFAULT_BUCKETS, **labels):
+        return self._get(HISTOGRAM, name, help_text, labels, lambda: Histogram(labels, buckets))
+
+    def stage_timer(self, stage):
+        """Histogram of the duration of one acquisition stage (read, scale, plot, persist)."""
+        return self.histogram("pv_stage_seconds", "Duration of each acquisition stage", stage=stage)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            families = [(name, kind, help_text, list(metrics.values()))
+                        for name, (kind, help_text, metrics) in sorted(self._families.items())]
+        lines = []
+        for name, kind, help_text, metrics in families:
+            exposed = name + "_total" if kind == COUNTER and not name.endswith("_total") else name
+            if help_text:
+                lines.append(f"# HELP {exposed} {help_text}")
+            lines.append(f"# TYPE {exposed} {kind}")
+            for metric in metrics:
+                try:
+                    samples = metric.samples(name)
+                except Exception as e:
+                    print(f"An error occurred while reading metric {name}:", str(e))
+                    continue
+                for sample_name, labels, value in samples:
+                    lines.append(f"{sample_name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """Serve a registry on ``http://<host>:<port>/metrics`` from a daemon thread."""
+
+    def __init__(self, registry, host="127.0.0.1", port=9108):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        registry = self.registry
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # scrapers reuse the connection
+            timeout = 60
+
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Scrapes would flood the console
+
+        self._server = http.server.ThreadingHTTPServer((self.host, self.port), Handler)
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-server",
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}/metrics"
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+            self._thread = None
@@ -0,0 +1,477 @@
+"""Threaded producer/consumer pipeline decoupling acquisition from storage and display."""
+
+import collections
+import threading
+import time
+
+import numpy as np
+
+from .recovery import Backoff, Gap
+
+# One scan: epoch timestamp (seconds), the scaled channel values and the sampling interval in effect
+Sample = collections.namedtuple("Sample", ["timestamp", "values", "interval"], defaults=(None,))
+
+# Queue policies when a consumer falls behind
+DROP_OLDEST = "drop_oldest"  # keep the newest samples, never block the producer
+BLOCK = "block"  # wait up to put_timeout for room, then drop the new sample
+
+
+class DeadlineScheduler:
+    """Tick at fixed intervals on the monotonic clock.
+
+    Deadlines are start + k * interval, so the time spent reading does not
+    accumulate into drift the way ``time.sleep(interval)`` after the work does.
+    If a tick is missed entirely it is skipped (and counted) rather than bursting
+    to catch up. The wall-clock timestamp of each tick is the monotonic deadline
+    mapped onto the wall clock captured at start, so it is not disturbed by NTP
+    steps during the day.
+    """
+
+    def __init__(self, interval):
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+        self.interval = float(interval)
+        self.missed = 0
+        self.ticks = 0
+        self._start_monotonic = None
+        self._start_wall = None
+        self._next_index = 0
+
+    def start(self):
+        self._start_monotonic = time.monotonic()
+        self._start_wall = time.time()
+        self._next_index = 0
+        self.missed = 0
+        self.ticks = 0
+
+    def set_interval(self, interval):
+        """Change the interval from the last tick on (the next tick is last tick + interval)."""
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+        if self._start_monotonic is not None and self._next_index > 0:
+            # Re-anchor on the last deadline, keeping the monotonic-to-wall mapping
+            last = self._start_monotonic + (self._next_index - 1) * self.interval
+            self._start_wall += last - self._start_monotonic
+            self._start_monotonic = last
+            self._next_index = 1
+        self.interval = float(interval)
+
+    def wait(self, stop_event=None):
+        """Sleep until the next deadline and return (wall timestamp, lateness in seconds).
+
+        Returns None if stop_event is set while waiting.
+        """
+        if self._start_monotonic is None:
+            self.start()
+        deadline = self._start_monotonic + self._next_index * self.interval
+        now = time.monotonic()
+        if now - deadline >= self.interval:
+            # Skip the ticks we can no longer honour
+            skipped = int((now - deadline) // self.interval)
+            self.missed += skipped
+            self._next_index += skipped
+            deadline += skipped * self.interval
+
+        delay = deadline - now
+        if delay > 0:
+            if stop_event is not None:
+                if stop_event.wait(delay):
+                    return None
+            else:
+                time.sleep(delay)
+        self._next_index += 1
+        self.ticks += 1
+        lateness = max(0.0, time.monotonic() - deadline)
+        return self._start_wall + (deadline - self._start_monotonic), lateness
+
+
+class RingQueue:
+    """Bounded thread-safe queue with drop counters.
+
+    With the DROP_OLDEST policy put() never blocks: when the queue is full the
+    oldest item is discarded. With BLOCK the producer waits up to put_timeout for
+    a consumer to make room before dropping the new item.
+    """
+
+    def __init__(self, maxsize=10000, policy=DROP_OLDEST, put_timeout=0.0):
+        if policy not in (DROP_OLDEST, BLOCK):
+            raise ValueError(f"Unknown queue policy {policy}")
+        self.maxsize = maxsize
+        self.policy = policy
+        self.put_timeout = put_timeout
+        self.put_count = 0
+        self.dropped = 0
+        self.blocked = 0
+        self.high_water = 0
+        self._items = collections.deque()
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
+
+    def put(self, item):
+        """Add an item; returns False if an item had to be dropped."""
+        with self._lock:
+            accepted = True
+            if len(self._items) >= self.maxsize:
+                if self.policy == DROP_OLDEST:
+                    self._items.popleft()
+                    self.dropped += 1
+                    accepted = False
+                else:
+                    self.blocked += 1
+                    self._not_full.wait_for(lambda: len(self._items) < self.maxsize,
+                                            self.put_timeout)
+                    if len(self._items) >= self.maxsize:
+                        self.dropped += 1
+                        return False
+            self._items.append(item)
+            self.put_count += 1
+            self.high_water = max(self.high_water, len(self._items))
+            self._not_empty.notify()
+            return accepted
+
+    def get_many(self, max_items=None, timeout=None):
+        """Return up to max_items queued items, waiting up to timeout for the first one."""
+        with self._lock:
+            if not self._items:
+                self._not_empty.wait(timeout)
+            count = len(self._items) if max_items is None else min(max_items, len(self._items))
+            batch = [self._items.popleft() for _ in range(count)]
+            if batch:
+                self._not_full.notify_all()
+            return batch
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._items), "put": self.put_count, "dropped": self.dropped,
+                    "blocked": self.blocked, "high_water": self.high_water}
+
+
+class _FanOut:
+    """Per-consumer queues, worker threads and gap reports shared by the acquisition threads below."""
+
+    def __init__(self, on_gap=None, metrics=None):
+        self.queues = {}
+        self.workers = []
+        self.on_gap = on_gap
+        self.gaps = 0
+        self.metrics = metrics
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def subscribe(self, name, maxsize=10000, policy=DROP_OLDEST, put_timeout=0.0):
+        """Create a queue that receives every item; the caller consumes it."""
+        ring = RingQueue(maxsize, policy, put_timeout)
+        self.queues[name] = ring
+        if self.metrics is not None:
+            self.metrics.counter("pv_queue_dropped", "Samples dropped by a full queue",
+                                 lambda: ring.dropped, queue=name)
+            self.metrics.gauge("pv_queue_size", "Samples waiting in a queue", lambda: len(ring), queue=name)
+        return ring
+
+    def add_worker(self, name, handler, maxsize=10000, policy=DROP_OLDEST, batch_size=None,
+                   poll_interval=0.5):
+        """Consume a queue from a dedicated thread calling handler(list_of_items)."""
+        ring = self.subscribe(name, maxsize, policy)
+        worker = _Worker(name, ring, handler, batch_size, poll_interval, self._stop)
+        self.workers.append(worker)
+        if self.running:
+            worker.start()
+        return ring
+
+    def _start_thread(self, name):
+        self._stop.clear()
+        for worker in self.workers:
+            worker.start()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _stop_thread(self, timeout):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _publish(self, item):
+        for ring in self.queues.values():
+            ring.put(item)
+
+    def _emit_gap(self, gap):
+        self.gaps += 1
+        if self.on_gap is not None:
+            try:
+                self.on_gap(gap)
+            except Exception as e:
+                print("An error occurred while recording a gap:", str(e))
+
+
+class AcquisitionPipeline(_FanOut):
+    """Acquisition thread fanning samples out to independently consumed queues.
+
+    ``read()`` is called on every scheduler tick and must return the channel
+    values of one scan. Each subscriber gets its own RingQueue, so a slow disk
+    or a slow plot only fills (and eventually drops from) its own queue and
+    never delays the next read.
+
+    Intervals without samples are reported to ``on_gap(Gap)`` once data comes
+    back: runs of failed reads, and runs of missed ticks longer than
+    ``gap_threshold`` seconds (default: twice the interval). A run of failed
+    reads still open when the pipeline stops is reported as ending then.
+
+    With ``rate`` (an AdaptiveRate) the interval is chosen again after every
+    sample from ``rate.update(timestamp, values)``; each Sample carries the
+    interval it was taken at.
+
+    With a metrics registry the lateness of each tick and the actual spacing
+    between reads (drift from ``interval``) are recorded as histograms, next to
+    counters of samples, failed reads, missed ticks, gaps and queue drops.
+    """
+
+    def __init__(self, read, interval, on_gap=None, gap_threshold=None, metrics=None, rate=None):
+        super().__init__(on_gap, metrics)
+        self.read = read
+        self.scheduler = DeadlineScheduler(interval)
+        self.samples = 0
+        self.read_errors = 0
+        self.max_lateness = 0.0
+        self.gap_threshold = gap_threshold
+        self.rate = rate
+        self._last_ok = None
+        self._gap_start = None
+        self._gap_reason = None
+        self._lateness = self._spacing = None
+        self._last_read = None
+        if metrics is not None:
+            self._lateness = metrics.histogram("pv_tick_lateness_seconds",
+                                               "Delay of each read after its scheduled tick")
+            self._spacing = metrics.histogram("pv_read_interval_seconds", "Time between consecutive reads",
+                                              buckets=_interval_buckets(interval, rate))
+            metrics.counter("pv_samples", "Samples acquired", lambda: self.samples)
+            metrics.counter("pv_read_errors", "Failed reads", lambda: self.read_errors)
+            metrics.counter("pv_missed_ticks", "Ticks skipped because the loop fell behind",
+                            lambda: self.scheduler.missed)
+            metrics.counter("pv_gaps", "Intervals without samples", lambda: self.gaps)
+            metrics.gauge("pv_sample_interval_seconds", "Current sampling interval",
+                          lambda: self.scheduler.interval)
+
+    def start(self):
+        if self.running:
+            return
+        self.scheduler.start()
+        self._start_thread("acquisition")
+
+    def stop(self, timeout=None):
+        """Stop acquiring and let the workers drain what is already queued."""
+        self._stop_thread(timeout)
+        if self._gap_start is not None:
+            # The device never came back before the end of acquisition
+            self._emit_gap(Gap(self._gap_start, time.time(), self._gap_reason))
+            self._gap_start = None
+        for worker in self.workers:
+            worker.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            tick = self.scheduler.wait(self._stop)
+            if tick is None:
+                break
+            timestamp, lateness = tick
+            self.max_lateness = max(self.max_lateness, lateness)
+            if self.metrics is not None:
+                now = time.monotonic()
+                self._lateness.observe(lateness)
+                if self._last_read is not None:
+                    self._spacing.observe(now - self._last_read)
+                self._last_read = now
+            try:
+                values = np.asarray(self.read(), dtype=np.float64)
+            except Exception as e:
+                self.read_errors += 1
+                # Only the first error of a run is printed, the run ends up as one gap
+                if self._gap_start is None:
+                    print("An error occurred:", str(e))
+                    self._gap_start = timestamp
+                    self._gap_reason = str(e) or type(e).__name__
+                continue
+            self._track_gap(timestamp)
+            self.samples += 1
+            self._publish(Sample(timestamp, values, self.scheduler.interval))
+            if self.rate is not None:
+                try:
+                    interval = self.rate.update(timestamp, values)
+                except Exception as e:
+                    print("An error occurred while choosing the sampling interval:", str(e))
+                else:
+                    if interval != self.scheduler.interval:
+                        self.scheduler.set_interval(interval)
+
+    def _track_gap(self, timestamp):
+        gap = None
+        threshold = self.gap_threshold if self.gap_threshold is not None else 2.0 * self.scheduler.interval
+        if self._gap_start is not None:
+            gap = Gap(self._gap_start, timestamp, self._gap_reason)
+        elif self._last_ok is not None and timestamp - self._last_ok > threshold:
+            gap = Gap(self._last_ok + self.scheduler.interval, timestamp, "missed ticks")
+        self._gap_start = None
+        self._last_ok = timestamp
+        if gap is not None:
+            self._emit_gap(gap)
+
+    def stats(self):
+        return {
+            "samples": self.samples,
+            "read_errors": self.read_errors,
+            "gaps": self.gaps,
+            "missed_ticks": self.scheduler.missed,
+            "max_lateness": self.max_lateness,
+            "queues": {name: ring.stats() for name, ring in self.queues.items()},
+        }
+
+
+class StreamPipeline(_FanOut):
+    """Stream acquisition thread fanning blocks out to independently consumed queues.
+
+    ``open_stream()`` opens the device and returns a started stream (a
+    StreamAcquisition) whose ``read()`` returns StreamBlocks; ``close_stream``
+    stops it and releases the device. The thread only reads: every block goes
+    to each subscriber's RingQueue, so storage, the graph and the dashboard
+    never delay the next eStreamRead and the device buffer only has to absorb
+    one read.
+
+    If the stream fails it is closed and reopened with exponential backoff,
+    and the interval without data is reported to ``on_gap(Gap)`` once the
+    stream is back, or when the pipeline stops. ``interval`` is the scan
+    period of the current stream.
+    """
+
+    def __init__(self, open_stream, close_stream=None, on_gap=None, backoff=None, metrics=None):
+        super().__init__(on_gap, metrics)
+        self.open_stream = open_stream
+        self.close_stream = close_stream if close_stream is not None else (lambda stream: stream.stop())
+        self.backoff = backoff if backoff is not None else Backoff()
+        self.interval = None
+        self.blocks = 0
+        self.samples = 0
+        self.skipped = 0
+        self.read_errors = 0
+        self.max_backlog = 0
+        self._last = None  # timestamp of the last scan read
+        self._gap_start = None
+        self._gap_reason = None
+        if metrics is not None:
+            metrics.counter("pv_samples", "Samples acquired", lambda: self.samples)
+            metrics.counter("pv_read_errors", "Failed reads", lambda: self.read_errors)
+            metrics.counter("pv_gaps", "Intervals without samples", lambda: self.gaps)
+            metrics.counter("pv_stream_skipped", "Stream samples skipped by the device",
+                            lambda: self.skipped)
+            metrics.gauge("pv_stream_max_backlog", "Largest device stream backlog seen (samples)",
+                          lambda: self.max_backlog)
+
+    def start(self):
+        if self.running:
+            return
+        self._start_thread("stream")
+
+    def stop(self, timeout=None):
+        """Stop streaming and let the workers drain what is already queued."""
+        self._stop_thread(timeout)
+        if self._gap_start is not None:
+            # The device never came back before the end of acquisition
+            self._emit_gap(Gap(self._gap_start, max(self._gap_start, time.time()), self._gap_reason))
+            self._gap_start = None
+        for worker in self.workers:
+            worker.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            stream = None
+            try:
+                stream = self.open_stream()
+                self.interval = 1.0 / stream.actual_scan_rate
+                self.backoff.reset()
+                if self._gap_start is not None:
+                    self._emit_gap(Gap(self._gap_start, stream.start_time, self._gap_reason))
+                    self._gap_start = None
+                    self._last = stream.start_time
+                while not self._stop.is_set():
+                    block = stream.read()
+                    self.blocks += 1
+                    self.samples += len(block.timestamps)
+                    self.skipped += block.skipped
+                    self.max_backlog = max(self.max_backlog, block.device_backlog)
+                    self._last = block.timestamps[-1]
+                    self._publish(block)
+            except Exception as e:
+                self.read_errors += 1
+                if self._gap_start is None:
+                    print("An error occurred:", str(e))
+                    self._gap_start = self._last if self._last is not None else time.time()
+                    self._gap_reason = str(e) or type(e).__name__
+                self._stop.wait(self.backoff.next_delay())
+            finally:
+                if stream is not None:
+                    try:
+                        self.close_stream(stream)
+                    except Exception:
+                        pass
+
+    def stats(self):
+        return {
+            "blocks": self.blocks,
+            "samples": self.samples,
+            "skipped": self.skipped,
+            "read_errors": self.read_errors,
+            "gaps": self.gaps,
+            "max_backlog": self.max_backlog,
+            "queues": {name: ring.stats() for name, ring in self.queues.items()},
+        }
+
+
+def _interval_buckets(interval, rate=None):
+    # Resolve +/-1 % to +/-50 % around the nominal interval(s), then whole multiples (missed ticks)
+    factors = (0.5, 0.9, 0.95, 0.99, 0.999, 1.001, 1.01, 1.05, 1.1, 1.5, 2.0, 3.0, 5.0, 10.0)
+    intervals = rate.intervals if rate is not None else [interval]
+    return tuple(sorted({nominal * factor for nominal in intervals for factor in factors}))
+
+
+class _Worker:
+    def __init__(self, name, ring, handler, batch_size, poll_interval, stop_event):
+        self.name = name
+        self.ring = ring
+        self.handler = handler
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.stop_event = stop_event
+        self.errors = 0
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name=f"{self.name}-worker",
+                                            daemon=True)
+            self._thread.start()
+
+    def join(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while True:
+            batch = self.ring.get_many(self.batch_size, timeout=self.poll_interval)
+            if batch:
+                try:
+                    self.handler(batch)
+                except Exception as e:
+                    self.errors += 1
+                    print(f"An error occurred in the {self.name} worker:", str(e))
+            elif self.stop_event.is_set():
+                break
@@ -0,0 +1,198 @@
+"""Live current/voltage plot rendered with blitting at a capped frame rate."""
+
+import datetime
+import time
+
+from .ringbuffer import RingBuffer
+
+DEFAULT_LABELS = {
+    "time": "Timestamp",
+    "current": "Current (Amperes)",
+    "voltage": "Voltage (Volts)",
+    "title": "Real-time Data Plot",
+    "current_title": "Real-time Current Plot",
+    "voltage_title": "Real-time Voltage Plot",
+}
+
+# Layouts of the original scripts: one figure with twin y-axes, or one figure per quantity
+TWIN = "twin"
+SEPARATE = "separate"
+
+
+class LivePlot:
+    """Matplotlib window showing the last ``window`` samples of current and voltage.
+
+    add_samples() only stores data in a ring buffer; refresh() redraws at most
+    ``max_fps`` times per second whatever the sample rate. A redraw restores the
+    cached figure background and blits the two lines. The full (slow) figure
+    draw, which also re-caches the background, only happens when the data leaves
+    the current axis limits; the limits are then widened with some headroom so
+    this stays rare. ``current_index``/``voltage_index`` locate the two
+    quantities in the sample values. With a metrics registry every redraw is timed as
+    ``pv_stage_seconds{stage="plot"}``.
+    """
+
+    def __init__(self, window=80, layout=TWIN, labels=None, current_ylim=(0, None),
+                 voltage_ylim=(15, 35), max_fps=2.0, current_index=0, voltage_index=1, metrics=None):
+        # Imported here so headless acquisition never loads matplotlib
+        import matplotlib.dates as mdates
+        import matplotlib.pyplot as plt
+
+        self._plt = plt
+        self._date2num = mdates.date2num
+        self.labels = dict(DEFAULT_LABELS, **(labels or {}))
+        self.buffer = RingBuffer(window, 3)
+        self.current_index = current_index
+        self.voltage_index = voltage_index
+        self.min_interval = 1.0 / max_fps if max_fps else 0.0
+        self.full_draws = 0
+        self.blits = 0
+        self._timer = None
+        if metrics is not None:
+            self._timer = metrics.stage_timer("plot")
+            metrics.counter("pv_plot_full_draws", "Full figure redraws", lambda: self.full_draws)
+            metrics.counter("pv_plot_blits", "Blitted redraws", lambda: self.blits)
+        self._last_render = 0.0
+        self._dirty = False
+        self._backgrounds = {}
+
+        if layout == TWIN:
+            fig, ax1 = plt.subplots()
+            ax2 = ax1.twinx()  # Second y-axis for the voltage
+            self.figures = [fig]
+        elif layout == SEPARATE:
+            fig1, ax1 = plt.subplots()
+            fig2, ax2 = plt.subplots()
+            self.figures = [fig1, fig2]
+        else:
+            raise ValueError(f"Unknown plot layout {layout}")
+        self.axes = [ax1, ax2]
+
+        ax1.set_ylim(*current_ylim)
+        ax2.set_ylim(*voltage_ylim)
+        self.line_current, = ax1.plot([], [], color='blue', label=self.labels["current"])
+        self.line_voltage, = ax2.plot([], [], color='red', label=self.labels["voltage"])
+        self.lines = [self.line_current, self.line_voltage]
+
+        if layout == TWIN:
+            ax1.set_xlabel(self.labels["time"])
+            ax1.set_ylabel(self.labels["current"], color='blue')
+            ax2.set_ylabel(self.labels["voltage"], color='red')
+            ax1.set_title(self.labels["title"])
+            ax1.legend(self.lines, [line.get_label() for line in self.lines])
+        else:
+            for ax, name in ((ax1, "current"), (ax2, "voltage")):
+                ax.set_xlabel(self.labels["time"])
+                ax.set_ylabel(self.labels[name])
+                ax.set_title(self.labels[f"{name}_title"])
+                ax.legend(loc='upper left')
+        for ax in self.axes:
+            ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S'))
+
+        # Lines are drawn by the blitting code only, except on backends that cannot blit
+        self.blitting = all(fig.canvas.supports_blit for fig in self.figures)
+        for line in self.lines:
+            line.set_animated(self.blitting)
+        for fig in self.figures:
+            fig.canvas.mpl_connect("draw_event", self._on_draw)
+
+        plt.show(block=False)
+        for fig in self.figures:
+            fig.canvas.draw()
+
+    def add_samples(self, samples):
+        for sample in samples:
+            x = self._date2num(datetime.datetime.fromtimestamp(sample.timestamp))
+            self.buffer.append((x, sample.values[self.current_index], sample.values[self.voltage_index]))
+            self._dirty = True
+
+    def refresh(self):
+        """Redraw if there is new data and the frame interval has elapsed; keep the GUI responsive."""
+        now = time.monotonic()
+        if self._dirty and now - self._last_render >= self.min_interval:
+            self._render()
+            if self._timer is not None:
+                self._timer.observe(time.monotonic() - now)
+            self._last_render = now
+            self._dirty = False
+        for fig in self.figures:
+            fig.canvas.flush_events()
+
+    def close(self):
+        for fig in self.figures:
+            self._plt.close(fig)
+        self._backgrounds.clear()
+
+    def _render(self):
+        window = self.buffer.view()
+        x = window[:, 0]
+        self.line_current.set_data(x, window[:, 1])
+        self.line_voltage.set_data(x, window[:, 2])
+
+        if self._rescale(window) or not self.blitting:
+            # Full draw; the draw_event handler re-caches the background and draws the lines
+            self.full_draws += 1
+            for fig in self.figures:
+                fig.canvas.draw()
+            return
+
+        for fig in self.figures:
+            canvas = fig.canvas
+            canvas.restore_region(self._backgrounds[fig])
+            self._draw_lines(fig)
+            canvas.blit(fig.bbox)
+        self.blits += 1
+
+    def _rescale(self, window):
+        """Widen the axis limits if the data left them; return True if any limit changed."""
+        changed = False
+        x = window[:, 0]
+        for ax, values in ((self.axes[0], window[:, 1]), (self.axes[1], window[:, 2])):
+            x_min, x_max = ax.get_xlim()
+            if len(x) and not x_min <= x[-1] <= x_max:
+                # Leave room ahead for another half window (at least a minute) before the next rescale
+                span = max(x[-1] - x[0], 1.0 / 1440)
+                ax.set_xlim(x[0], x[-1] + 0.5 * span)
+                changed = True
+
+            y_min, y_max = ax.get_ylim()
+            low, high = values.min(), values.max()
+            if low < y_min or high > y_max:
+                margin = 0.1 * max(high - low, abs(high), 1e-3)
+                ax.set_ylim(min(y_min, low - margin), max(y_max, high + margin))
+                changed = True
+        return changed
+
+    def _draw_lines(self, fig):
+        for line in self.lines:
+            if line.figure is fig:
+                fig.draw_artist(line)
+
+    def _on_draw(self, event):
+        fig = event.canvas.figure
+        if self.blitting:
+            self._backgrounds[fig] = event.canvas.copy_from_bbox(fig.bbox)
+            self._draw_lines(fig)
+
+
+class HeadlessPlot:
+    """Stand-in for LivePlot on machines without a display; matplotlib is never imported."""
+
+    full_draws = 0
+    blits = 0
+
+    def add_samples(self, samples):
+        pass
+
+    def refresh(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def create_plot(headless=False, **options):
+    """Return a LivePlot, or a HeadlessPlot that skips plotting entirely."""
+    if headless:
+        return HeadlessPlot()
+    return LivePlot(**options)
@@ -0,0 +1,339 @@
+"""Fault tolerance: device reconnection with backoff, write-ahead sample log and gap records."""
+
+import collections
+import math
+import os
+import struct
+import threading
+import time
+import zlib
+
+from .channels import BatchedReader, ChannelMap
+
+# Interval without data, in epoch seconds: [start, end)
+Gap = collections.namedtuple("Gap", ["start", "end", "reason"])
+
+
+class DeviceUnavailable(Exception):
+    """Raised by ReconnectingReader while the device is disconnected."""
+
+
+class Backoff:
+    """Exponential backoff delays: initial, initial * factor, ... capped at maximum."""
+
+    def __init__(self, initial=0.5, maximum=30.0, factor=2.0):
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+        self.attempts = 0
+
+    def next_delay(self):
+        delay = min(self.maximum, self.initial * self.factor ** self.attempts)
+        self.attempts += 1
+        return delay
+
+    def reset(self):
+        self.attempts = 0
+
+
+class ReconnectingReader:
+    """BatchedReader that reopens the device after a failure.
+
+    A failed read closes the handle; the next read tries to reopen right away
+    and, while that keeps failing, further attempts are spaced by exponential
+    backoff. Reads in between raise DeviceUnavailable immediately instead of
+    blocking on USB/Ethernet timeouts, so the acquisition schedule is kept and
+    the missing interval is recorded as a gap.
+    """
+
+    def __init__(self, ljm, channel_map=None, device_type="ANY", connection_type="ANY",
+                 identifier="ANY", backoff=None, metrics=None):
+        self.ljm = ljm
+        self.channel_map = channel_map if channel_map is not None else ChannelMap()
+        self.open_args = (device_type, connection_type, identifier)
+        self.backoff = backoff if backoff is not None else Backoff()
+        self.metrics = metrics
+        self.handle = None
+        self.reader = None
+        self.connects = 0
+        self.failures = 0
+        self._next_attempt = 0.0
+        if metrics is not None:
+            metrics.counter("pv_device_connects", "Successful LabJack (re)connections",
+                            lambda: self.connects)
+            metrics.counter("pv_device_failures", "Reads that failed and closed the connection",
+                            lambda: self.failures)
+            metrics.gauge("pv_device_connected", "1 while the LabJack is open",
+                          lambda: int(self.connected))
+
+    @property
+    def connected(self):
+        return self.reader is not None
+
+    def connect(self):
+        self.handle = self.ljm.openS(*self.open_args)
+        self.reader = BatchedReader(self.ljm, self.handle, self.channel_map, self.metrics)
+        self.connects += 1
+        self.backoff.reset()
+        print("Connected to LabJack", self.ljm.getHandleInfo(self.handle))
+
+    def read(self):
+        if self.reader is None:
+            now = time.monotonic()
+            if now < self._next_attempt:
+                raise DeviceUnavailable("LabJack disconnected, waiting to reconnect")
+            try:
+                self.connect()
+            except Exception:
+                self._next_attempt = now + self.backoff.next_delay()
+                raise
+        try:
+            return self.reader.read()
+        except Exception:
+            self.failures += 1
+            self.close()
+            raise
+
+    def close(self):
+        if self.handle is not None:
+            try:
+                self.ljm.close(self.handle)
+            except Exception:
+                pass
+        self.handle = None
+        self.reader = None
+
+
+class SampleLog:
+    """Append-only on-disk log of rows and gaps, replayed after a crash.
+
+    Each record is: kind (1 byte), payload length (uint16), CRC32 of the
+    payload, payload. Rows are (ts_ms int64, value float64, ...), gaps are
+    (start_ms int64, end_ms int64, reason utf-8) and a clean close is
+    (ts_ms int64). A record cut short by a crash fails its length or CRC
+    check and ends the replay.
+
+    Every append is flushed to the operating system, so a crash of the process
+    loses nothing. With ``fsync`` the file is also synced to disk, after every
+    append when ``fsync_interval`` is 0, otherwise at most once per
+    ``fsync_interval`` seconds (and on close): fewer syncs cost less at high
+    rates, but a power failure can then lose the rows appended since the last
+    sync.
+    """
+
+    _HEADER = struct.Struct("<cHI")
+    _ROW = b"R"
+    _GAP = b"G"
+    _CLOSE = b"C"
+
+    def __init__(self, path, fsync=True, fsync_interval=0.0):
+        self.path = path
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.closed_at = None  # set by replay() when the log ends with a clean close
+        self._file = None
+        self._lock = threading.Lock()
+        self._synced_at = None  # monotonic time of the last fsync
+        self._unsynced = False
+
+    def _open(self):
+        if self._file is None:
+            self._file = open(self.path, "ab")
+        return self._file
+
+    def _append(self, records):
+        with self._lock:
+            file = self._open()
+            file.write(b"".join(records))
+            file.flush()
+            if self.fsync:
+                now = time.monotonic()
+                if self._synced_at is None or now - self._synced_at >= self.fsync_interval:
+                    os.fsync(file.fileno())
+                    self._synced_at = now
+                    self._unsynced = False
+                else:
+                    self._unsynced = True
+
+    def _close_file(self):
+        if self._file is not None:
+            if self._unsynced:
+                os.fsync(self._file.fileno())
+                self._unsynced = False
+            self._file.close()
+            self._file = None
+
+    def _record(self, kind, payload):
+        return self._HEADER.pack(kind, len(payload), zlib.crc32(payload)) + payload
+
+    def append_rows(self, rows):
+        records = []
+        for row in rows:
+            payload = struct.pack(f"<q{len(row) - 1}d", int(row[0]), *(float(v) for v in row[1:]))
+            records.append(self._record(self._ROW, payload))
+        if records:
+            self._append(records)
+
+    def append_gap(self, gap):
+        payload = struct.pack("<qq", int(round(gap.start * 1000)), int(round(gap.end * 1000)))
+        payload += str(gap.reason)[:1000].encode("utf-8")
+        self._append([self._record(self._GAP, payload)])
+
+    def append_close(self):
+        """Mark the log as closed on purpose, so its replay is not taken for a crash."""
+        self._append([self._record(self._CLOSE, struct.pack("<q", int(round(time.time() * 1000))))])
+
+    def replay(self):
+        """Return (rows, gaps) found in the log, stopping at the first damaged record."""
+        rows, gaps = [], []
+        self.closed_at = None
+        if not os.path.exists(self.path):
+            return rows, gaps
+        with open(self.path, "rb") as file:
+            data = file.read()
+        offset = 0
+        while offset + self._HEADER.size <= len(data):
+            kind, length, crc = self._HEADER.unpack_from(data, offset)
+            payload = data[offset + self._HEADER.size:offset + self._HEADER.size + length]
+            if len(payload) != length or zlib.crc32(payload) != crc:
+                print("Write-ahead log", self.path, "is damaged after", len(rows), "rows, rest ignored")
+                break
+            if kind == self._ROW:
+                count = (length - 8) // 8
+                values = struct.unpack(f"<q{count}d", payload)
+                rows.append(values)
+                self.closed_at = None
+            elif kind == self._GAP:
+                start_ms, end_ms = struct.unpack_from("<qq", payload)
+                gaps.append(Gap(start_ms / 1000.0, end_ms / 1000.0, payload[16:].decode("utf-8", "replace")))
+                self.closed_at = None
+            elif kind == self._CLOSE:
+                self.closed_at = struct.unpack("<q", payload)[0] / 1000.0
+            offset += self._HEADER.size + length
+        return rows, gaps
+
+    def truncate(self):
+        """Forget everything logged so far (after it has been committed to the store)."""
+        with self._lock:
+            self._unsynced = False  # the rows are in the store, no need to sync them
+            self._close_file()
+            with open(self.path, "wb"):
+                pass
+
+    def close(self, remove=False):
+        with self._lock:
+            self._close_file()
+            if remove and os.path.exists(self.path):
+                os.remove(self.path)
+
+
+class DurableStoreWriter:
+    """StoreWriter front end that logs every row to a SampleLog before queueing it.
+
+    On start the log left by a crashed run is replayed into the store
+    (skipping rows already committed) together with its gaps, and the time
+    from its last sample to the restart is stored as a gap. A log that still
+    exists without a clean-close record means the run crashed; a clean close
+    removes the log, or marks it closed when it has to keep uncommitted rows
+    for the next start. When rows are replayed or a crash is found,
+    ``recovered_since_ms`` is the earliest replayed or last committed sample,
+    from which the caller rebuilds the statistics the previous run left
+    unfinished. During the run
+    the log is truncated every ``checkpoint_interval`` seconds, right after the
+    writer has committed everything queued, so it only ever holds the rows that
+    may not be in SQLite yet. ``fsync_interval`` groups the syncs of the log
+    (see SampleLog).
+    """
+
+    def __init__(self, store, log_path, batch_size=500, flush_interval=5.0, checkpoint_interval=60.0,
+                 metrics=None, fsync_interval=0.0):
+        self.store = store
+        self.log = SampleLog(log_path, fsync_interval=fsync_interval)
+        self.writer = store.writer(batch_size, flush_interval, metrics)
+        self._log_timer = metrics.stage_timer("wal") if metrics is not None else None
+        self.checkpoint_interval = checkpoint_interval
+        self.replayed_rows = 0
+        self.replayed_gaps = 0
+        self.recovered_since_ms = None  # epoch ms from which the aggregates need a rebuild
+        self._pending_gaps = []
+        self._gaps_lock = threading.Lock()
+        self._last_checkpoint = time.monotonic()
+
+    def start(self):
+        crashed = os.path.exists(self.log.path)
+        rows, gaps = self.log.replay()
+        rows = self._fit_rows(rows)
+        interrupted = crashed and self.log.closed_at is None
+        committed_ms = self.store.last_timestamp() if interrupted or rows else None
+        if interrupted or rows:
+            # The statistics of the buckets from here on miss the replayed or unflushed samples
+            times = [row[0] for row in rows] + ([committed_ms] if committed_ms is not None else [])
+            self.recovered_since_ms = min(times) if times else None
+        if interrupted:
+            # Downtime runs from the last moment the log accounts for, a sample or the end of a gap
+            last_ms = max(row[0] for row in rows) if rows else committed_ms
+            known = [last_ms / 1000.0] if last_ms is not None else []
+            known += [gap.end for gap in gaps]
+            if known and max(known) < time.time():
+                gaps.append(Gap(max(known), time.time(), "acquisition interrupted"))
+        if rows or gaps:
+            self.replayed_rows = self.store.insert_rows(rows, skip_existing=True)
+            self.store.write_gaps(gaps)
+            self.replayed_gaps = len(gaps)
+            print("Recovered", self.replayed_rows, "samples and", len(gaps), "gaps from", self.log.path)
+        self.log.truncate()
+        self.writer.start()
+        return self
+
+    def _fit_rows(self, rows):
+        """Pad replayed rows to the store's channels with NaN.
+
+        A log written while the store had fewer channels is padded; rows with
+        more values than the store has channels cannot be placed, so they are
+        not replayed and the log is set aside as ``<log>.bad`` for inspection.
+        """
+        width = len(self.store.channels) + 1
+        wider = sum(1 for row in rows if len(row) > width)
+        if wider:
+            bad_path = self.log.path + ".bad"
+            os.replace(self.log.path, bad_path)
+            print("Write-ahead log", self.log.path, "has", wider, "rows with more values than the store has",
+                  "channels; they were not replayed and the log was moved to", bad_path)
+        return [tuple(row) + (math.nan,) * (width - len(row)) for row in rows if len(row) <= width]
+
+    def write_many(self, rows):
+        rows = [tuple(row) for row in rows]
+        start = time.perf_counter()
+        self.log.append_rows(rows)
+        if self._log_timer is not None:
+            self._log_timer.observe(time.perf_counter() - start)
+        self.writer.write_many(rows)
+        with self._gaps_lock:
+            gaps, self._pending_gaps = self._pending_gaps, []
+        if gaps:
+            self.store.write_gaps(gaps)
+        if time.monotonic() - self._last_checkpoint >= self.checkpoint_interval:
+            self.checkpoint()
+
+    def write_gap(self, gap):
+        """Record a gap; safe to call from the acquisition thread (no database access)."""
+        self.log.append_gap(gap)
+        with self._gaps_lock:
+            self._pending_gaps.append(gap)
+
+    def checkpoint(self):
+        # Rows that failed to commit stay buffered in the writer; keep the log until they are in
+        if self.writer.flush(timeout=30) and not self.writer.buffered:
+            self.log.truncate()
+        self._last_checkpoint = time.monotonic()
+
+    def close(self):
+        with self._gaps_lock:
+            gaps, self._pending_gaps = self._pending_gaps, []
+        if gaps:
+            self.store.write_gaps(gaps)
+        self.writer.close()
+        # Keep the log if rows could not be committed so the next start replays them
+        if self.writer.buffered:
+            self.log.append_close()
+        self.log.close(remove=not self.writer.buffered)
@@ -0,0 +1,77 @@
+"""Fixed-size NumPy circular buffer for the live plot window."""
+
+import numpy as np
+
+
+class RingBuffer:
+    """Preallocated circular buffer of rows with zero-copy chronological views.
+
+    Every row is written twice, at ``i`` and ``i + capacity`` of a buffer of
+    twice the capacity, so the last ``len(self)`` rows are always one contiguous
+    slice. view() therefore returns a NumPy view in oldest-to-newest order
+    without copying, and memory stays constant however long the run lasts.
+    """
+
+    def __init__(self, capacity, columns=1, dtype=np.float64):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = int(capacity)
+        self.columns = int(columns)
+        self._data = np.zeros((2 * self.capacity, self.columns), dtype=dtype)
+        self._next = 0  # slot (0 <= _next < capacity) of the next write
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def full(self):
+        return self._count == self.capacity
+
+    def append(self, row):
+        index = self._next
+        self._data[index] = row
+        self._data[index + self.capacity] = row
+        self._next = (index + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def extend(self, rows):
+        """Append a block of rows (shape (n, columns)); only the last capacity rows are kept."""
+        rows = np.asarray(rows, dtype=self._data.dtype).reshape(-1, self.columns)
+        if len(rows) > self.capacity:
+            rows = rows[-self.capacity:]
+        count = len(rows)
+        if count == 0:
+            return
+        first = self._next
+        stop = first + count
+        if stop <= self.capacity:
+            self._data[first:stop] = rows
+            self._data[first + self.capacity:stop + self.capacity] = rows
+        else:
+            split = self.capacity - first
+            self._data[first:self.capacity] = rows[:split]
+            self._data[first + self.capacity:] = rows[:split]
+            self._data[:count - split] = rows[split:]
+            self._data[self.capacity:self.capacity + count - split] = rows[split:]
+        self._next = stop % self.capacity
+        self._count = min(self._count + count, self.capacity)
+
+    def view(self):
+        """Return the buffered rows, oldest first, as a read-only view (no copy)."""
+        end = self._next if self._next >= self._count else self._next + self.capacity
+        window = self._data[end - self._count:end]
+        window.flags.writeable = False
+        return window
+
+    def column(self, index):
+        return self.view()[:, index]
+
+    def latest(self):
+        if not self._count:
+            return None
+        return self._data[(self._next - 1) % self.capacity]
+
+    def clear(self):
+        self._next = 0
+        self._count = 0
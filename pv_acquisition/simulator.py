@@ -0,0 +1,239 @@
+"""Simulated LabJack backend exposing the subset of the ljm API used here.
+
+FakeLJM can be passed anywhere the real ``labjack.ljm`` module is expected, so
+the acquisition code can run without hardware. It is driven by a signal
+function: a synthetic clear-sky day (``synthetic_pv_signal``) or a recorded run
+replayed from the legacy ``Muhammed_<datetime>.db`` files (``RecordedSignal``),
+optionally sped up with ``time_scaled``.
+"""
+
+import math
+import threading
+import time
+
+import numpy as np
+
+from .store import read_legacy_db
+
+# Divider ratio applied to AIN1 to get the PV voltage (see the main scripts)
+VOLTAGE_DIVIDER = 18.22
+
+
+def synthetic_pv_signal(channel, t):
+    """Return simulated raw AIN readings (volts) for a clear-sky PV string at epoch time t.
+
+    AIN0 carries the current sensor output (1 V per ampere) and AIN1 the
+    voltage divider output, matching the wiring of the main scripts.
+    """
+    t = np.asarray(t, dtype=np.float64)
+    utc_offset = time.localtime(float(t.flat[0])).tm_gmtoff
+    hours = ((t + utc_offset) % 86400.0) / 3600.0
+
+    # Half-sine irradiance between 06:00 and 20:00 with some fast ripple
+    irradiance = np.clip(np.sin(math.pi * (hours - 6.0) / 14.0), 0.0, None)
+    irradiance = irradiance * (1.0 + 0.02 * np.sin(2 * math.pi * t / 7.0))
+    if channel == 0:
+        return 2.8 * irradiance
+    if channel == 1:
+        return (18.0 + 12.0 * np.sqrt(irradiance)) / VOLTAGE_DIVIDER
+    return np.zeros_like(t)
+
+
+class RecordedSignal:
+    """Replay recorded current/voltage as raw AIN readings, looping over the recording.
+
+    The runs of the given legacy database files are played back to back; the
+    replay starts at ``start`` (epoch seconds, default: now) and values between
+    recorded samples are interpolated linearly. AIN0 gets the current (1 V per
+    ampere) and AIN1 the voltage divided by VOLTAGE_DIVIDER, so the channel
+    scales of the main scripts give back the recorded values.
+    """
+
+    def __init__(self, db_files, start=None):
+        if isinstance(db_files, str):
+            db_files = [db_files]
+        times, values = [], []
+        offset = 0.0
+        for db_file in db_files:
+            timestamps, recorded = read_legacy_db(db_file)
+            if not timestamps:
+                continue
+            t = np.array([timestamp.timestamp() for timestamp in timestamps])
+            step = float(np.median(np.diff(t))) if len(t) > 1 else 1.0
+            # Shift each run so it follows the previous one one sample period later
+            t = t - t[0] + offset
+            offset = t[-1] + step
+            times.append(t)
+            values.append(recorded)
+        if not times:
+            raise ValueError(f"No samples in {list(db_files)}")
+        self.times = np.concatenate(times)
+        self.values = np.concatenate(values)
+        self.duration = offset
+        self.start = time.time() if start is None else start
+
+    def __call__(self, channel, t):
+        position = (np.asarray(t, dtype=np.float64) - self.start) % self.duration
+        if channel == 0:
+            return np.interp(position, self.times, self.values[:, 0])
+        if channel == 1:
+            return np.interp(position, self.times, self.values[:, 1]) / VOLTAGE_DIVIDER
+        return np.zeros_like(position)
+
+
+def time_scaled(signal, speed, start=None):
+    """Play ``signal`` ``speed`` times faster from ``start`` (epoch seconds, default: now).
+
+    With speed=60 an hour of a synthetic day or a recording passes in a minute.
+    """
+    start = time.time() if start is None else start
+
+    def scaled(channel, t):
+        return signal(channel, start + (np.asarray(t, dtype=np.float64) - start) * speed)
+
+    return scaled
+
+
+class _Constants:
+    FLOAT32 = 3
+    GND = 199
+
+
+class _Device:
+    def __init__(self, device_type, connection_type, identifier):
+        self.info = (7, 1, 470010000 + id(self) % 1000, 0, 502, 1040)
+        self.registers = {}
+        self.scan_list = None
+        self.scan_rate = None
+        self.scans_per_read = None
+        self.stream_start = None
+        self.scan_count = 0
+
+
+class FakeLJM:
+    """Drop-in replacement for the ``labjack.ljm`` module backed by a signal function.
+
+    ``signal(channel, t)`` returns the raw AIN voltage for channel number
+    ``channel`` at epoch time ``t`` (scalar or NumPy array). With
+    ``realtime=False`` stream reads return immediately instead of waiting for
+    the scans to be due, which is useful for tests and benchmarks.
+    ``read_latency`` (seconds) is added to every command-response read to
+    model the USB or Ethernet round trip of a real T7.
+    """
+
+    constants = _Constants
+
+    def __init__(self, signal=synthetic_pv_signal, realtime=True, read_latency=0.0):
+        self.signal = signal
+        self.realtime = realtime
+        self.read_latency = read_latency
+        self._devices = {}
+        self._next_handle = 1
+        self._lock = threading.Lock()
+
+    # Connection
+    def openS(self, device_type="ANY", connection_type="ANY", identifier="ANY"):
+        with self._lock:
+            handle = self._next_handle
+            self._next_handle += 1
+            self._devices[handle] = _Device(device_type, connection_type, identifier)
+        return handle
+
+    def getHandleInfo(self, handle):
+        return self._device(handle).info
+
+    def close(self, handle):
+        with self._lock:
+            self._devices.pop(handle, None)
+
+    def closeAll(self):
+        with self._lock:
+            self._devices.clear()
+
+    def _device(self, handle):
+        try:
+            return self._devices[handle]
+        except KeyError:
+            raise RuntimeError(f"Invalid handle {handle}") from None
+
+    # Register names and addresses
+    @staticmethod
+    def namesToAddresses(numFrames, aNames, aNumRegs=None):
+        addresses = []
+        for name in aNames[:numFrames]:
+            if not name.startswith("AIN") or not name[3:].isdigit():
+                raise ValueError(f"Unsupported register name {name}")
+            addresses.append(2 * int(name[3:]))
+        return addresses, [_Constants.FLOAT32] * len(addresses)
+
+    @staticmethod
+    def nameToAddress(name):
+        addresses, types = FakeLJM.namesToAddresses(1, [name])
+        return addresses[0], types[0]
+
+    # Command-response reads and writes
+    def _read_address(self, address, t):
+        return float(self.signal(address // 2, t))
+
+    def _round_trip(self):
+        if self.read_latency > 0:
+            time.sleep(self.read_latency)
+
+    def eReadName(self, handle, name):
+        self._device(handle)
+        self._round_trip()
+        return self._read_address(self.nameToAddress(name)[0], time.time())
+
+    def eReadNames(self, handle, numFrames, aNames):
+        addresses, _ = self.namesToAddresses(numFrames, aNames)
+        return self.eReadAddresses(handle, numFrames, addresses, None)
+
+    def eReadAddresses(self, handle, numFrames, aAddresses, aDataTypes):
+        self._device(handle)
+        self._round_trip()
+        t = time.time()
+        return [self._read_address(address, t) for address in aAddresses[:numFrames]]
+
+    def eWriteName(self, handle, name, value):
+        self._device(handle).registers[name] = value
+
+    def eWriteNames(self, handle, numFrames, aNames, aValues):
+        registers = self._device(handle).registers
+        for name, value in zip(aNames[:numFrames], aValues[:numFrames]):
+            registers[name] = value
+
+    # Stream mode
+    def eStreamStart(self, handle, scansPerRead, numAddresses, aScanList, scanRate):
+        device = self._device(handle)
+        if device.scan_list is not None:
+            raise RuntimeError("Stream is already active")
+        device.scan_list = list(aScanList[:numAddresses])
+        device.scan_rate = float(scanRate)
+        device.scans_per_read = int(scansPerRead)
+        device.stream_start = time.time()
+        device.scan_count = 0
+        return device.scan_rate
+
+    def eStreamRead(self, handle):
+        device = self._device(handle)
+        if device.scan_list is None:
+            raise RuntimeError("Stream is not active")
+        first = device.scan_count
+        device.scan_count += device.scans_per_read
+        due = device.stream_start + device.scan_count / device.scan_rate
+        if self.realtime:
+            delay = due - time.time()
+            if delay > 0:
+                time.sleep(delay)
+
+        t = device.stream_start + np.arange(first, device.scan_count) / device.scan_rate
+        columns = [np.asarray(self.signal(address // 2, t), dtype=np.float64) * np.ones_like(t)
+                   for address in device.scan_list]
+        data = np.column_stack(columns).ravel()
+        return data.tolist(), 0, 0
+
+    def eStreamStop(self, handle):
+        device = self._device(handle)
+        if device.scan_list is None:
+            raise RuntimeError("Stream is not running")
+        device.scan_list = None
@@ -0,0 +1,144 @@
+"""Precomputed sunrise/sunset schedule driving the daily acquisition window."""
+
+import datetime
+import json
+import os
+
+# Coordinates of the installation (decimal degrees)
+LATITUDE = '34.0181'
+LONGITUDE = '-5.0078'
+
+
+class SolarSchedule:
+    """Sunrise and sunset for every day of a year, computed once with ephem and cached on disk.
+
+    Times are stored as epoch seconds, so lookups do not depend on the machine
+    time zone. A day is the calendar date at the site longitude (local mean
+    time). Each year is computed (or loaded from its JSON cache file) the first
+    time one of its days is needed; after that every lookup is a dict access.
+    The acquisition window of a day runs from ``margin_minutes`` before
+    sunrise to ``margin_minutes`` after sunset.
+    """
+
+    def __init__(self, latitude=LATITUDE, longitude=LONGITUDE, margin_minutes=5, cache_dir="."):
+        self.latitude = str(latitude)
+        self.longitude = str(longitude)
+        self.margin = margin_minutes * 60.0
+        self.cache_dir = cache_dir
+        self._utc_offset = float(self.longitude) / 15.0 * 3600.0  # local mean time
+        self._days = {}
+        self._years = set()
+
+    # Day table
+    def cache_file(self, year):
+        return os.path.join(self.cache_dir, f"solar_{self.latitude}_{self.longitude}_{year}.json")
+
+    def _load_year(self, year):
+        path = self.cache_file(year)
+        days = None
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as file:
+                    cached = json.load(file)
+                if cached["latitude"] == self.latitude and cached["longitude"] == self.longitude:
+                    days = cached["days"]
+            except (OSError, ValueError, KeyError) as e:
+                print("Ignoring unreadable solar schedule cache", path, ":", str(e))
+        if days is None:
+            days = self._compute_year(year)
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                with open(path, "w", encoding="utf-8") as file:
+                    json.dump({"latitude": self.latitude, "longitude": self.longitude,
+                               "year": year, "days": days}, file)
+            except OSError as e:
+                print("Could not write solar schedule cache", path, ":", str(e))
+        for key, times in days.items():
+            self._days[datetime.date.fromisoformat(key)] = tuple(times) if times else None
+        self._years.add(year)
+
+    def _compute_year(self, year):
+        # Only needed on a cache miss, so ephem is imported here
+        import ephem
+
+        observer = ephem.Observer()
+        observer.lat = self.latitude
+        observer.lon = self.longitude
+        sun = ephem.Sun()
+
+        days = {}
+        day = datetime.date(year, 1, 1)
+        while day.year == year:
+            # Search around local solar noon so both events belong to this day
+            noon = (datetime.datetime(day.year, day.month, day.day, 12)
+                    - datetime.timedelta(seconds=self._utc_offset))
+            observer.date = ephem.Date(noon)
+            try:
+                sunrise = observer.previous_rising(sun)
+                sunset = observer.next_setting(sun)
+                times = [_epoch(sunrise), _epoch(sunset)]
+            except ephem.AlwaysUpError:
+                start = _epoch(ephem.Date(noon - datetime.timedelta(hours=12)))
+                times = [start, start + 86400.0]
+            except ephem.NeverUpError:
+                times = None
+            days[day.isoformat()] = times
+            day += datetime.timedelta(days=1)
+        return days
+
+    def site_date(self, t):
+        """Calendar date at the site longitude for epoch time t."""
+        return datetime.datetime.fromtimestamp(t + self._utc_offset, datetime.timezone.utc).date()
+
+    def day(self, date):
+        """Return (sunrise, sunset) in epoch seconds for a date, or None during polar night."""
+        if date.year not in self._years:
+            self._load_year(date.year)
+        return self._days[date]
+
+    # Acquisition window
+    def window(self, date):
+        """Return (start, end) of the acquisition window of a date in epoch seconds, or None."""
+        times = self.day(date)
+        if times is None:
+            return None
+        return times[0] - self.margin, times[1] + self.margin
+
+    def is_active(self, t):
+        return self.active_until(t) is not None
+
+    def active_until(self, t):
+        """End of the window containing t, or None if t is outside every window."""
+        date = self.site_date(t)
+        for day in (date - datetime.timedelta(days=1), date):
+            window = self.window(day)
+            if window is not None and window[0] <= t <= window[1]:
+                return window[1]
+        return None
+
+    def next_window(self, t):
+        """Return the (start, end) of the window containing t or of the next one."""
+        date = self.site_date(t) - datetime.timedelta(days=1)
+        for _ in range(400):
+            window = self.window(date)
+            if window is not None and window[1] >= t:
+                return window
+            date += datetime.timedelta(days=1)
+        raise RuntimeError("No sunrise within a year")
+
+    def seconds_until_active(self, t):
+        start, _ = self.next_window(t)
+        return max(0.0, start - t)
+
+    def sun_event_distance(self, t):
+        """Seconds between t and the closest sunrise or sunset, or None if there is none nearby."""
+        date = self.site_date(t)
+        distances = [abs(t - event)
+                     for day in (date - datetime.timedelta(days=1), date, date + datetime.timedelta(days=1))
+                     for event in (self.day(day) or ())]
+        return min(distances) if distances else None
+
+
+def _epoch(ephem_date):
+    return ephem_date.datetime().replace(tzinfo=datetime.timezone.utc).timestamp()
+
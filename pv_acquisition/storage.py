@@ -0,0 +1,188 @@
+"""SQLite persistence for acquired samples."""
+
+import queue
+import sqlite3
+import threading
+import time
+
+# Column layout of the tables created by the main scripts
+DEFAULT_COLUMNS = [
+    ("timestamp", "DATETIME"),
+    ("current_amperes", "REAL"),
+    ("voltage_volts", "REAL"),
+]
+
+_FLUSH = object()
+_STOP = object()
+
+
+def connect(db_file, synchronous="NORMAL", check_same_thread=True):
+    """Open a SQLite connection in WAL mode.
+
+    WAL lets readers (plots, exports) work while the writer appends, and with
+    synchronous=NORMAL a commit no longer waits for an fsync of the database;
+    only checkpoints do.
+    """
+    conn = sqlite3.connect(db_file, check_same_thread=check_same_thread)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA synchronous={synchronous}")
+    return conn
+
+
+class BatchWriter:
+    """Commit rows from a background thread in batched transactions.
+
+    write() only puts the row on a queue, so the acquisition loop never waits
+    for the disk. The writer thread opens its connection with
+    ``open_connection()`` and hands the buffered rows to
+    ``write_rows(conn, rows)``, which stores them in one transaction, every
+    ``batch_size`` rows or ``flush_interval`` seconds, whichever comes first.
+    If a write fails the rows stay buffered and are retried on the next flush.
+    With a metrics registry every commit is timed as
+    ``pv_stage_seconds{stage="persist"}``.
+    """
+
+    def __init__(self, open_connection, write_rows, batch_size=500, flush_interval=5.0, metrics=None):
+        self._open_connection = open_connection
+        self._write_rows = write_rows
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self.rows_written = 0
+        self.buffered = 0
+        self.flush_count = 0
+        self.errors = 0
+        self.last_error = None
+        self._timer = None
+        if metrics is not None:
+            self._timer = metrics.stage_timer("persist")
+            metrics.counter("pv_rows_written", "Rows committed to SQLite", lambda: self.rows_written)
+            metrics.counter("pv_write_errors", "Failed SQLite commits", lambda: self.errors)
+            metrics.gauge("pv_rows_buffered", "Rows waiting to be committed", lambda: self.buffered)
+
+        self._queue = queue.Queue()
+        self._ready = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sqlite-writer", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self.last_error is not None:
+            raise self.last_error
+        return self
+
+    def write(self, row):
+        self._queue.put(tuple(row))
+
+    def write_many(self, rows):
+        self._queue.put([tuple(row) for row in rows])
+
+    def flush(self, timeout=None):
+        """Ask the writer thread to commit what it has buffered and wait for it."""
+        done = threading.Event()
+        self._queue.put((_FLUSH, done))
+        return done.wait(timeout)
+
+    def close(self, timeout=None):
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _run(self):
+        try:
+            conn = self._open_connection()
+        except Exception as e:
+            self.last_error = e
+            self._ready.set()
+            return
+        self._ready.set()
+
+        buffer = []
+        next_flush = time.monotonic() + self.flush_interval
+        stopping = False
+        while not stopping:
+            timeout = max(0.0, next_flush - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            flush_done = None
+            if item is _STOP:
+                stopping = True
+            elif isinstance(item, tuple) and item and item[0] is _FLUSH:
+                flush_done = item[1]
+            elif isinstance(item, list):
+                buffer.extend(item)
+            elif item is not None:
+                buffer.append(item)
+
+            now = time.monotonic()
+            if stopping or flush_done is not None or len(buffer) >= self.batch_size or now >= next_flush:
+                buffer = self._flush(conn, buffer)
+                self.buffered = len(buffer)
+                next_flush = now + self.flush_interval
+            if flush_done is not None:
+                flush_done.set()
+
+        conn.close()
+
+    def _flush(self, conn, buffer):
+        if not buffer:
+            return buffer
+        start = time.perf_counter()
+        try:
+            self._write_rows(conn, buffer)
+        except Exception as e:
+            self.errors += 1
+            self.last_error = e
+            print("An error occurred while writing to the database:", str(e))
+            return buffer
+        if self._timer is not None:
+            self._timer.observe(time.perf_counter() - start)
+        self.rows_written += len(buffer)
+        self.flush_count += 1
+        return []
+
+
+class BufferedSQLiteWriter(BatchWriter):
+    """BatchWriter appending rows to one table (created if needed) with a single executemany."""
+
+    def __init__(self, db_file, table_name, columns=DEFAULT_COLUMNS, batch_size=500,
+                 flush_interval=5.0, synchronous="NORMAL", metrics=None):
+        super().__init__(self._open, self._write, batch_size, flush_interval, metrics)
+        self.db_file = db_file
+        self.table_name = table_name
+        self.columns = list(columns)
+        self.synchronous = synchronous
+
+        column_names = ", ".join(name for name, _ in self.columns)
+        placeholders = ", ".join("?" for _ in self.columns)
+        self.insert_query = f"INSERT INTO {table_name} ({column_names}) VALUES ({placeholders})"
+
+    def create_table_query(self):
+        column_defs = ",\n".join(f"            {name} {sql_type}" for name, sql_type in self.columns)
+        return f'''
+        CREATE TABLE IF NOT EXISTS {self.table_name} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+{column_defs}
+        )
+    '''
+
+    def _open(self):
+        conn = connect(self.db_file, self.synchronous)
+        conn.execute(self.create_table_query())
+        conn.commit()
+        return conn
+
+    def _write(self, conn, rows):
+        with conn:
+            conn.executemany(self.insert_query, rows)
@@ -0,0 +1,369 @@
+"""Single long-lived time-series store partitioned by day or month.
+
+All acquisition runs write to one SQLite database. Samples are stored in one
+table per partition (``samples_YYYYMM`` or ``samples_YYYYMMDD``, UTC) with the
+timestamp as integer epoch milliseconds and one REAL column per channel. Each
+partition has an index on the timestamp and a row in the ``partitions``
+registry, so a range query only opens the partitions it overlaps and reads
+them with index range scans.
+"""
+
+import contextlib
+import datetime
+import math
+import os
+import re
+import sqlite3
+import threading
+
+import numpy as np
+
+from .aggregate import AggregationEngine
+from .storage import BatchWriter, connect
+
+DAILY = "daily"
+MONTHLY = "monthly"
+
+_PARTITION_UNITS = {DAILY: ("datetime64[D]", "%Y%m%d"), MONTHLY: ("datetime64[M]", "%Y%m")}
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS partitions (
+        name TEXT PRIMARY KEY,
+        start_ms INTEGER NOT NULL,
+        end_ms INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS channels (
+        position INTEGER PRIMARY KEY,
+        name TEXT UNIQUE NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS gaps (
+        start_ms INTEGER NOT NULL,
+        end_ms INTEGER NOT NULL,
+        reason TEXT,
+        PRIMARY KEY (start_ms, end_ms)
+    );
+    CREATE TABLE IF NOT EXISTS settings (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    );
+"""
+
+
+def to_epoch_ms(timestamps):
+    """Convert epoch seconds, datetimes or datetime64 values to int64 epoch milliseconds."""
+    if isinstance(timestamps, datetime.datetime):
+        return int(round(timestamps.timestamp() * 1000))
+    if isinstance(timestamps, (int, float, np.integer, np.floating)):
+        return int(round(float(timestamps) * 1000))
+    array = np.asarray(timestamps)
+    if np.issubdtype(array.dtype, np.datetime64):
+        return array.astype("datetime64[ms]").astype(np.int64)
+    if array.dtype == object:
+        return np.array([to_epoch_ms(value) for value in array.ravel()], dtype=np.int64)
+    return np.round(array.astype(np.float64) * 1000).astype(np.int64)
+
+
+def _merge_expression(field):
+    """SET clause merging the stored value of an aggregate column with the new one (``excluded``)."""
+    if field == "count":
+        return "count = count + excluded.count"
+    if field.endswith(("_min", "_max")):
+        function = field[-3:]
+        return f"{field} = coalesce({function}({field}, excluded.{field}), {field}, excluded.{field})"
+    if field.endswith("_mean"):
+        return (f"{field} = CASE WHEN {field} IS NULL THEN excluded.{field} "
+                f"WHEN excluded.{field} IS NULL THEN {field} "
+                f"ELSE ({field} * count + excluded.{field} * excluded.count) / (count + excluded.count) END")
+    return f"{field} = coalesce({field}, 0) + coalesce(excluded.{field}, 0)"
+
+
+class TimeSeriesStore:
+    """Partitioned SQLite store with NumPy range queries.
+
+    ``partition`` (daily or monthly) applies when the store is created; an
+    existing store keeps the scheme recorded in its settings.
+    """
+
+    def __init__(self, db_file, channels=("current", "voltage"), partition=MONTHLY,
+                 synchronous="NORMAL"):
+        for name in channels:
+            if not _IDENTIFIER.match(name):
+                raise ValueError(f"Invalid channel name {name!r}")
+        self.db_file = db_file
+        self.synchronous = synchronous
+        self._lock = threading.Lock()
+        self._known_partitions = set()
+
+        self.conn = self.connect(check_same_thread=False)
+        with self.conn:
+            row = self.conn.execute("SELECT value FROM settings WHERE key = 'partition'").fetchone()
+            if row is None:
+                if partition not in _PARTITION_UNITS:
+                    raise ValueError(f"Unknown partition scheme {partition!r}")
+                self.conn.execute("INSERT INTO settings VALUES ('partition', ?)", (partition,))
+            else:
+                partition = row[0]
+            self.partition = partition
+            self.channels = self._ensure_channels(self.conn, list(channels))
+        self._known_partitions.update(
+            name for name, in self.conn.execute("SELECT name FROM partitions"))
+
+    def connect(self, check_same_thread=True):
+        """Open another connection to the store (e.g. for a writer thread)."""
+        conn = connect(self.db_file, self.synchronous, check_same_thread)
+        conn.executescript(_SCHEMA)
+        return conn
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    def _ensure_channels(self, conn, channels):
+        known = [name for name, in conn.execute("SELECT name FROM channels ORDER BY position")]
+        for name in channels:
+            if name not in known:
+                conn.execute("INSERT INTO channels (position, name) VALUES (?, ?)", (len(known), name))
+                for partition, in conn.execute("SELECT name FROM partitions").fetchall():
+                    conn.execute(f"ALTER TABLE {partition} ADD COLUMN {name} REAL")
+                known.append(name)
+        return known
+
+    # Partitions
+    def partition_bounds(self, ts_ms):
+        """Return (name, start_ms, end_ms) of the partition holding epoch millisecond ts_ms."""
+        unit, name_format = _PARTITION_UNITS[self.partition]
+        start = np.datetime64(int(ts_ms), "ms").astype(unit)
+        end = start + 1
+        name = "samples_" + start.astype(datetime.datetime).strftime(name_format)
+        return (name, int(start.astype("datetime64[ms]").astype(np.int64)),
+                int(end.astype("datetime64[ms]").astype(np.int64)))
+
+    def _ensure_partition(self, conn, name, start_ms, end_ms):
+        if name in self._known_partitions:
+            return
+        columns = "".join(f", {channel} REAL" for channel in self.channels)
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {name} (ts_ms INTEGER NOT NULL{columns})")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name}_ts ON {name} (ts_ms)")
+        conn.execute("INSERT OR IGNORE INTO partitions VALUES (?, ?, ?)", (name, start_ms, end_ms))
+
+    # Writing
+    def insert_rows(self, rows, conn=None, skip_existing=False):
+        """Insert (ts_ms, value, ...) rows, values in channel order, in one transaction.
+
+        With skip_existing, rows whose timestamp is already stored are left out
+        (used when replaying a write-ahead log). Returns the number of rows inserted.
+        """
+        rows = list(rows)
+        if not rows:
+            return 0
+        groups = {}
+        unit, _ = _PARTITION_UNITS[self.partition]
+        keys = np.array([row[0] for row in rows], dtype=np.int64).astype("datetime64[ms]").astype(unit)
+        for key, row in zip(keys, rows):
+            groups.setdefault(key, []).append(row)
+
+        placeholders = ", ".join("?" for _ in range(len(self.channels) + 1))
+        column_names = ", ".join(["ts_ms"] + self.channels)
+        created = []
+        inserted = 0
+        with self._lock if conn is None else contextlib.nullcontext():
+            target = self.conn if conn is None else conn
+            with target:
+                for group in groups.values():
+                    name, start_ms, end_ms = self.partition_bounds(group[0][0])
+                    self._ensure_partition(target, name, start_ms, end_ms)
+                    created.append(name)
+                    if skip_existing:
+                        times = [row[0] for row in group]
+                        existing = {ts for ts, in target.execute(
+                            f"SELECT ts_ms FROM {name} WHERE ts_ms >= ? AND ts_ms <= ?",
+                            (min(times), max(times)))}
+                        group = [row for row in group if row[0] not in existing]
+                    target.executemany(f"INSERT INTO {name} ({column_names}) VALUES ({placeholders})",
+                                       group)
+                    inserted += len(group)
+        # Only remember partitions once their creation is committed
+        self._known_partitions.update(created)
+        return inserted
+
+    def insert(self, timestamps, values, conn=None):
+        """Insert a block: timestamps (epoch seconds or datetimes) and values (n, channels)."""
+        ts_ms = np.atleast_1d(to_epoch_ms(timestamps))
+        values = np.asarray(values, dtype=np.float64).reshape(len(ts_ms), len(self.channels))
+        return self.insert_rows(((int(ts),) + tuple(row) for ts, row in zip(ts_ms, values.tolist())), conn)
+
+    def writer(self, batch_size=500, flush_interval=5.0, metrics=None):
+        """Return a background writer that batches rows into this store."""
+        return StoreWriter(self, batch_size, flush_interval, metrics)
+
+    # Reading
+    def partitions_between(self, start_ms, end_ms):
+        with self._lock:
+            return [name for name, in self.conn.execute(
+                "SELECT name FROM partitions WHERE end_ms > ? AND start_ms < ? ORDER BY start_ms",
+                (start_ms, end_ms))]
+
+    def last_timestamp(self):
+        """Epoch milliseconds of the newest sample, or None if the store is empty."""
+        with self._lock:
+            partitions = self.conn.execute("SELECT name FROM partitions ORDER BY start_ms DESC").fetchall()
+            for name, in partitions:
+                last, = self.conn.execute(f"SELECT MAX(ts_ms) FROM {name}").fetchone()
+                if last is not None:
+                    return last
+        return None
+
+    def query(self, start, end, channels=None):
+        """Return (timestamps_ms, values) for start <= t < end.
+
+        start/end are epoch seconds or datetimes. values has one column per
+        requested channel (all channels by default); missing values are NaN.
+        """
+        channels = list(self.channels if channels is None else channels)
+        for name in channels:
+            if name not in self.channels:
+                raise KeyError(f"Unknown channel {name!r}")
+        start_ms, end_ms = to_epoch_ms(start), to_epoch_ms(end)
+
+        chunks = []
+        select = ", ".join(["ts_ms"] + channels)
+        for partition in self.partitions_between(start_ms, end_ms):
+            with self._lock:
+                rows = self.conn.execute(
+                    f"SELECT {select} FROM {partition} WHERE ts_ms >= ? AND ts_ms < ? ORDER BY ts_ms",
+                    (start_ms, end_ms)).fetchall()
+            if rows:
+                chunks.append(np.array(rows, dtype=np.float64))
+        if not chunks:
+            return np.empty(0, dtype=np.int64), np.empty((0, len(channels)), dtype=np.float64)
+        data = np.concatenate(chunks)
+        return data[:, 0].astype(np.int64), data[:, 1:]
+
+    # Gaps: intervals without data (see recovery.py)
+    def write_gaps(self, gaps):
+        """Record (start, end, reason) intervals without data, times in epoch seconds."""
+        rows = [(to_epoch_ms(gap[0]), to_epoch_ms(gap[1]), gap[2]) for gap in gaps]
+        if not rows:
+            return
+        with self._lock, self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO gaps VALUES (?, ?, ?)", rows)
+
+    def query_gaps(self, start, end):
+        """Return the (start_ms, end_ms, reason) gaps overlapping [start, end)."""
+        with self._lock:
+            return self.conn.execute(
+                "SELECT start_ms, end_ms, reason FROM gaps WHERE end_ms > ? AND start_ms < ? "
+                "ORDER BY start_ms", (to_epoch_ms(start), to_epoch_ms(end))).fetchall()
+
+    # Pre-aggregated statistics (see aggregate.py)
+    def write_aggregates(self, records, replace=False):
+        """Store per-period records, one ``aggregates_<period>s`` table per period.
+
+        Records are namedtuples whose fields are period, start_ms, count and
+        then the statistics. A bucket written again (e.g. its first samples came
+        before a restart and the rest after) is merged with the stored row:
+        counts and energy are added, minima and maxima combined and means
+        weighted by count. With replace, the records overwrite the stored rows.
+        """
+        by_period = {}
+        for record in records:
+            by_period.setdefault(int(record.period), []).append(record)
+        if not by_period:
+            return
+        with self._lock, self.conn:
+            for period, group in by_period.items():
+                fields = group[0]._fields[1:]
+                table = f"aggregates_{period}s"
+                columns = ", ".join(f"{field} REAL" for field in fields[2:])
+                self.conn.execute(f"CREATE TABLE IF NOT EXISTS {table} "
+                                  f"(start_ms INTEGER PRIMARY KEY, count INTEGER, {columns})")
+                placeholders = ", ".join("?" for _ in fields)
+                query = f"INSERT INTO {table} ({', '.join(fields)}) VALUES ({placeholders})"
+                if replace:
+                    query = query.replace("INSERT", "INSERT OR REPLACE", 1)
+                else:
+                    updates = ", ".join(_merge_expression(field) for field in fields[1:])
+                    query += f" ON CONFLICT (start_ms) DO UPDATE SET {updates}"
+                self.conn.executemany(query, [tuple(record)[1:] for record in group])
+
+    def rebuild_aggregates(self, start, end, current="current", voltage="voltage", periods=(60, 3600),
+                           max_gap=300.0):
+        """Recompute the records of the buckets overlapping [start, end) from the stored samples.
+
+        The range is widened to whole buckets of the longest period, and the
+        samples up to ``max_gap`` seconds before it are read too so the energy
+        of its first interval is counted. The records replace the stored ones
+        and are returned.
+        """
+        longest = max(periods)
+        first = math.floor(to_epoch_ms(start) / 1000.0 / longest) * longest
+        last = math.ceil(to_epoch_ms(end) / 1000.0 / longest) * longest
+        timestamps_ms, values = self.query(first - max_gap, last, [current, voltage])
+        engine = AggregationEngine(periods, max_gap=max_gap)
+        records = engine.add_block(timestamps_ms / 1000.0, values) + engine.flush()
+        records = [record for record in records if record.start_ms >= first * 1000]
+        self.write_aggregates(records, replace=True)
+        return records
+
+    def query_aggregates(self, period, start, end):
+        """Return the records of ``period`` seconds starting in [start, end) as a dict of arrays."""
+        table = f"aggregates_{int(period)}s"
+        with self._lock:
+            if self.conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                 (table,)).fetchone() is None:
+                return {}
+            cursor = self.conn.execute(f"SELECT * FROM {table} WHERE start_ms >= ? AND start_ms < ? "
+                                       "ORDER BY start_ms", (to_epoch_ms(start), to_epoch_ms(end)))
+            names = [description[0] for description in cursor.description]
+            rows = cursor.fetchall()
+        data = np.array(rows, dtype=np.float64).reshape(len(rows), len(names))
+        result = {name: data[:, i] for i, name in enumerate(names)}
+        result["start_ms"] = result["start_ms"].astype(np.int64)
+        result["count"] = result["count"].astype(np.int64)
+        return result
+
+
+class StoreWriter(BatchWriter):
+    """BatchWriter feeding (ts_ms, value, ...) rows into a TimeSeriesStore."""
+
+    def __init__(self, store, batch_size=500, flush_interval=5.0, metrics=None):
+        super().__init__(store.connect, self._insert, batch_size, flush_interval, metrics)
+        self.store = store
+
+    def _insert(self, conn, rows):
+        self.store.insert_rows(rows, conn)
+
+
+def read_legacy_db(db_file):
+    """Read a per-run ``Muhammed_<datetime>.db`` file.
+
+    Those files hold one table named like the file with local-time DATETIME
+    timestamps and current_amperes/voltage_volts columns. Returns the naive
+    local datetimes and an (n, 2) array of current and voltage, in time order.
+    """
+    conn = sqlite3.connect(db_file)
+    try:
+        table_name = os.path.splitext(os.path.basename(db_file))[0]
+        rows = conn.execute(f"SELECT timestamp, current_amperes, voltage_volts FROM {table_name} "
+                            "ORDER BY timestamp").fetchall()
+    finally:
+        conn.close()
+    timestamps = [datetime.datetime.fromisoformat(timestamp) for timestamp, _, _ in rows]
+    values = np.array([row[1:] for row in rows], dtype=np.float64).reshape(-1, 2)
+    return timestamps, values
+
+
+def import_legacy_db(store, db_file):
+    """Copy the samples of a per-run ``Muhammed_<datetime>.db`` file into the store.
+
+    Returns the number of rows imported.
+    """
+    timestamps, legacy = read_legacy_db(db_file)
+    if not timestamps:
+        return 0
+    values = np.full((len(timestamps), len(store.channels)), np.nan)
+    values[:, store.channels.index("current")] = legacy[:, 0]
+    values[:, store.channels.index("voltage")] = legacy[:, 1]
+    store.insert(timestamps, values)
+    return len(timestamps)
@@ -0,0 +1,254 @@
+"""Asyncio supervisor acquiring from several LabJack devices in one process."""
+
+import asyncio
+import collections
+import concurrent.futures
+import json
+import math
+import time
+
+import numpy as np
+
+from .channels import BatchedReader, Channel, ChannelMap
+from .store import TimeSeriesStore
+
+# One device of the plant and how often to read it (seconds)
+DeviceConfig = collections.namedtuple(
+    "DeviceConfig", ["name", "identifier", "channels", "interval", "device_type", "connection_type"]
+)
+
+
+def device_config(name, identifier="ANY", channels=None, interval=5.0, device_type="ANY",
+                  connection_type="ANY"):
+    if not isinstance(channels, ChannelMap):
+        channels = ChannelMap(channels) if channels else ChannelMap()
+    return DeviceConfig(name, str(identifier), channels, float(interval), device_type, connection_type)
+
+
+def load_device_configs(path):
+    """Load devices from a JSON list such as
+
+    [{"name": "array1", "identifier": "470012345", "interval": 5,
+      "channels": [{"name": "current", "ain": 0, "scale": 1.0, "unit": "A"}, ...]}, ...]
+    """
+    with open(path, "r", encoding="utf-8") as file:
+        entries = json.load(file)
+    devices = []
+    for entry in entries:
+        channels = None
+        if "channels" in entry:
+            channels = ChannelMap([Channel(c["name"], int(c["ain"]), float(c.get("scale", 1.0)),
+                                           c.get("unit", "V")) for c in entry["channels"]])
+        devices.append(device_config(entry["name"], entry.get("identifier", "ANY"), channels,
+                                     entry.get("interval", 5.0), entry.get("device_type", "ANY"),
+                                     entry.get("connection_type", "ANY")))
+    return devices
+
+
+class DeviceState:
+    """Connection and counters of one supervised device."""
+
+    def __init__(self, config):
+        self.config = config
+        self.handle = None
+        self.reader = None
+        self.executor = None
+        self.samples = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.last_sample = None
+
+    @property
+    def connected(self):
+        return self.reader is not None
+
+    def stats(self):
+        return {"connected": self.connected, "samples": self.samples, "errors": self.errors,
+                "timeouts": self.timeouts, "connects": self.connects, "last_sample": self.last_sample}
+
+
+class DeviceSupervisor:
+    """Read N devices concurrently and merge their samples into time-aligned rows.
+
+    Every device has its own task and its own single worker thread for the
+    blocking LJM calls, so a slow or unplugged unit only delays itself: a read
+    that takes longer than ``read_timeout`` is abandoned, the device is marked
+    disconnected and reopened after ``retry_delay`` while the others keep
+    going. Reads are scheduled on the epoch grid of each device's interval, so
+    devices with the same interval share timestamps. Values for the same
+    timestamp are merged into one row of ``columns`` (``<device>_<channel>``),
+    with NaN for devices that did not report within ``merge_delay`` seconds,
+    and handed to ``write_rows`` as lists of (ts_ms, value, ...) tuples sorted by time.
+    """
+
+    def __init__(self, ljm, devices, write_rows, read_timeout=5.0, retry_delay=5.0, merge_delay=None):
+        names = [device.name for device in devices]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Duplicate device names in {names}")
+        self.ljm = ljm
+        self.devices = list(devices)
+        self.write_rows = write_rows
+        self.read_timeout = read_timeout
+        self.retry_delay = retry_delay
+        self.merge_delay = merge_delay if merge_delay is not None else read_timeout + 1.0
+        self.states = {device.name: DeviceState(device) for device in self.devices}
+
+        self.columns = []
+        self._offsets = {}
+        for device in self.devices:
+            self._offsets[device.name] = len(self.columns)
+            self.columns += [f"{device.name}_{name}" for name in device.channels.names]
+        self.rows_written = 0
+        self._pending = {}
+        self._stop = None
+
+    # Running
+    def run(self, duration=None):
+        """Blocking entry point: supervise until stop() or for ``duration`` seconds."""
+        asyncio.run(self.run_async(duration))
+
+    async def run_async(self, duration=None):
+        self._stop = asyncio.Event()
+        tasks = [asyncio.create_task(self._device_loop(state)) for state in self.states.values()]
+        tasks.append(asyncio.create_task(self._merge_loop()))
+        try:
+            if duration is None:
+                await self._stop.wait()
+            else:
+                try:
+                    await asyncio.wait_for(self._stop.wait(), duration)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self._emit(force=True)
+            for state in self.states.values():
+                self._disconnect(state)
+
+    def stop(self):
+        if self._stop is not None:
+            self._stop.set()
+
+    def stats(self):
+        return {"rows_written": self.rows_written, "pending": len(self._pending),
+                "devices": {name: state.stats() for name, state in self.states.items()}}
+
+    # Per-device acquisition
+    async def _device_loop(self, state):
+        loop = asyncio.get_running_loop()
+        interval = state.config.interval
+        while True:
+            if not state.connected:
+                try:
+                    await self._connect(state)
+                except Exception as e:
+                    state.errors += 1
+                    print(f"Could not open device {state.config.name}:", str(e))
+                    self._disconnect(state)
+                    await asyncio.sleep(self.retry_delay)
+                    continue
+
+            # Next tick on the epoch grid of this device's interval (missed ticks are skipped)
+            tick = (math.floor(time.time() / interval) + 1) * interval
+            await asyncio.sleep(max(0.0, tick - time.time()))
+            try:
+                values = await asyncio.wait_for(
+                    loop.run_in_executor(state.executor, state.reader.read), self.read_timeout)
+            except asyncio.TimeoutError:
+                state.timeouts += 1
+                print(f"Device {state.config.name} did not answer within {self.read_timeout} s")
+                self._disconnect(state)
+                await asyncio.sleep(self.retry_delay)
+                continue
+            except Exception as e:
+                state.errors += 1
+                print(f"An error occurred on device {state.config.name}:", str(e))
+                self._disconnect(state)
+                continue
+            state.samples += 1
+            state.last_sample = tick
+            self._add(state.config, int(round(tick * 1000)), values)
+
+    async def _connect(self, state):
+        config = state.config
+        loop = asyncio.get_running_loop()
+        state.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix=f"ljm-{config.name}")
+        state.handle = await asyncio.wait_for(
+            loop.run_in_executor(state.executor, self.ljm.openS, config.device_type,
+                                 config.connection_type, config.identifier),
+            self.read_timeout)
+        state.reader = BatchedReader(self.ljm, state.handle, config.channels)
+        state.connects += 1
+        print(f"Connected to device {config.name}", self.ljm.getHandleInfo(state.handle))
+
+    def _disconnect(self, state):
+        # A hung call keeps its worker thread; a fresh executor is created on reconnect
+        if state.handle is not None:
+            handle, executor = state.handle, state.executor
+            try:
+                executor.submit(self.ljm.close, handle)
+            except RuntimeError:
+                pass
+        if state.executor is not None:
+            state.executor.shutdown(wait=False)
+        state.handle = None
+        state.reader = None
+        state.executor = None
+
+    # Merging
+    def _expected(self, ts_ms):
+        return sum(1 for device in self.devices
+                   if ts_ms % int(round(device.interval * 1000)) == 0)
+
+    def _add(self, config, ts_ms, values):
+        entry = self._pending.get(ts_ms)
+        if entry is None:
+            entry = self._pending[ts_ms] = [np.full(len(self.columns), np.nan), 0]
+        offset = self._offsets[config.name]
+        entry[0][offset:offset + len(values)] = values
+        entry[1] += 1
+        self._emit()
+
+    async def _merge_loop(self):
+        while True:
+            await asyncio.sleep(min(1.0, self.merge_delay))
+            self._emit()
+
+    def _emit(self, force=False):
+        """Write rows that are complete, or older than merge_delay, in time order."""
+        if not self._pending:
+            return
+        now_ms = time.time() * 1000
+        ready = sorted(ts_ms for ts_ms, (_, count) in self._pending.items()
+                       if force or count >= self._expected(ts_ms)
+                       or now_ms - ts_ms >= self.merge_delay * 1000)
+        if not ready:
+            return
+        rows = [(ts_ms,) + tuple(self._pending[ts_ms][0].tolist()) for ts_ms in ready]
+        try:
+            self.write_rows(rows)
+        except Exception as e:
+            # The rows stay pending and are written again on the next call
+            print("An error occurred while writing merged samples:", str(e))
+            return
+        for ts_ms in ready:
+            del self._pending[ts_ms]
+        self.rows_written += len(rows)
+
+
+def supervise_into_store(ljm, devices, db_file, duration=None, **options):
+    """Run a DeviceSupervisor writing merged rows into the TimeSeriesStore at db_file."""
+    supervisor = DeviceSupervisor(ljm, devices, None, **options)
+    store = TimeSeriesStore(db_file, channels=supervisor.columns)
+    writer = store.writer(batch_size=500, flush_interval=5.0).start()
+    supervisor.write_rows = writer.write_many
+    try:
+        supervisor.run(duration)
+    finally:
+        writer.close()
+        store.close()
+    return supervisor
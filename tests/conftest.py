@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Test the package of this checkout without installing it
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
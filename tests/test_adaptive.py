@@ -0,0 +1,84 @@
+import pytest
+
+from pv_acquisition.adaptive import AdaptiveRate
+
+T0 = 1686052800.0  # 2023-06-06 12:00 UTC
+
+
+def cloud(t, start, end):
+    """Current of a string shaded by a cloud between start and end; voltage barely moves."""
+    return (0.8, 29.5) if start <= t < end else (2.5, 30.0)
+
+
+def run(rate, signal, until, t=T0):
+    intervals = []
+    while t < until:
+        interval = rate.update(t, signal(t))
+        intervals.append((t, interval))
+        t += interval
+    return intervals
+
+
+def test_step_on_the_longest_interval_drops_to_the_shortest():
+    rate = AdaptiveRate(intervals=(1, 5, 15, 60), initial=60)
+    cloud_start, cloud_end = T0 + 600, T0 + 900
+    intervals = run(rate, lambda t: cloud(t, cloud_start, cloud_end), T0 + 1800)
+
+    # Sunny and steady before the cloud: the longest interval
+    assert all(interval == 60 for t, interval in intervals if t < cloud_start)
+    during = [interval for t, interval in intervals if cloud_start <= t < cloud_end]
+    assert during[0] == 1
+    assert min(during) == 1
+    # Both edges of the cloud are transients
+    assert rate.transients == 2
+    assert intervals[-1][1] == 60
+
+
+def test_steady_readings_step_back_one_level_at_a_time():
+    rate = AdaptiveRate(intervals=(1, 5, 15, 60), initial=1, steady_samples=3)
+    seen = [interval for _, interval in run(rate, lambda t: (2.5, 30.0), T0 + 300)]
+    # The first reading has nothing to compare with, the next three are steady
+    assert seen[:4] == [1, 1, 1, 5]
+    levels = [interval for i, interval in enumerate(seen) if i == 0 or interval != seen[i - 1]]
+    assert levels == [1, 5, 15, 60]
+    assert rate.transients == 0
+
+
+def test_small_changes_are_not_transients():
+    rate = AdaptiveRate(intervals=(1, 60), initial=60)
+    for i in range(10):
+        interval = rate.update(T0 + 60 * i, (2.5 + 0.1 * (i % 2), 30.0 + 0.5 * (i % 2)))
+    assert interval == 60
+    assert rate.transients == 0
+
+
+def test_missing_values_are_not_transients():
+    rate = AdaptiveRate(intervals=(1, 60), initial=60)
+    rate.update(T0, (2.5, 30.0))
+    rate.update(T0 + 60, (float("nan"), float("nan")))
+    assert rate.update(T0 + 120, (2.5, 30.0)) == 60
+    assert rate.transients == 0
+
+
+def test_channel_indices():
+    rate = AdaptiveRate(intervals=(1, 5), initial=5, current_index=2, voltage_index=0)
+    rate.update(T0, (30.0, 0.0, 2.5))
+    assert rate.update(T0 + 5, (30.0, 9.0, 2.5)) == 5
+    assert rate.update(T0 + 10, (30.0, 9.0, 0.5)) == 1
+
+
+def test_intervals_must_be_positive():
+    with pytest.raises(ValueError):
+        AdaptiveRate(intervals=(0, 5))
+
+class Twilight:
+    def sun_event_distance(self, t):
+        return 600.0  # 10 minutes from sunrise or sunset
+
+
+def test_twilight_keeps_the_longest_interval():
+    rate = AdaptiveRate(intervals=(1, 5, 60), initial=5, schedule=Twilight())
+    rate.update(T0, (0.2, 25.0))
+    # A transient still sets the level, but the interval used near sunrise/sunset is the longest
+    assert rate.update(T0 + 60, (1.5, 28.0)) == 60
+    assert rate.interval == 1
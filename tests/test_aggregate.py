@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from pv_acquisition.aggregate import AggregationEngine
+
+
+def test_buckets_are_emitted_when_the_next_one_starts():
+    engine = AggregationEngine(periods=(60,))
+    timestamps = np.arange(0.0, 120.0, 10.0)
+    values = np.column_stack((np.arange(12.0), np.full(12, 2.0)))
+
+    records = engine.add_block(timestamps, values)
+    assert [(record.start_ms, record.count) for record in records] == [(0, 6)]
+    first = records[0]
+    assert (first.current_min, first.current_max, first.current_mean) == (0.0, 5.0, 2.5)
+    assert first.power_max == 10.0
+
+    records = engine.flush()
+    assert [(record.start_ms, record.count) for record in records] == [(60000, 6)]
+    assert records[0].current_mean == 8.5
+    assert engine.flush() == []
+
+
+def test_energy_uses_the_trapezoid_across_blocks():
+    engine = AggregationEngine(periods=(3600,), max_gap=3600.0)
+    engine.add_block([0.0, 1800.0], [[0.0, 1.0], [180.0, 1.0]])
+    engine.add_block([3599.0], [[359.0, 1.0]])
+    # 0 -> 180 W over 1800 s, then 180 -> 359 W over 1799 s (the second interval spans both blocks)
+    expected = (0.0 + 180.0) / 2 * 1800.0 / 3600.0 + (180.0 + 359.0) / 2 * 1799.0 / 3600.0
+    assert engine.energy_wh == pytest.approx(expected)
+    record, = engine.flush()
+    assert record.energy_wh == pytest.approx(engine.energy_wh)
+
+
+def test_long_gaps_and_missing_values_are_not_integrated():
+    engine = AggregationEngine(periods=(60,), max_gap=300.0)
+    engine.add_block([0.0, 10.0, 20.0, 30.0, 1000.0, 1010.0],
+                     [[1.0, 36.0], [1.0, 36.0], [np.nan, 36.0], [1.0, 36.0], [1.0, 36.0], [1.0, 36.0]])
+    # Only 0-10 s and 1000-1010 s count: 2 x 10 s at 36 W
+    assert engine.energy_wh == pytest.approx(2 * 36.0 * 10.0 / 3600.0)
+
+
+def test_missing_values_are_ignored_by_the_statistics():
+    engine = AggregationEngine(periods=(60,), current_index=1, voltage_index=0)
+    engine.add_block([0.0, 1.0, 2.0], [[20.0, 1.0], [np.nan, 3.0], [22.0, np.nan]])
+    record, = engine.flush()
+    assert record.count == 3
+    assert (record.current_min, record.current_max, record.current_mean) == (1.0, 3.0, 2.0)
+    assert (record.voltage_min, record.voltage_max, record.voltage_mean) == (20.0, 22.0, 21.0)
+    assert record.power_mean == 20.0
+
+
+def test_hourly_and_minute_buckets_side_by_side():
+    engine = AggregationEngine()
+    timestamps = np.arange(0.0, 3660.0, 1.0)
+    records = engine.add_block(timestamps, np.ones((len(timestamps), 2)))
+    periods = [record.period for record in records]
+    assert periods.count(60) == 60 and periods.count(3600) == 1
+    hourly = records[-1]
+    assert hourly.count == 3600 and hourly.energy_wh == pytest.approx(3599.0 / 3600.0)
@@ -0,0 +1,94 @@
+import os
+import subprocess
+import sys
+import zipfile
+
+import numpy as np
+import pytest
+
+from pv_acquisition.archive import NPZ, PARQUET, ArchiveWriter, read_archive
+
+
+def block(start, count):
+    timestamps = 1686052800.0 + np.arange(start, start + count) * 0.5
+    values = np.column_stack([np.linspace(0.0, 3.0, count), 20.0 + np.arange(count, dtype=np.float64)])
+    return timestamps, values
+
+
+def write(path_base, archive_format, chunk_rows=4):
+    timestamps, values = block(0, 10)
+    values[3, 0] = np.nan  # a missing reading
+    with ArchiveWriter(str(path_base), columns=["current", "voltage"], chunk_rows=chunk_rows,
+                       archive_format=archive_format) as archive:
+        archive.append(timestamps[:5], values[:5])
+        archive.append(timestamps[5:], values[5:])
+    return archive, timestamps, values
+
+
+@pytest.mark.parametrize("archive_format", [NPZ, PARQUET])
+def test_round_trip(tmp_path, archive_format):
+    if archive_format == PARQUET:
+        pytest.importorskip("pyarrow")
+    archive, timestamps, values = write(tmp_path / "day", archive_format)
+    assert archive.path == str(tmp_path / f"day.{archive_format}")
+    # Chunks of at least 4 rows: after the 5 first rows, then the last 5 on close
+    assert archive.chunks_written == 2 and archive.rows_written == 10
+
+    data = read_archive(archive.path)
+    assert set(data) == {"timestamp", "current", "voltage"}
+    assert data["timestamp"].dtype == np.float64 and data["current"].dtype == np.float32
+    np.testing.assert_array_equal(data["timestamp"], timestamps)
+    np.testing.assert_allclose(data["voltage"], values[:, 1])
+    # NaN stays NaN (not a null, not a zero)
+    assert np.isnan(data["current"][3])
+    np.testing.assert_allclose(np.delete(data["current"], 3), np.delete(values[:, 0], 3), rtol=1e-6)
+
+
+@pytest.mark.parametrize("archive_format", [NPZ, PARQUET])
+def test_column_selection(tmp_path, archive_format):
+    if archive_format == PARQUET:
+        pytest.importorskip("pyarrow")
+    archive, timestamps, values = write(tmp_path / "day", archive_format)
+    data = read_archive(archive.path, columns=["voltage"])
+    assert set(data) == {"timestamp", "voltage"}
+    np.testing.assert_allclose(data["voltage"], values[:, 1])
+
+
+def test_npz_chunks_are_separate_members(tmp_path):
+    archive, _, _ = write(tmp_path / "day", NPZ)
+    with zipfile.ZipFile(archive.path) as npz:
+        assert sorted(npz.namelist()) == sorted(f"{name}.{chunk:05d}.npy"
+                                                for name in ("timestamp", "current", "voltage")
+                                                for chunk in range(2))
+    with np.load(archive.path) as npz:
+        assert len(npz["voltage.00001"]) == 5
+
+
+def test_parquet_chunks_are_row_groups(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    archive, _, _ = write(tmp_path / "day", PARQUET)
+    metadata = pq.ParquetFile(archive.path).metadata
+    assert metadata.num_row_groups == 2 and metadata.num_rows == 10
+
+
+def test_unknown_format_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        ArchiveWriter(str(tmp_path / "day"), archive_format="xlsx")
+
+
+def test_parquet_archive_is_written_without_pandas(tmp_path):
+    pytest.importorskip("pyarrow")
+    # A pandas that records being imported, first on the path of the writing process
+    fake = tmp_path / "fake" / "pandas"
+    fake.mkdir(parents=True)
+    marker = tmp_path / "pandas_imported"
+    (fake / "__init__.py").write_text(f"open({str(marker)!r}, 'w').close()\nraise ImportError('pandas')\n")
+    code = ("import numpy as np; from pv_acquisition.archive import ArchiveWriter; "
+            f"archive = ArchiveWriter({str(tmp_path / 'day')!r}, archive_format='parquet', chunk_rows=2); "
+            "archive.append(np.arange(3.0), np.ones((3, 2))); archive.close()")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    environment = dict(os.environ, PYTHONPATH=os.pathsep.join([str(tmp_path / "fake"), root]))
+    subprocess.run([sys.executable, "-c", code], cwd=root, env=environment, check=True)
+
+    assert not marker.exists()
+    assert read_archive(str(tmp_path / "day.parquet"))["current"].tolist() == [1.0, 1.0, 1.0]
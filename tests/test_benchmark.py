@@ -0,0 +1,59 @@
+import json
+
+import pytest
+
+from pv_acquisition import benchmark
+
+
+def test_stages_report_throughput_and_latency():
+    results = benchmark.run_benchmarks(["read", "store", "aggregate"], count=500, duration=0.2)
+    assert [result["stage"] for result in results] == ["read", "store", "aggregate"]
+    for result in results:
+        assert result["samples"] == 500
+        assert result["samples_per_s"] > 0
+    assert set(results[0]["latency_ms"]) == {"p50", "p95", "p99", "max"}
+    assert benchmark.format_results(results).splitlines()[0].startswith("stage")
+
+
+def test_results_are_saved_as_json(tmp_path, capsys):
+    path = str(tmp_path / "baseline.json")
+    benchmark.main(["--stages", "aggregate", "--count", "300", "--json", path])
+    with open(path, encoding="utf-8") as file:
+        saved = json.load(file)
+    assert [result["stage"] for result in saved] == ["aggregate"]
+    assert "aggregate" in capsys.readouterr().out
+
+
+def test_comparison_reports_slower_stages():
+    baseline = [{"stage": "read", "samples_per_s": 1000.0, "latency_ms": {"p99": 2.0}},
+                {"stage": "store", "samples_per_s": 1000.0, "latency_ms": {"p99": 2.0}},
+                {"stage": "plot", "samples_per_s": 50.0, "latency_ms": None}]
+    results = [{"stage": "read", "samples_per_s": 500.0, "latency_ms": {"p99": 2.0}},
+               {"stage": "store", "samples_per_s": 1050.0, "latency_ms": {"p99": 3.0}},
+               {"stage": "plot", "samples_per_s": 48.0, "latency_ms": None},
+               {"stage": "archive", "samples_per_s": 10.0, "latency_ms": None}]
+    comparison = benchmark.compare_results(results, baseline, threshold=0.1)
+    assert [entry["stage"] for entry in comparison] == ["read", "store", "plot"]
+    assert comparison[0]["slowdown"] == 2.0 and comparison[0]["slower"]
+    assert comparison[1]["p99_ratio"] == 1.5 and comparison[1]["slower"]
+    assert comparison[2]["p99_ratio"] is None and not comparison[2]["slower"]
+    assert benchmark.format_comparison(comparison).splitlines()[1].endswith("SLOWER")
+
+
+def test_compare_fails_on_a_regression(tmp_path, capsys):
+    path = str(tmp_path / "baseline.json")
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump([{"stage": "aggregate", "samples_per_s": 1e12, "latency_ms": None}], file)
+    with pytest.raises(SystemExit, match="aggregate"):
+        benchmark.main(["--stages", "aggregate", "--count", "300", "--compare", path])
+    assert "SLOWER" in capsys.readouterr().out
+
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump([{"stage": "aggregate", "samples_per_s": 1.0, "latency_ms": None}], file)
+    benchmark.main(["--stages", "aggregate", "--count", "300", "--compare", path])
+
+
+def test_percentiles_in_milliseconds():
+    assert benchmark.percentiles([]) is None
+    stats = benchmark.percentiles([0.001] * 99 + [0.1])
+    assert stats["p50"] == 1.0 and stats["max"] == 100.0
@@ -0,0 +1,130 @@
+import json
+
+import numpy as np
+import pytest
+
+from pv_acquisition.calibration import Calibration, channel_calibration, load_calibration
+from pv_acquisition.channels import BatchedReader, ChannelMap
+from pv_acquisition.device import STREAM_SKIPPED_VALUE, StreamAcquisition
+from pv_acquisition.metrics import MetricsRegistry
+from pv_acquisition.simulator import FakeLJM
+
+CHANNELS = [("current", 0, 1.0, "A"), ("voltage", 1, 18.22, "V"), ("module_temperature", 2, 100.0, "C")]
+
+
+def test_polynomial_with_gain_and_offset():
+    # value = 0.5 + 2 * (0.1 + 1.0 x + 0.25 x^2)
+    calibration = Calibration(["a"], [channel_calibration(2.0, 0.5, [0.1, 1.0, 0.25])])
+    assert not calibration.linear
+    # Gain and offset are folded into the coefficients, highest degree first
+    np.testing.assert_allclose(calibration.coefficients[:, 0], [0.5, 2.0, 0.7])
+
+    raw = np.array([[0.0], [1.0], [2.0], [-4.0]])
+    expected = [[0.7], [0.5 + 2 * 1.35], [0.5 + 2 * 3.1], [0.5 + 2 * 0.1]]
+    np.testing.assert_allclose(calibration.apply(raw), expected)
+
+
+def test_linear_calibration_is_one_multiply_add():
+    calibration = Calibration(["current", "voltage"],
+                              [channel_calibration(gain=1.01, offset=-0.02), channel_calibration(gain=18.22)])
+    assert calibration.linear
+    np.testing.assert_allclose(calibration.gains, [1.01, 18.22])
+    np.testing.assert_allclose(calibration.offsets, [-0.02, 0.0])
+
+    raw = np.array([[1.0, 2.0], [3.0, 1.5]])
+    np.testing.assert_allclose(calibration.apply(raw), [[0.99, 36.44], [3.01, 27.33]])
+    # A single scan works the same way and nothing is rounded
+    assert calibration.apply([0.123456789, 1.0])[0] == 1.01 * 0.123456789 - 0.02
+
+
+def test_from_scales_matches_the_scale_factors():
+    calibration = Calibration.from_scales(["current", "voltage"], [1.0, 18.22])
+    raw = np.random.default_rng(0).uniform(0, 2, (50, 2))
+    np.testing.assert_array_equal(calibration.apply(raw), raw * [1.0, 18.22])
+
+
+def test_temperature_compensation():
+    calibration = Calibration(
+        ["current", "temperature"],
+        [channel_calibration(gain=2.0, temperature_coefficient=-0.004, reference_temperature=25.0),
+         channel_calibration(gain=100.0)],
+        temperature_channel="temperature")
+    assert not calibration.linear
+    raw = np.array([[1.0, 0.25], [1.0, 0.45]])
+    # 2 A at 25 C is kept, at 45 C it is scaled by 1 - 0.004 * 20
+    np.testing.assert_allclose(calibration.apply(raw), [[2.0, 25.0], [2.0 * 0.92, 45.0]])
+
+
+def test_temperature_channel_cannot_compensate_itself():
+    with pytest.raises(ValueError):
+        Calibration(["temperature"], [channel_calibration(temperature_coefficient=0.01)], "temperature")
+    with pytest.raises(ValueError):
+        Calibration(["a", "b"], [channel_calibration()])
+
+
+def test_load_calibration(tmp_path):
+    path = tmp_path / "calibration.json"
+    path.write_text(json.dumps({
+        "temperature_channel": "module_temperature",
+        "channels": {"voltage": {"gain": 18.22, "offset": -0.004},
+                     "current": {"polynomial": [0.002, 0.998, 0.0011],
+                                 "temperature_coefficient": -0.0004, "reference_temperature": 25}}}))
+    channel_map = ChannelMap(CHANNELS)
+    calibration = load_calibration(str(path), channel_map)
+
+    current, voltage, temperature = calibration.calibrations
+    assert current.polynomial == (0.002, 0.998, 0.0011) and current.temperature_coefficient == -0.0004
+    assert (voltage.gain, voltage.offset) == (18.22, -0.004)
+    # Channels missing from the file keep their scale factor
+    assert temperature.gain == 100.0
+    assert calibration.to_config()["temperature_channel"] == "module_temperature"
+
+    values = calibration.apply([1.0, 1.0, 0.35])
+    expected_current = (0.002 + 0.998 + 0.0011) * (1 - 0.0004 * (35.0 - 25.0))
+    np.testing.assert_allclose(values, [expected_current, 18.216, 35.0])
+
+
+def test_calibration_for_an_unknown_channel_is_rejected(tmp_path):
+    path = tmp_path / "calibration.json"
+    path.write_text(json.dumps({"channels": {"irradiance": {"gain": 1000.0}}}))
+    with pytest.raises(ValueError):
+        load_calibration(str(path), ChannelMap())
+
+
+def test_batched_reader_applies_the_channel_map_calibration():
+    ljm = FakeLJM(lambda channel, t: 1.0 + channel, realtime=False)
+    channel_map = ChannelMap()
+    # current + 0.5 and voltage squared
+    channel_map.calibration = Calibration(
+        channel_map.names, [channel_calibration(offset=0.5), channel_calibration(polynomial=[0.0, 0.0, 1.0])])
+    reader = BatchedReader(ljm, ljm.openS(), channel_map)
+    np.testing.assert_allclose(reader.read(), [1.5, 4.0])
+
+
+class SkippingLJM(FakeLJM):
+    """Marks the second scan of every stream block as skipped on AIN1."""
+
+    def eStreamRead(self, handle):
+        data, device_backlog, ljm_backlog = super().eStreamRead(handle)
+        data[3] = STREAM_SKIPPED_VALUE
+        return data, device_backlog, ljm_backlog
+
+
+def test_stream_blocks_are_calibrated_in_one_call():
+    ljm = SkippingLJM(lambda channel, t: np.full(np.shape(t), 1.0 + channel), realtime=False)
+    channel_map = ChannelMap()
+    calibrations = [channel_calibration(gain=2.0, offset=0.1),
+                    channel_calibration(polynomial=[1.0, 0.0, 3.0])]
+    channel_map.calibration = Calibration(channel_map.names, calibrations)
+    metrics = MetricsRegistry()
+    with StreamAcquisition(ljm, ljm.openS(), channel_map, scan_rate=100, scans_per_read=20,
+                           metrics=metrics) as stream:
+        blocks = [stream.read(), stream.read()]
+
+    for block in blocks:
+        assert block.values.shape == (20, 2)
+        np.testing.assert_allclose(block.values[:, 0], 2.1)
+        # 1 + 3 * 2^2, except for the skipped reading which stays missing
+        assert np.isnan(block.values[1, 1])
+        np.testing.assert_allclose(np.delete(block.values[:, 1], 1), 13.0)
+    assert 'pv_stage_seconds_count{stage="scale"} 2.0' in metrics.render()
@@ -0,0 +1,75 @@
+import json
+
+import numpy as np
+import pytest
+
+from pv_acquisition.channels import BatchedReader, Channel, ChannelMap, load_channel_map
+from pv_acquisition.simulator import FakeLJM
+
+
+def constant_signal(channel, t):
+    # AINn reads n + 1 volts
+    return np.full(np.shape(t), channel + 1.0)
+
+
+class CountingLJM(FakeLJM):
+    """FakeLJM counting the LJM calls a reader makes."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.calls = {"namesToAddresses": 0, "eReadAddresses": 0, "eReadName": 0}
+
+    def namesToAddresses(self, numFrames, aNames, aNumRegs=None):
+        self.calls["namesToAddresses"] += 1
+        return FakeLJM.namesToAddresses(numFrames, aNames, aNumRegs)
+
+    def eReadAddresses(self, handle, numFrames, aAddresses, aDataTypes):
+        self.calls["eReadAddresses"] += 1
+        return super().eReadAddresses(handle, numFrames, aAddresses, aDataTypes)
+
+    def eReadName(self, handle, name):
+        self.calls["eReadName"] += 1
+        return super().eReadName(handle, name)
+
+
+def test_one_request_per_scan_and_addresses_resolved_once():
+    ljm = CountingLJM(constant_signal, realtime=False)
+    handle = ljm.openS()
+    channel_map = ChannelMap()
+    reader = BatchedReader(ljm, handle, channel_map)
+    for _ in range(5):
+        reader.read()
+    # A second reader on the same map reuses the resolved addresses
+    BatchedReader(ljm, handle, channel_map).read()
+
+    assert ljm.calls == {"namesToAddresses": 1, "eReadAddresses": 6, "eReadName": 0}
+    assert channel_map.addresses == [0, 2]
+
+
+def test_values_are_scaled_in_channel_map_order():
+    ljm = FakeLJM(constant_signal, realtime=False)
+    channel_map = ChannelMap([Channel("voltage", 1, 18.22, "V"), Channel("current", 0, 1.0, "A"),
+                              Channel("irradiance", 3, 200.0, "W/m2")])
+    values = BatchedReader(ljm, ljm.openS(), channel_map).read()
+    np.testing.assert_allclose(values, [2.0 * 18.22, 1.0, 4.0 * 200.0])
+    assert channel_map.index("current") == 1
+    assert channel_map.register_names == ["AIN1", "AIN0", "AIN3"]
+
+
+def test_invalid_channel_maps_are_rejected():
+    with pytest.raises(ValueError):
+        ChannelMap([])
+    with pytest.raises(ValueError):
+        ChannelMap([("current", 0, 1.0, "A"), ("current", 1, 1.0, "A")])
+
+
+def test_load_channel_map(tmp_path):
+    path = tmp_path / "channels.json"
+    path.write_text(json.dumps([{"name": "current", "ain": 2, "unit": "A"},
+                                {"name": "voltage", "ain": 3, "scale": 18.22}]))
+    channel_map = load_channel_map(str(path))
+    assert channel_map.names == ["current", "voltage"]
+    assert channel_map.register_names == ["AIN2", "AIN3"]
+    assert channel_map.units == ["A", "V"]
+    np.testing.assert_allclose(channel_map.scales, [1.0, 18.22])
+    assert ChannelMap([Channel(**entry) for entry in channel_map.to_config()]).names == channel_map.names
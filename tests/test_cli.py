@@ -0,0 +1,272 @@
+import csv
+import glob
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pytest
+
+from pv_acquisition import cli
+from pv_acquisition.device import StreamBlock
+from pv_acquisition.recovery import SampleLog
+from pv_acquisition.simulator import FakeLJM
+from pv_acquisition.store import TimeSeriesStore
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class EndingSchedule:
+    """Solar schedule whose first window ends between seconds_until_active and active_until."""
+
+    def __init__(self, **kwargs):
+        self.lookups = 0
+
+    def seconds_until_active(self, t):
+        return 0.0
+
+    def active_until(self, t):
+        self.lookups += 1
+        return None if self.lookups == 1 else t + 60
+
+
+class LateLJM(FakeLJM):
+    """A LabJack that cannot be opened for the first ``failures`` attempts."""
+
+    def __init__(self, failures, **kwargs):
+        super().__init__(**kwargs)
+        self.failures = failures
+
+    def openS(self, *args):
+        if self.failures > 0:
+            self.failures -= 1
+            raise RuntimeError("LJME_DEVICE_NOT_FOUND")
+        return super().openS(*args)
+
+
+def options(tmp_path, *extra):
+    return cli.build_parser().parse_args(
+        ["replay", "unused.db", "--headless", "--no-adaptive", "--interval", "0.1",
+         "--database", str(tmp_path / "pv.db"), "--wal", str(tmp_path / "pv.wal"),
+         "--archive-prefix", str(tmp_path / "archive")] + list(extra))
+
+
+def test_window_is_stored_and_archived(tmp_path):
+    start = time.time()
+    cli.acquire_window(options(tmp_path), FakeLJM(), start + 1.0)
+
+    store = TimeSeriesStore(str(tmp_path / "pv.db"), channels=())
+    timestamps, values = store.query(start - 1, time.time())
+    minutes = store.query_aggregates(60, start - 60, time.time())
+    store.close()
+    assert store.channels == ["current", "voltage", "interval_s"]
+    assert len(timestamps) >= 5
+    assert np.all(values[:, 2] == 0.1)
+    assert minutes["count"].sum() == len(timestamps)
+    # A clean stop leaves no write-ahead log behind, and one archive of the window
+    assert not os.path.exists(tmp_path / "pv.wal")
+    assert len(glob.glob(str(tmp_path / "archive_*"))) == 1
+
+
+def test_device_missing_at_start_becomes_a_gap(tmp_path):
+    ljm = LateLJM(failures=1)
+    start = time.time()
+    cli.acquire_window(options(tmp_path), ljm, start + 1.5)
+
+    store = TimeSeriesStore(str(tmp_path / "pv.db"), channels=())
+    gaps = store.query_gaps(start - 1, time.time())
+    timestamps, _ = store.query(start - 1, time.time())
+    store.close()
+    assert len(gaps) == 1
+    assert gaps[0][2] == "LJME_DEVICE_NOT_FOUND"
+    # Acquisition went on once the backoff delay had passed
+    assert len(timestamps) >= 5
+    assert timestamps[0] >= gaps[0][1]
+
+
+@pytest.mark.parametrize("mode", [(), ("--stream-rate", "100", "--scans-per-read", "10")])
+def test_rows_recovered_from_the_log_are_aggregated(tmp_path, mode):
+    # A run crashed at 06:00:08 UTC with its last 8 samples only in the log
+    t0 = 1686031200000
+    log = SampleLog(str(tmp_path / "pv.wal"), fsync=False)
+    log.append_rows([(t0 + 1000 * i, 2.0, 30.0, 1.0) for i in range(8)])
+    log.close()
+
+    cli.acquire_window(options(tmp_path, *mode), FakeLJM(), time.time() + 0.5)
+
+    store = TimeSeriesStore(str(tmp_path / "pv.db"), channels=())
+    minute = store.query_aggregates(60, t0 / 1000, t0 / 1000 + 60)
+    hour = store.query_aggregates(3600, t0 / 1000, t0 / 1000 + 3600)
+    store.close()
+    assert minute["count"].tolist() == [8]
+    assert minute["power_mean"].tolist() == [60.0]
+    assert hour["energy_wh"][0] == pytest.approx(60.0 * 7 / 3600)
+
+
+def test_statistics_follow_the_channel_names(tmp_path):
+    # Voltage wired first: the statistics must not take it for the current
+    channels = tmp_path / "channels.json"
+    channels.write_text(json.dumps([{"name": "voltage", "ain": 1, "scale": 18.22},
+                                    {"name": "current", "ain": 0, "unit": "A"}]))
+    start = time.time()
+    cli.acquire_window(options(tmp_path, "--channels", str(channels)), FakeLJM(), start + 1.0)
+
+    store = TimeSeriesStore(str(tmp_path / "pv.db"), channels=())
+    hours = store.query_aggregates(3600, start - 3600, time.time())
+    for bucket, count, current_mean, voltage_mean in zip(hours["start_ms"], hours["count"],
+                                                         hours["current_mean"], hours["voltage_mean"]):
+        _, values = store.query(bucket / 1000, bucket / 1000 + 3600, ["current", "voltage"])
+        assert count == len(values)
+        assert current_mean == pytest.approx(values[:, 0].mean())
+        assert voltage_mean == pytest.approx(values[:, 1].mean())
+    store.close()
+    assert hours["count"].sum() >= 5
+
+
+def test_channel_map_without_current_is_rejected(tmp_path):
+    channels = tmp_path / "channels.json"
+    channels.write_text(json.dumps([{"name": "irradiance", "ain": 2}, {"name": "voltage", "ain": 1}]))
+    with pytest.raises(SystemExit, match="has no current channel"):
+        cli.acquire_window(options(tmp_path, "--channels", str(channels)), FakeLJM(), time.time() + 1)
+
+
+class CountingLJM(FakeLJM):
+    """Counts how often the device is opened."""
+
+    def __init__(self):
+        super().__init__()
+        self.opens = 0
+
+    def openS(self, *args):
+        self.opens += 1
+        return super().openS(*args)
+
+
+class FailingStreamLJM(FakeLJM):
+    """Stream that fails on its third block, then can be restarted."""
+
+    def __init__(self):
+        super().__init__()
+        self.reads = 0
+
+    def eStreamRead(self, handle):
+        self.reads += 1
+        if self.reads == 3:
+            raise RuntimeError("LJME_STREAM_NOT_RUNNING")
+        return super().eStreamRead(handle)
+
+
+def test_stream_mode_stores_every_scan(tmp_path):
+    start = time.time()
+    cli.acquire_window(options(tmp_path, "--stream-rate", "100", "--scans-per-read", "10"), FakeLJM(),
+                       start + 1.0)
+
+    store = TimeSeriesStore(str(tmp_path / "pv.db"), channels=())
+    timestamps, values = store.query(start - 1, time.time() + 1)
+    minutes = store.query_aggregates(60, start - 60, time.time())
+    store.close()
+    assert len(timestamps) >= 50 and len(timestamps) % 10 == 0
+    assert np.all(np.diff(timestamps) == 10)
+    assert np.all(values[:, 2] == 0.01)
+    assert minutes["count"].sum() == len(timestamps)
+
+
+def test_stream_storage_errors_do_not_restart_the_device(tmp_path, monkeypatch):
+    def full_disk(self, timestamps, values):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr("pv_acquisition.archive.ArchiveWriter.append", full_disk)
+    ljm = CountingLJM()
+    start = time.time()
+    cli.acquire_window(options(tmp_path, "--stream-rate", "100", "--scans-per-read", "10"), ljm, start + 1.0)
+
+    store = TimeSeriesStore(str(tmp_path / "pv.db"), channels=())
+    timestamps, _ = store.query(start - 1, time.time() + 1)
+    gaps = store.query_gaps(start - 1, time.time() + 1)
+    store.close()
+    assert ljm.opens == 1
+    assert gaps == []
+    # The rows went through the write-ahead log writer before the archive failed
+    assert len(timestamps) >= 50
+    assert not os.path.exists(tmp_path / "pv.wal")
+
+
+def test_block_point_ignores_skipped_values():
+    block = StreamBlock(np.array([1.0, 1.01, 1.02]),
+                        np.array([[1.0, np.nan], [3.0, 20.0], [np.nan, np.nan]]), 0, 0, 3)
+    point = cli.block_point(block, 0.01)
+    assert point.timestamp == 1.02 and point.interval == 0.01
+    assert point.values.tolist() == [2.0, 20.0]
+
+
+def test_stream_failure_is_recorded_as_a_gap(tmp_path):
+    start = time.time()
+    cli.acquire_window(options(tmp_path, "--stream-rate", "100", "--scans-per-read", "10"),
+                       FailingStreamLJM(), start + 1.5)
+
+    store = TimeSeriesStore(str(tmp_path / "pv.db"), channels=())
+    gaps = store.query_gaps(start - 1, time.time() + 1)
+    timestamps, _ = store.query(start - 1, time.time() + 1)
+    store.close()
+    assert len(gaps) == 1
+    assert gaps[0][2] == "LJME_STREAM_NOT_RUNNING"
+    assert np.any(timestamps < gaps[0][0]) and np.any(timestamps >= gaps[0][1])
+
+
+def test_acquire_waits_again_when_the_window_has_ended(monkeypatch):
+    windows = []
+    monkeypatch.setattr("pv_acquisition.device.load_ljm", FakeLJM)
+    monkeypatch.setattr("pv_acquisition.solar.SolarSchedule", EndingSchedule)
+    monkeypatch.setattr(cli, "acquire_window", lambda options, ljm, until, *args: windows.append(until))
+    options = cli.build_parser().parse_args(["acquire", "--once", "--headless", "--metrics-port", "0"])
+    cli.acquire(options)
+    # No zero-length window is started for the window that ended
+    assert len(windows) == 1
+    assert windows[0] > time.time()
+
+
+def test_export_samples_and_statistics(tmp_path):
+    database = str(tmp_path / "pv.db")
+    store = TimeSeriesStore(database)
+    store.insert(1686052800.0 + np.arange(5.0), np.column_stack((np.arange(5.0), np.full(5, 30.0))))
+    store.close()
+
+    output = str(tmp_path / "samples.csv")
+    cli.main(["export", output, "--database", database, "--columns", "voltage"])
+    with open(output, newline="", encoding="utf-8") as file:
+        rows = list(csv.reader(file))
+    assert rows[0] == ["time", "timestamp", "voltage"]
+    assert [float(row[1]) for row in rows[1:]] == [1686052800.0 + i for i in range(5)]
+    assert {row[2] for row in rows[1:]} == {"30.0"}
+
+    output = str(tmp_path / "samples.npz")
+    cli.main(["export", output, "--database", database, "--start", "2023-06-01"])
+    with np.load(output) as data:
+        assert sorted(data.files) == ["current", "timestamp", "voltage"]
+        assert data["current"].tolist() == [0.0, 1.0, 2.0, 3.0, 4.0]
+
+
+def test_export_rejects_unknown_formats_and_missing_stores(tmp_path):
+    with pytest.raises(SystemExit):
+        cli.build_parser().parse_args(["export", "samples.xlsx"])
+    with pytest.raises(SystemExit, match="does not exist"):
+        cli.main(["export", str(tmp_path / "out.csv"), "--database", str(tmp_path / "missing.db")])
+
+
+def test_acquisition_options():
+    parsed = cli.build_parser().parse_args(["acquire", "--locale", "fr", "--current-ylim", "0", "auto"])
+    assert parsed.locale == "fr" and parsed.layout == "twin"
+    assert parsed.current_ylim == [0.0, None]
+    assert parsed.interval == 5.0 and parsed.adaptive
+    assert parsed.wal_fsync_interval == 1.0
+    assert cli.LOCALES["fr"]["columns"]["current"] == "courant"
+
+
+def test_cli_import_is_light():
+    code = ("import sys; import pv_acquisition.cli; modules = ('numpy', 'matplotlib', 'asyncio', 'pyarrow'); "
+            "print(sorted(name for name in modules if name in sys.modules))")
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True,
+                            check=True)
+    assert result.stdout.strip() == "[]"
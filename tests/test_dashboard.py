@@ -0,0 +1,138 @@
+import base64
+import hashlib
+import http.client
+import json
+import socket
+import threading
+import urllib.request
+
+import numpy as np
+
+from pv_acquisition.aggregate import AggregationEngine
+from pv_acquisition.dashboard import Dashboard, LiveBuffer, _read_frame, lttb
+from pv_acquisition.pipeline import Sample
+
+
+def start_dashboard():
+    live = LiveBuffer(["Current", "Voltage"], ["A", "V"])
+    live.add_samples([Sample(1000.0 + i, (0.5, 20.0)) for i in range(10)])
+    return Dashboard(live, port=0, update_interval=0.05).start()
+
+
+def read_response_head(connection):
+    head = b""
+    while not head.endswith(b"\r\n\r\n"):
+        chunk = connection.recv(1)
+        assert chunk, "connection closed during the handshake"
+        head += chunk
+    lines = head.decode("latin-1").split("\r\n")
+    headers = {}
+    for line in lines[1:]:
+        if line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+    return lines[0], headers
+
+
+def test_lttb_keeps_the_ends_and_the_peaks():
+    x = np.arange(1000.0)
+    y = np.zeros(1000)
+    y[357] = 10.0
+    y[642] = -10.0
+    kept = lttb(x, y, 50)
+    assert len(kept) == 50
+    assert kept[0] == 0 and kept[-1] == 999
+    assert np.all(np.diff(kept) > 0)
+    assert 357 in kept and 642 in kept
+    # Fewer points than the threshold are all kept
+    assert lttb(x[:20], y[:20], 50).tolist() == list(range(20))
+
+
+def test_lttb_does_not_pick_missing_values():
+    x = np.arange(200.0)
+    y = np.sin(x / 5.0)
+    y[::3] = np.nan
+    kept = lttb(x, y, 20)
+    assert not np.isnan(y[kept[1:-1]]).any()
+
+
+def test_snapshot_downsamples_and_sends_missing_values_as_null():
+    live = LiveBuffer(["Current", "Voltage"], ["A", "V"])
+    live.add_samples([Sample(float(i), (1.0, float(i))) for i in range(1000)])
+    live.add_samples([Sample(1000.0, (np.nan, 30.0))])
+    engine = AggregationEngine(periods=(60,))
+    engine.add_block(np.arange(0.0, 120.0), np.ones((120, 2)))
+    live.add_aggregates(engine.flush(), energy_wh=1.5)
+
+    version, payload = live.snapshot(100)
+    assert version == 3
+    assert payload["samples"] == 1001
+    assert len(payload["series"]["Voltage"]["t"]) == 100
+    assert payload["latest"] == {"t": 1000.0, "values": {"Current": None, "Voltage": 30.0}}
+    assert payload["energy_wh"] == 1.5
+    assert payload["aggregates"]["60"]["start_ms"] == 60000
+    json.dumps(payload, allow_nan=False)
+
+
+def test_data_endpoint_serves_the_latest_update():
+    dashboard = start_dashboard()
+    try:
+        with urllib.request.urlopen(dashboard.url + "data", timeout=5) as response:
+            payload = json.loads(response.read())
+        assert payload["channels"] == ["Current", "Voltage"]
+        assert payload["samples"] == 10
+        assert payload["latest"]["values"] == {"Current": 0.5, "Voltage": 20.0}
+    finally:
+        dashboard.stop()
+
+
+def test_websocket_handshake_is_http11_and_pushes_updates():
+    dashboard = start_dashboard()
+    try:
+        key = base64.b64encode(b"0123456789abcdef").decode("ascii")
+        with socket.create_connection((dashboard.host, dashboard.port), timeout=5) as connection:
+            connection.sendall(("GET /ws HTTP/1.1\r\n"
+                                f"Host: {dashboard.host}:{dashboard.port}\r\n"
+                                "Upgrade: websocket\r\n"
+                                "Connection: Upgrade\r\n"
+                                f"Sec-WebSocket-Key: {key}\r\n"
+                                "Sec-WebSocket-Version: 13\r\n\r\n").encode("ascii"))
+            status, headers = read_response_head(connection)
+            assert status.startswith("HTTP/1.1 101")
+            assert headers["upgrade"].lower() == "websocket"
+            assert headers["connection"].lower() == "upgrade"
+            expected = base64.b64encode(hashlib.sha1(
+                (key + "258EAFA5-E914-47DA-95CA-C5AB0DC85B11").encode("ascii")).digest()).decode("ascii")
+            assert headers["sec-websocket-accept"] == expected
+
+            opcode, payload = _read_frame(connection, threading.Event())
+            assert opcode == 0x1
+            assert json.loads(payload)["samples"] == 10
+
+            dashboard.live.add_samples([Sample(2000.0, (1.0, 21.0))])
+            opcode, payload = _read_frame(connection, threading.Event())
+            assert json.loads(payload)["samples"] == 11
+            assert len(dashboard.viewers) == 1
+    finally:
+        dashboard.stop()
+
+
+def test_page_and_data_share_a_kept_alive_connection():
+    dashboard = start_dashboard()
+    try:
+        client = http.client.HTTPConnection(dashboard.host, dashboard.port, timeout=5)
+        client.request("GET", "/")
+        page = client.getresponse()
+        assert page.status == 200 and page.version == 11
+        assert int(page.getheader("Content-Length")) == len(page.read())
+        client.request("GET", "/data")
+        data = client.getresponse()
+        assert data.status == 200
+        assert json.loads(data.read())["channels"] == ["Current", "Voltage"]
+        client.request("GET", "/missing")
+        missing = client.getresponse()
+        assert missing.status == 404
+        missing.read()
+        client.close()
+    finally:
+        dashboard.stop()
@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+from pv_acquisition.channels import ChannelMap
+from pv_acquisition.device import STREAM_SKIPPED_VALUE, StreamAcquisition
+from pv_acquisition.simulator import FakeLJM
+
+
+def constant_signal(channel, t):
+    # AIN0 reads 1 V and AIN1 reads 2 V at all times
+    return np.full(np.shape(t), channel + 1.0)
+
+
+class SkippingLJM(FakeLJM):
+    """Marks the first scan of every block as skipped on AIN1."""
+
+    def eStreamRead(self, handle):
+        data, device_backlog, ljm_backlog = super().eStreamRead(handle)
+        data[1] = STREAM_SKIPPED_VALUE
+        return data, device_backlog, ljm_backlog
+
+
+def test_stream_timestamps_follow_the_scan_clock():
+    ljm = FakeLJM(constant_signal, realtime=False)
+    handle = ljm.openS()
+    with StreamAcquisition(ljm, handle, ChannelMap(), scan_rate=100, scans_per_read=50) as stream:
+        first = stream.read()
+        second = stream.read()
+
+    timestamps = np.concatenate([first.timestamps, second.timestamps])
+    # Scan index / scan rate from the start of the stream, not the host clock of each read
+    np.testing.assert_allclose(timestamps - stream.start_time, np.arange(100) / 100.0, atol=1e-6)
+    assert stream.scan_count == 100
+
+
+def test_stream_blocks_are_calibrated():
+    ljm = FakeLJM(constant_signal, realtime=False)
+    handle = ljm.openS()
+    with StreamAcquisition(ljm, handle, ChannelMap(), scan_rate=100, scans_per_read=10) as stream:
+        block = stream.read()
+
+    assert block.values.shape == (10, 2)
+    np.testing.assert_allclose(block.values[:, 0], 1.0)
+    np.testing.assert_allclose(block.values[:, 1], 2.0 * 18.22)
+    # The stream is configured before it starts
+    assert ljm.getHandleInfo(handle)[0] == 7
+    assert ljm._device(handle).registers["AIN_ALL_RANGE"] == 10.0
+
+
+def test_skipped_stream_values_become_nan():
+    ljm = SkippingLJM(constant_signal, realtime=False)
+    handle = ljm.openS()
+    with StreamAcquisition(ljm, handle, ChannelMap(), scan_rate=100, scans_per_read=10) as stream:
+        first = stream.read()
+        second = stream.read()
+
+    for block in (first, second):
+        assert block.skipped == 1
+        assert np.isnan(block.values[0, 1])
+        assert not np.isnan(block.values[0, 0])
+        assert not np.isnan(block.values[1:]).any()
+    assert stream.skipped_total == 2
+    # Skipped scans keep their slot in the timeline
+    assert len(first.timestamps) == 10
+
+
+def test_stream_stop_ends_the_device_stream():
+    ljm = FakeLJM(constant_signal, realtime=False)
+    handle = ljm.openS()
+    stream = StreamAcquisition(ljm, handle, ChannelMap(), scan_rate=100, scans_per_read=10)
+    stream.start()
+    stream.stop()
+    assert not stream.running
+    with pytest.raises(RuntimeError):
+        ljm.eStreamRead(handle)
+
+
+def test_closed_handle_is_rejected():
+    ljm = FakeLJM(realtime=False)
+    handle = ljm.openS()
+    ljm.close(handle)
+    with pytest.raises(RuntimeError):
+        ljm.eReadNames(handle, 2, ["AIN0", "AIN1"])
+
+
+def test_stream_columns_follow_the_channel_map():
+    ljm = FakeLJM(constant_signal, realtime=False)
+    handle = ljm.openS()
+    channel_map = ChannelMap([("voltage", 1, 10.0, "V"), ("current", 0, 1.0, "A")])
+    with StreamAcquisition(ljm, handle, channel_map, scan_rate=100, scans_per_read=10) as stream:
+        block = stream.read()
+    assert stream.channels == ["AIN1", "AIN0"]
+    np.testing.assert_allclose(block.values, np.tile([20.0, 1.0], (10, 1)))
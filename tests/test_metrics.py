@@ -0,0 +1,64 @@
+import urllib.error
+import urllib.request
+
+import pytest
+
+from pv_acquisition.metrics import MetricsRegistry, MetricsServer
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    timer = registry.histogram("pv_read_seconds", "Duration of a read", buckets=(0.001, 0.01), device="t7")
+    for value in (0.0005, 0.001, 0.005, 0.5):
+        timer.observe(value)
+
+    lines = registry.render().splitlines()
+    assert lines == [
+        "# HELP pv_read_seconds Duration of a read",
+        "# TYPE pv_read_seconds histogram",
+        'pv_read_seconds_bucket{device="t7",le="0.001"} 2.0',
+        'pv_read_seconds_bucket{device="t7",le="0.01"} 3.0',
+        'pv_read_seconds_bucket{device="t7",le="+Inf"} 4.0',
+        'pv_read_seconds_sum{device="t7"} 0.5065',
+        'pv_read_seconds_count{device="t7"} 4.0',
+    ]
+
+
+def test_counters_and_gauges():
+    registry = MetricsRegistry()
+    registry.counter("pv_read_errors", "Failed reads").inc(3)
+    queued = [1, 2]
+    registry.gauge("pv_queue_depth", "Queued samples", function=lambda: len(queued), queue="store")
+
+    text = registry.render()
+    assert "# TYPE pv_read_errors_total counter\npv_read_errors_total 3.0\n" in text
+    assert "# HELP pv_queue_depth Queued samples\n" in text
+    assert 'pv_queue_depth{queue="store"} 2.0\n' in text
+    # The same name and labels return the same metric
+    assert registry.counter("pv_read_errors").get() == 3
+    with pytest.raises(ValueError):
+        registry.gauge("pv_read_errors")
+
+
+def test_labels_are_escaped():
+    registry = MetricsRegistry()
+    registry.gauge("pv_info", path='C:\\data\\"pv"').set(1)
+    assert 'pv_info{path="C:\\\\data\\\\\\"pv\\""} 1.0' in registry.render()
+
+
+def test_metrics_are_scraped_over_http():
+    registry = MetricsRegistry()
+    registry.stage_timer("read").observe(0.002)
+    server = MetricsServer(registry, port=0).start()
+    try:
+        assert server.port != 0
+        with urllib.request.urlopen(server.url, timeout=5) as response:
+            assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+            body = response.read().decode("utf-8")
+        assert "# TYPE pv_stage_seconds histogram" in body
+        assert 'pv_stage_seconds_count{stage="read"} 1.0' in body
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(f"http://{server.host}:{server.port}/other", timeout=5)
+        assert error.value.code == 404
+    finally:
+        server.stop()
@@ -0,0 +1,191 @@
+import threading
+import time
+
+import numpy as np
+
+from pv_acquisition.pipeline import BLOCK, AcquisitionPipeline, DeadlineScheduler, RingQueue, StreamPipeline
+
+
+class FlakyReader:
+    """Returns a scan until ``fail_after`` reads, then fails until ``recover_after`` (if any)."""
+
+    def __init__(self, fail_after, recover_after=None):
+        self.fail_after = fail_after
+        self.recover_after = recover_after
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        failing = self.calls > self.fail_after and (self.recover_after is None
+                                                    or self.calls <= self.recover_after)
+        if failing:
+            raise OSError("LabJack disconnected")
+        return np.array([1.0, 20.0])
+
+
+def run(pipeline, until):
+    pipeline.start()
+    deadline = time.monotonic() + 5
+    while not until() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    pipeline.stop()
+
+
+def test_scheduler_ticks_on_a_fixed_grid():
+    scheduler = DeadlineScheduler(0.02)
+    scheduler.start()
+    timestamps = []
+    for _ in range(5):
+        timestamp, lateness = scheduler.wait()
+        timestamps.append(timestamp)
+        time.sleep(0.005)  # work done between ticks does not shift the next deadline
+        assert lateness < 0.02
+    np.testing.assert_allclose(np.diff(timestamps), 0.02, atol=1e-6)
+    assert scheduler.missed == 0
+
+
+def test_scheduler_skips_missed_ticks():
+    scheduler = DeadlineScheduler(0.01)
+    scheduler.start()
+    first, _ = scheduler.wait()
+    time.sleep(0.055)
+    second, _ = scheduler.wait()
+    assert scheduler.missed >= 4
+    # Still on the grid of the start time
+    assert abs(round((second - first) / 0.01) * 0.01 - (second - first)) < 1e-6
+
+
+def test_scheduler_wait_returns_none_when_stopped():
+    scheduler = DeadlineScheduler(10.0)
+    scheduler.start()
+    scheduler.wait()
+    stop = threading.Event()
+    stop.set()
+    assert scheduler.wait(stop) is None
+
+
+def test_ring_queue_drops_the_oldest_items():
+    ring = RingQueue(maxsize=3)
+    results = [ring.put(i) for i in range(5)]
+    assert results == [True, True, True, False, False]
+    assert ring.get_many() == [2, 3, 4]
+    assert ring.stats() == {"size": 0, "put": 5, "dropped": 2, "blocked": 0, "high_water": 3}
+
+
+def test_ring_queue_block_policy_waits_then_drops_the_new_item():
+    ring = RingQueue(maxsize=1, policy=BLOCK, put_timeout=0.05)
+    assert ring.put("first")
+    start = time.monotonic()
+    assert not ring.put("second")
+    assert time.monotonic() - start >= 0.04
+    assert ring.get_many() == ["first"]
+    assert ring.stats()["blocked"] == 1 and ring.stats()["dropped"] == 1
+
+
+def test_ring_queue_get_many_limits_and_waits():
+    ring = RingQueue()
+    for i in range(5):
+        ring.put(i)
+    assert ring.get_many(2) == [0, 1]
+    assert ring.get_many() == [2, 3, 4]
+    assert ring.get_many(timeout=0.01) == []
+
+
+def test_stream_missing_until_stop_is_one_gap():
+    gaps = []
+
+    def open_stream():
+        raise OSError("LJME_DEVICE_NOT_FOUND")
+
+    pipeline = StreamPipeline(open_stream, on_gap=gaps.append)
+    start = time.time()
+    pipeline.start()
+    time.sleep(0.2)
+    pipeline.stop()
+
+    assert pipeline.read_errors >= 1
+    assert pipeline.stats()["gaps"] == 1
+    assert gaps[0].reason == "LJME_DEVICE_NOT_FOUND"
+    assert start <= gaps[0].start <= gaps[0].end
+
+
+def test_samples_reach_every_subscriber():
+    read = FlakyReader(fail_after=10 ** 6)
+    pipeline = AcquisitionPipeline(read, 0.01)
+    first = pipeline.subscribe("first")
+    second = pipeline.subscribe("second")
+    run(pipeline, lambda: read.calls >= 5)
+
+    samples = first.get_many()
+    assert len(samples) == len(second.get_many()) == pipeline.samples >= 5
+    assert np.all(np.diff([sample.timestamp for sample in samples]) > 0)
+
+
+def test_workers_drain_their_queue_and_read_errors_are_counted():
+    handled = []
+    read = FlakyReader(fail_after=3)
+    pipeline = AcquisitionPipeline(read, 0.01)
+    pipeline.add_worker("storage", handled.extend, poll_interval=0.01)
+    run(pipeline, lambda: read.calls >= 6)
+
+    assert len(handled) == pipeline.samples == 3
+    assert pipeline.read_errors >= 3
+    assert pipeline.stats()["queues"]["storage"]["put"] == 3
+
+
+def test_gap_is_recorded_when_the_device_comes_back():
+    gaps = []
+    read = FlakyReader(fail_after=3, recover_after=8)
+    pipeline = AcquisitionPipeline(read, 0.01, on_gap=gaps.append)
+    run(pipeline, lambda: read.calls > 12)
+
+    assert pipeline.read_errors == 5
+    assert pipeline.stats()["gaps"] == 1
+    assert len(gaps) == 1
+    assert gaps[0].reason == "LabJack disconnected"
+    assert gaps[0].end - gaps[0].start >= 0.04
+
+
+def test_gap_still_open_at_stop_is_recorded():
+    gaps = []
+    read = FlakyReader(fail_after=2)
+    pipeline = AcquisitionPipeline(read, 0.01, on_gap=gaps.append)
+    run(pipeline, lambda: read.calls > 18)
+    stopped = time.time()
+
+    assert pipeline.read_errors >= 16
+    assert pipeline.gaps == 1
+    assert len(gaps) == 1
+    assert gaps[0].reason == "LabJack disconnected"
+    assert abs(gaps[0].end - stopped) < 0.5
+    assert gaps[0].end - gaps[0].start >= 0.15
+
+def test_scheduler_reanchors_on_interval_change():
+    scheduler = DeadlineScheduler(0.01)
+    scheduler.start()
+    first, _ = scheduler.wait()
+    scheduler.set_interval(0.03)
+    second, _ = scheduler.wait()
+    assert abs((second - first) - 0.03) < 1e-6
+
+
+def test_samples_carry_the_adaptive_interval():
+    class Alternating:
+        intervals = [0.01, 0.02]
+
+        def __init__(self):
+            self.calls = 0
+
+        def update(self, timestamp, values):
+            self.calls += 1
+            return self.intervals[self.calls % 2]
+
+    read = FlakyReader(fail_after=10 ** 6)
+    pipeline = AcquisitionPipeline(read, 0.01, rate=Alternating())
+    queue = pipeline.subscribe("store")
+    run(pipeline, lambda: read.calls >= 6)
+
+    samples = queue.get_many()
+    assert [sample.interval for sample in samples[:4]] == [0.01, 0.02, 0.01, 0.02]
+    spacing = np.diff([sample.timestamp for sample in samples[:4]])
+    np.testing.assert_allclose(spacing, [0.02, 0.01, 0.02], atol=1e-6)
@@ -0,0 +1,69 @@
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pytest
+
+from pv_acquisition.pipeline import Sample
+from pv_acquisition.plotting import SEPARATE, HeadlessPlot, create_plot
+
+matplotlib = pytest.importorskip("matplotlib")
+matplotlib.use("Agg")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def samples(start, count, current=2.0, voltage=25.0):
+    return [Sample(start + i, np.array([current, voltage])) for i in range(count)]
+
+
+def test_redraws_are_capped_and_blitted():
+    plot = create_plot(window=10, max_fps=2.0, current_ylim=(0, 5), voltage_ylim=(15, 35))
+    start = time.time()
+    plot.add_samples(samples(start, 3))
+    plot.refresh()
+    # The first frame sets the time axis: full draw
+    assert (plot.full_draws, plot.blits) == (1, 0)
+
+    plot.add_samples(samples(start + 3, 1))
+    plot.refresh()  # within the frame interval: nothing drawn
+    assert (plot.full_draws, plot.blits) == (1, 0)
+
+    plot._last_render -= 1.0
+    plot.refresh()
+    assert (plot.full_draws, plot.blits) == (1, 1)
+    np.testing.assert_allclose(plot.line_voltage.get_ydata(), 25.0)
+    plot.close()
+
+
+def test_data_outside_the_limits_widens_them():
+    plot = create_plot(window=10, max_fps=None, current_ylim=(0, 5), voltage_ylim=(15, 35))
+    start = time.time()
+    plot.add_samples(samples(start, 2))
+    plot.refresh()
+    plot.add_samples(samples(start + 2, 1, voltage=40.0))
+    plot.refresh()
+    assert plot.full_draws == 2
+    assert plot.axes[1].get_ylim()[1] > 40.0
+    assert len(plot.line_current.get_xdata()) == 3
+    plot.close()
+
+
+def test_separate_layout_has_a_figure_per_quantity():
+    plot = create_plot(layout=SEPARATE, max_fps=None)
+    assert len(plot.figures) == 2
+    plot.close()
+    with pytest.raises(ValueError):
+        create_plot(layout="grid")
+
+
+def test_headless_plot_does_not_load_matplotlib():
+    code = ("import sys; from pv_acquisition.plotting import create_plot; "
+            "plot = create_plot(headless=True); plot.add_samples([]); plot.refresh(); plot.close(); "
+            "print('matplotlib' in sys.modules)")
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True,
+                            check=True)
+    assert result.stdout.strip() == "False"
+    assert isinstance(create_plot(headless=True), HeadlessPlot)
@@ -0,0 +1,239 @@
+import os
+import time
+
+import numpy as np
+import pytest
+
+from pv_acquisition.recovery import (Backoff, DeviceUnavailable, DurableStoreWriter, Gap, ReconnectingReader,
+                                     SampleLog)
+from pv_acquisition.simulator import FakeLJM
+from pv_acquisition.store import TimeSeriesStore
+
+T0 = 1686031200000  # 2023-06-06 06:00 UTC in epoch milliseconds
+
+
+def rows(start, count):
+    return [(T0 + 1000 * i, 0.1 * i, 20.0 + i) for i in range(start, start + count)]
+
+
+def test_sample_log_round_trip(tmp_path):
+    log = SampleLog(str(tmp_path / "samples.wal"), fsync=False)
+    log.append_rows(rows(0, 3))
+    log.append_gap(Gap(T0 / 1000 + 3, T0 / 1000 + 10, "USB unplugged"))
+    log.append_rows(rows(10, 2))
+    log.close()
+
+    replayed_rows, replayed_gaps = SampleLog(log.path).replay()
+    assert replayed_rows == rows(0, 3) + rows(10, 2)
+    assert replayed_gaps == [Gap(T0 / 1000 + 3, T0 / 1000 + 10, "USB unplugged")]
+
+
+def test_sample_log_stops_at_a_truncated_tail(tmp_path):
+    path = str(tmp_path / "samples.wal")
+    log = SampleLog(path, fsync=False)
+    log.append_rows(rows(0, 5))
+    log.close()
+    # A crash in the middle of the last record
+    with open(path, "r+b") as file:
+        file.truncate(os.path.getsize(path) - 3)
+
+    replayed_rows, replayed_gaps = SampleLog(path).replay()
+    assert replayed_rows == rows(0, 4)
+    assert replayed_gaps == []
+
+
+def test_sample_log_groups_fsyncs(tmp_path, monkeypatch):
+    synced = []
+    monkeypatch.setattr(os, "fsync", synced.append)
+    log = SampleLog(str(tmp_path / "samples.wal"), fsync_interval=3600)
+    for start in range(4):
+        log.append_rows(rows(start, 1))
+    assert len(synced) == 1
+    # Rows appended since the last sync are synced on close
+    log.close()
+    assert len(synced) == 2
+
+    log = SampleLog(str(tmp_path / "every.wal"))
+    for start in range(3):
+        log.append_rows(rows(start, 1))
+    log.close()
+    assert len(synced) == 5
+
+
+def test_sample_log_truncate_forgets_logged_rows(tmp_path):
+    log = SampleLog(str(tmp_path / "samples.wal"), fsync=False)
+    log.append_rows(rows(0, 5))
+    log.truncate()
+    log.append_rows(rows(5, 1))
+    log.close()
+    assert SampleLog(log.path).replay() == (rows(5, 1), [])
+
+
+def test_durable_writer_replays_only_missing_rows(tmp_path):
+    store = TimeSeriesStore(str(tmp_path / "pv.db"))
+    # The first rows made it to the store before the crash, the log holds them and more
+    store.insert_rows(rows(0, 5))
+    log_path = str(tmp_path / "pv.wal")
+    log = SampleLog(log_path, fsync=False)
+    log.append_rows(rows(0, 8))
+    log.append_gap(Gap(T0 / 1000 + 8, T0 / 1000 + 20, "USB unplugged"))
+    log.close()
+
+    writer = DurableStoreWriter(store, log_path, batch_size=10, flush_interval=0.1).start()
+    assert writer.replayed_rows == 3
+    # The logged gap, and the downtime from the last logged sample to the restart
+    assert writer.replayed_gaps == 2
+    assert writer.recovered_since_ms == T0
+    writer.close()
+
+    timestamps, values = store.query(T0 / 1000, T0 / 1000 + 60)
+    assert timestamps.tolist() == [row[0] for row in rows(0, 8)]
+    np.testing.assert_allclose(values, [row[1:] for row in rows(0, 8)])
+    logged, downtime = store.query_gaps(T0 / 1000, time.time() + 60)
+    assert logged == (T0 + 8000, T0 + 20000, "USB unplugged")
+    assert downtime[0] == T0 + 20000
+    assert downtime[2] == "acquisition interrupted"
+    # A clean close leaves no log to replay
+    assert not os.path.exists(log_path)
+    store.close()
+
+
+def test_durable_writer_commits_logged_rows(tmp_path):
+    store = TimeSeriesStore(str(tmp_path / "pv.db"))
+    writer = DurableStoreWriter(store, str(tmp_path / "pv.wal"), batch_size=2, flush_interval=0.1).start()
+    writer.write_many(rows(0, 5))
+    writer.close()
+    timestamps, _ = store.query(T0 / 1000, T0 / 1000 + 60)
+    assert len(timestamps) == 5
+    store.close()
+
+
+def test_restart_after_a_crash_records_the_downtime(tmp_path):
+    store = TimeSeriesStore(str(tmp_path / "pv.db"))
+    log_path = str(tmp_path / "pv.wal")
+    writer = DurableStoreWriter(store, log_path, batch_size=2, flush_interval=0.1).start()
+    writer.write_many(rows(0, 4))
+    # Everything is committed and the log emptied, then the process dies without close()
+    writer.checkpoint()
+    writer.writer.close()
+    assert os.path.getsize(log_path) == 0
+
+    restarted = DurableStoreWriter(store, log_path).start()
+    restarted.close()
+    assert restarted.recovered_since_ms == T0 + 3000
+    gaps = store.query_gaps(T0 / 1000, time.time() + 60)
+    assert len(gaps) == 1
+    assert gaps[0][0] == T0 + 3000
+    assert gaps[0][1] >= int(time.time() * 1000) - 5000
+    store.close()
+
+
+def test_restart_after_a_clean_close_records_no_gap(tmp_path):
+    store = TimeSeriesStore(str(tmp_path / "pv.db"))
+    log_path = str(tmp_path / "pv.wal")
+    writer = DurableStoreWriter(store, log_path, batch_size=2, flush_interval=0.1).start()
+    writer.write_many(rows(0, 4))
+    writer.close()
+
+    restarted = DurableStoreWriter(store, log_path).start()
+    restarted.close()
+    assert restarted.recovered_since_ms is None
+    assert store.query_gaps(T0 / 1000, time.time() + 60) == []
+    store.close()
+
+
+def test_log_kept_on_a_clean_close_is_not_taken_for_a_crash(tmp_path):
+    path = str(tmp_path / "pv.wal")
+    log = SampleLog(path, fsync=False)
+    log.append_rows(rows(0, 2))
+    log.append_close()
+    log.close()
+
+    replayed = SampleLog(path)
+    assert replayed.replay() == (rows(0, 2), [])
+    assert replayed.closed_at is not None
+
+
+def test_rows_logged_with_fewer_channels_are_padded(tmp_path):
+    log_path = str(tmp_path / "pv.wal")
+    log = SampleLog(log_path, fsync=False)
+    log.append_rows(rows(0, 2))
+    log.close()
+
+    store = TimeSeriesStore(str(tmp_path / "pv.db"), channels=["current", "voltage", "interval_s"])
+    writer = DurableStoreWriter(store, log_path).start()
+    writer.close()
+    assert writer.replayed_rows == 2
+    _, values = store.query(T0 / 1000, T0 / 1000 + 60)
+    assert values[:, :2].tolist() == [list(row[1:]) for row in rows(0, 2)]
+    assert np.isnan(values[:, 2]).all()
+    store.close()
+
+
+def test_log_with_more_channels_than_the_store_is_set_aside(tmp_path):
+    log_path = str(tmp_path / "pv.wal")
+    log = SampleLog(log_path, fsync=False)
+    log.append_rows([(T0, 1.0, 20.0, 5.0)])
+    log.append_rows(rows(1, 2))
+    log.close()
+
+    store = TimeSeriesStore(str(tmp_path / "pv.db"))
+    writer = DurableStoreWriter(store, log_path).start()
+    writer.close()
+    assert writer.replayed_rows == 2
+    assert SampleLog(log_path + ".bad").replay()[0][0] == (T0, 1.0, 20.0, 5.0)
+    # The next start has nothing left to replay
+    restarted = DurableStoreWriter(store, log_path).start()
+    restarted.close()
+    assert restarted.replayed_rows == 0
+    store.close()
+
+
+class UnpluggableLJM(FakeLJM):
+    """FakeLJM whose device can be unplugged: reads and opens then fail."""
+
+    def __init__(self):
+        super().__init__(realtime=False)
+        self.plugged = True
+        self.opens = 0
+
+    def openS(self, *args):
+        self.opens += 1
+        if not self.plugged:
+            raise OSError("LJME_DEVICE_NOT_FOUND")
+        return super().openS(*args)
+
+    def eReadAddresses(self, handle, numFrames, aAddresses, aDataTypes):
+        if not self.plugged:
+            raise OSError("LJME_RECONNECT_FAILED")
+        return super().eReadAddresses(handle, numFrames, aAddresses, aDataTypes)
+
+
+def test_backoff_grows_up_to_the_maximum():
+    backoff = Backoff(initial=0.5, maximum=3.0)
+    assert [backoff.next_delay() for _ in range(5)] == [0.5, 1.0, 2.0, 3.0, 3.0]
+    backoff.reset()
+    assert backoff.next_delay() == 0.5
+
+
+def test_reconnecting_reader_waits_between_attempts():
+    ljm = UnpluggableLJM()
+    reader = ReconnectingReader(ljm, backoff=Backoff(initial=0.05, maximum=0.05))
+    assert len(reader.read()) == 2
+    assert reader.connects == 1
+
+    ljm.plugged = False
+    with pytest.raises(OSError):
+        reader.read()
+    assert not reader.connected and reader.failures == 1
+    with pytest.raises(OSError):
+        reader.read()  # immediate reconnection attempt
+    with pytest.raises(DeviceUnavailable):
+        reader.read()  # within the backoff delay, the device is not touched
+    assert ljm.opens == 2
+
+    ljm.plugged = True
+    time.sleep(0.06)
+    assert len(reader.read()) == 2
+    assert reader.connects == 2 and reader.backoff.attempts == 0
+    reader.close()
@@ -0,0 +1,50 @@
+import numpy as np
+
+from pv_acquisition.ringbuffer import RingBuffer
+
+
+def rows(start, stop):
+    return np.column_stack([np.arange(start, stop), -np.arange(start, stop)]).astype(np.float64)
+
+
+def test_extend_wraps_around():
+    buffer = RingBuffer(5, 2)
+    buffer.extend(rows(0, 3))
+    buffer.extend(rows(3, 7))
+    assert len(buffer) == 5
+    assert buffer.full
+    np.testing.assert_array_equal(buffer.view(), rows(2, 7))
+    np.testing.assert_array_equal(buffer.latest(), rows(6, 7)[0])
+
+
+def test_extend_longer_than_capacity_keeps_the_newest_rows():
+    buffer = RingBuffer(4, 2)
+    buffer.append(rows(0, 1)[0])
+    buffer.extend(rows(1, 11))
+    np.testing.assert_array_equal(buffer.view(), rows(7, 11))
+
+
+def test_append_and_extend_mix_in_order():
+    buffer = RingBuffer(4, 2)
+    for start in range(0, 9, 3):
+        buffer.extend(rows(start, start + 2))
+        buffer.append(rows(start + 2, start + 3)[0])
+    np.testing.assert_array_equal(buffer.view(), rows(5, 9))
+    np.testing.assert_array_equal(buffer.column(0), np.arange(5, 9))
+
+
+def test_view_is_read_only_and_not_copied():
+    buffer = RingBuffer(3, 2)
+    buffer.extend(rows(0, 2))
+    view = buffer.view()
+    assert not view.flags.writeable
+    assert view.base is not None
+
+
+def test_clear_empties_the_buffer():
+    buffer = RingBuffer(3, 2)
+    buffer.extend(rows(0, 5))
+    buffer.clear()
+    assert len(buffer) == 0
+    assert buffer.latest() is None
+    assert buffer.view().shape == (0, 2)
@@ -0,0 +1,73 @@
+import sqlite3
+import time
+
+import numpy as np
+import pytest
+
+from pv_acquisition.simulator import (VOLTAGE_DIVIDER, FakeLJM, RecordedSignal, synthetic_pv_signal,
+                                      time_scaled)
+
+
+def legacy_run(directory, name, samples):
+    """Write a per-run Muhammed_<datetime>.db file with (time, current, voltage) samples."""
+    path = str(directory / f"{name}.db")
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute(f"CREATE TABLE {name} (id INTEGER PRIMARY KEY, timestamp DATETIME, "
+                     "current_amperes REAL, voltage_volts REAL)")
+        conn.executemany(f"INSERT INTO {name} (timestamp, current_amperes, voltage_volts) VALUES (?, ?, ?)",
+                         samples)
+    conn.close()
+    return path
+
+
+def test_recorded_signal_interpolates_and_loops(tmp_path):
+    path = legacy_run(tmp_path, "Muhammed_2023_06_06__05_30_00",
+                      [("2023-06-06 12:00:10.000000", 3.0, 30.0),
+                       ("2023-06-06 12:00:00.000000", 1.0, 20.0),
+                       ("2023-06-06 12:00:05.000000", 2.0, 25.0)])
+    signal = RecordedSignal(path, start=1000.0)
+    # Samples every 5 s, so the loop lasts 15 s
+    assert signal.duration == 15.0
+
+    current = signal(0, np.array([1000.0, 1002.5, 1010.0, 1015.0, 1017.5]))
+    np.testing.assert_allclose(current, [1.0, 1.5, 3.0, 1.0, 1.5])
+    # AIN1 sees the divided voltage, the channel scale of the main scripts gives it back
+    assert signal(1, 1007.5) * VOLTAGE_DIVIDER == pytest.approx(27.5)
+    assert signal(2, 1007.5) == 0.0
+
+
+def test_recorded_runs_are_played_back_to_back(tmp_path):
+    first = legacy_run(tmp_path, "Muhammed_2023_06_06__05_30_00",
+                       [("2023-06-06 12:00:00.000000", 1.0, 20.0),
+                        ("2023-06-06 12:00:01.000000", 1.0, 20.0)])
+    second = legacy_run(tmp_path, "Muhammed_2023_06_07__05_30_00",
+                        [("2023-06-07 08:00:00.000000", 4.0, 30.0),
+                         ("2023-06-07 08:00:01.000000", 4.0, 30.0)])
+    signal = RecordedSignal([first, second], start=0.0)
+    assert signal.duration == 4.0
+    np.testing.assert_allclose(signal(0, np.array([0.0, 1.0, 2.0, 3.0])), [1.0, 1.0, 4.0, 4.0])
+
+
+def test_recording_without_samples_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        RecordedSignal(legacy_run(tmp_path, "Muhammed_2023_06_06__05_30_00", []))
+
+
+def test_time_scaled_plays_the_signal_faster():
+    start = 1686045600.0  # 2023-06-06 10:00 UTC
+    scaled = time_scaled(synthetic_pv_signal, 60, start=start)
+    assert scaled(0, start) == synthetic_pv_signal(0, start)
+    # One minute of the scaled signal is an hour of the original
+    assert scaled(0, start + 60.0) == pytest.approx(synthetic_pv_signal(0, start + 3600.0))
+    np.testing.assert_allclose(scaled(1, start + np.array([30.0, 60.0])),
+                               synthetic_pv_signal(1, start + np.array([1800.0, 3600.0])))
+
+
+def test_read_latency_delays_command_response_reads():
+    ljm = FakeLJM(realtime=False, read_latency=0.02)
+    handle = ljm.openS()
+    ljm.eReadName(handle, "AIN0")
+    started = time.perf_counter()
+    ljm.eReadAddresses(handle, 2, [0, 2], [ljm.constants.FLOAT32] * 2)
+    assert time.perf_counter() - started >= 0.02
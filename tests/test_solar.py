@@ -0,0 +1,111 @@
+import datetime
+import json
+import os
+
+import pytest
+
+pytest.importorskip("ephem")
+
+from pv_acquisition.solar import SolarSchedule
+
+
+def utc(*args):
+    return datetime.datetime(*args, tzinfo=datetime.timezone.utc).timestamp()
+
+
+def schedule(tmp_path, **kwargs):
+    # Fixed site (the installation defaults) with a 5 minute margin
+    return SolarSchedule(cache_dir=str(tmp_path), **kwargs)
+
+
+def test_window_brackets_sunrise_and_sunset(tmp_path):
+    solar = schedule(tmp_path)
+    sunrise, sunset = solar.day(datetime.date(2023, 6, 21))
+    # Summer solstice at 34.0181 N, 5.0078 W: sunrise about 05:09 UTC, sunset about 19:35 UTC
+    assert utc(2023, 6, 21, 5, 4) < sunrise < utc(2023, 6, 21, 5, 14)
+    assert utc(2023, 6, 21, 19, 30) < sunset < utc(2023, 6, 21, 19, 40)
+    assert solar.window(datetime.date(2023, 6, 21)) == (sunrise - 300.0, sunset + 300.0)
+
+
+def test_active_until_and_next_window(tmp_path):
+    solar = schedule(tmp_path)
+    start, end = solar.window(datetime.date(2023, 6, 21))
+    noon = utc(2023, 6, 21, 12)
+    night = utc(2023, 6, 21, 2)
+
+    assert solar.is_active(noon)
+    assert solar.active_until(noon) == end
+    assert solar.active_until(start) == end
+    assert solar.active_until(night) is None
+    assert not solar.is_active(end + 1)
+
+    assert solar.next_window(noon) == (start, end)
+    assert solar.next_window(night) == (start, end)
+    assert solar.next_window(end + 1) == solar.window(datetime.date(2023, 6, 22))
+    assert solar.seconds_until_active(noon) == 0.0
+    assert solar.seconds_until_active(night) == pytest.approx(start - night)
+
+
+def test_next_window_rolls_over_into_the_next_year(tmp_path):
+    solar = schedule(tmp_path)
+    evening = utc(2023, 12, 31, 21)
+    start, end = solar.next_window(evening)
+
+    assert (start, end) == solar.window(datetime.date(2024, 1, 1))
+    assert solar.site_date(start) == datetime.date(2024, 1, 1)
+    assert 6 * 3600 < solar.seconds_until_active(evening) < 12 * 3600
+    assert os.path.exists(solar.cache_file(2023))
+    assert os.path.exists(solar.cache_file(2024))
+
+
+def test_cached_year_is_reused(tmp_path, monkeypatch):
+    first = schedule(tmp_path)
+    window = first.window(datetime.date(2023, 6, 21))
+    path = first.cache_file(2023)
+    with open(path, encoding="utf-8") as file:
+        cached = json.load(file)
+    assert cached["year"] == 2023 and len(cached["days"]) == 365
+    modified = os.path.getmtime(path)
+
+    def compute(year):
+        raise AssertionError("year computed again")
+
+    second = schedule(tmp_path)
+    monkeypatch.setattr(second, "_compute_year", compute)
+    assert second.window(datetime.date(2023, 6, 21)) == window
+    assert os.path.getmtime(path) == modified
+
+
+def test_cache_for_another_site_is_recomputed(tmp_path):
+    solar = schedule(tmp_path)
+    path = solar.cache_file(2023)
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump({"latitude": "0.0", "longitude": "0.0", "year": 2023,
+                   "days": {"2023-06-21": [0.0, 1.0]}}, file)
+
+    calls = []
+    compute = solar._compute_year
+    solar._compute_year = lambda year: calls.append(year) or compute(year)
+    sunrise, _ = solar.day(datetime.date(2023, 6, 21))
+
+    assert calls == [2023]
+    assert sunrise > utc(2023, 6, 21)
+    with open(path, encoding="utf-8") as file:
+        assert json.load(file)["latitude"] == solar.latitude
+
+
+def test_polar_night_has_no_window(tmp_path):
+    solar = schedule(tmp_path, latitude="78.2", longitude="15.6")
+    assert solar.window(datetime.date(2023, 12, 21)) is None
+    assert solar.active_until(utc(2023, 12, 21, 12)) is None
+    start, _ = solar.next_window(utc(2023, 12, 21, 12))
+    assert datetime.date(2024, 1, 1) < solar.site_date(start) < datetime.date(2024, 4, 1)
+
+
+def test_sun_event_distance(tmp_path):
+    solar = schedule(tmp_path)
+    sunrise, sunset = solar.day(datetime.date(2023, 6, 21))
+    assert solar.sun_event_distance(sunrise + 600) == pytest.approx(600)
+    assert solar.sun_event_distance(sunset - 60) == pytest.approx(60)
+    noon = utc(2023, 6, 21, 12)
+    assert solar.sun_event_distance(noon) == pytest.approx(min(noon - sunrise, sunset - noon))
@@ -0,0 +1,98 @@
+import sqlite3
+import time
+
+from pv_acquisition.storage import BatchWriter, BufferedSQLiteWriter
+
+
+def rows(count):
+    return [(f"2023-06-06 12:00:{i:02d}", 0.1 * i, 20.0 + i) for i in range(count)]
+
+
+def stored(path, table):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(f"SELECT timestamp, current_amperes, voltage_volts FROM {table} "
+                            "ORDER BY id").fetchall()
+    finally:
+        conn.close()
+
+
+def lock_table(path, table):
+    """Make inserts into table fail until unlock() deletes the lock row."""
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute(f"CREATE TABLE {table} (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp DATETIME, "
+                     "current_amperes REAL, voltage_volts REAL)")
+        conn.execute("CREATE TABLE lock (locked INTEGER)")
+        conn.execute("INSERT INTO lock VALUES (1)")
+        conn.execute(f"CREATE TRIGGER refuse BEFORE INSERT ON {table} WHEN EXISTS (SELECT 1 FROM lock) "
+                     "BEGIN SELECT RAISE(ABORT, 'database is locked'); END")
+
+    def unlock():
+        with conn:
+            conn.execute("DELETE FROM lock")
+        conn.close()
+    return unlock
+
+
+def test_rows_are_committed_in_batches(tmp_path):
+    path = str(tmp_path / "run.db")
+    with BufferedSQLiteWriter(path, "Muhammed_run", batch_size=4, flush_interval=60) as writer:
+        for row in rows(10):
+            writer.write(row)
+        assert writer.flush(timeout=5)
+        # Two full batches of 4, then the flush commits the last 2
+        assert writer.flush_count == 3
+        assert writer.rows_written == 10
+    assert stored(path, "Muhammed_run") == rows(10)
+
+    conn = sqlite3.connect(path)
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    conn.close()
+
+
+def test_rows_are_committed_after_the_flush_interval(tmp_path):
+    path = str(tmp_path / "run.db")
+    with BufferedSQLiteWriter(path, "Muhammed_run", batch_size=500, flush_interval=0.1) as writer:
+        writer.write_many(rows(3))
+        deadline = time.monotonic() + 5
+        while writer.rows_written < 3 and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert writer.rows_written == 3
+    assert stored(path, "Muhammed_run") == rows(3)
+
+
+def test_failed_commit_is_retried(tmp_path):
+    path = str(tmp_path / "run.db")
+    unlock = lock_table(path, "Muhammed_run")
+    writer = BufferedSQLiteWriter(path, "Muhammed_run", batch_size=2, flush_interval=60).start()
+    writer.write_many(rows(2))  # a full batch, whose commit fails
+    assert writer.flush(timeout=5)
+    assert writer.errors == 2 and writer.rows_written == 0
+    unlock()
+    writer.write(rows(3)[2])
+    writer.close()
+    assert writer.rows_written == 3
+    assert isinstance(writer.last_error, sqlite3.IntegrityError)
+    assert stored(path, "Muhammed_run") == rows(3)
+
+
+def test_batch_writer_retries_a_failed_batch():
+    committed = []
+    failures = [OSError("database is locked")]
+
+    def write_rows(conn, rows):
+        if failures:
+            raise failures.pop()
+        committed.extend(rows)
+
+    writer = BatchWriter(lambda: sqlite3.connect(":memory:"), write_rows, batch_size=2,
+                         flush_interval=60).start()
+    writer.write_many([(1, 0.5), (2, 0.6)])  # a full batch, whose first commit fails
+    assert writer.flush(timeout=5)
+    assert writer.errors == 1
+    assert committed == [(1, 0.5), (2, 0.6)]
+    writer.write((3, 0.7))
+    writer.close()
+    assert committed == [(1, 0.5), (2, 0.6), (3, 0.7)]
+    assert writer.rows_written == 3 and writer.buffered == 0
@@ -0,0 +1,184 @@
+import datetime
+import sqlite3
+
+import numpy as np
+import pytest
+
+from pv_acquisition.aggregate import AggregationEngine
+from pv_acquisition.store import DAILY, MONTHLY, TimeSeriesStore, import_legacy_db, to_epoch_ms
+
+
+def utc(*args):
+    return datetime.datetime(*args, tzinfo=datetime.timezone.utc).timestamp()
+
+
+def test_query_spans_daily_partitions(tmp_path):
+    store = TimeSeriesStore(str(tmp_path / "pv.db"), partition=DAILY)
+    # Samples every 6 hours over three days
+    timestamps = utc(2023, 6, 6) + 6 * 3600.0 * np.arange(12)
+    values = np.column_stack([np.arange(12) * 0.5, 20.0 + np.arange(12)])
+    store.insert(timestamps, values)
+    assert store.partitions_between(0, 2 ** 62) == ["samples_20230606", "samples_20230607",
+                                                    "samples_20230608"]
+
+    start, end = utc(2023, 6, 6, 12), utc(2023, 6, 8, 6)
+    ts_ms, result = store.query(start, end)
+    expected = (timestamps >= start) & (timestamps < end)
+    np.testing.assert_array_equal(ts_ms, np.round(timestamps[expected] * 1000).astype(np.int64))
+    np.testing.assert_allclose(result, values[expected])
+    store.close()
+
+
+def test_query_spans_monthly_partitions_and_selects_channels(tmp_path):
+    store = TimeSeriesStore(str(tmp_path / "pv.db"), partition=MONTHLY)
+    timestamps = np.array([utc(2023, 5, 31, 23, 59), utc(2023, 6, 1), utc(2023, 6, 30, 12),
+                           utc(2023, 7, 1, 0, 0, 1)])
+    store.insert(timestamps, np.column_stack([[1.0, 2.0, 3.0, 4.0], [10.0, 20.0, 30.0, 40.0]]))
+
+    ts_ms, result = store.query(utc(2023, 5, 31), utc(2023, 7, 2), channels=["voltage"])
+    assert len(ts_ms) == 4
+    assert result.tolist() == [[10.0], [20.0], [30.0], [40.0]]
+    assert np.all(np.diff(ts_ms) > 0)
+
+    ts_ms, result = store.query(utc(2023, 6, 1), utc(2023, 7, 1))
+    assert result[:, 0].tolist() == [2.0, 3.0]
+    store.close()
+
+
+def test_query_of_an_empty_range(tmp_path):
+    store = TimeSeriesStore(str(tmp_path / "pv.db"))
+    ts_ms, values = store.query(utc(2023, 6, 6), utc(2023, 6, 7))
+    assert ts_ms.shape == (0,)
+    assert values.shape == (0, 2)
+    with pytest.raises(KeyError):
+        store.query(utc(2023, 6, 6), utc(2023, 6, 7), channels=["power"])
+    store.close()
+
+
+def test_new_channel_is_added_to_existing_partitions(tmp_path):
+    path = str(tmp_path / "pv.db")
+    store = TimeSeriesStore(path)
+    store.insert([utc(2023, 6, 6, 12)], [[1.0, 20.0]])
+    store.close()
+
+    store = TimeSeriesStore(path, channels=["current", "voltage", "interval_s"])
+    store.insert([utc(2023, 6, 6, 13)], [[2.0, 21.0, 5.0]])
+    _, values = store.query(utc(2023, 6, 6), utc(2023, 6, 7), channels=["interval_s"])
+    assert np.isnan(values[0, 0])
+    assert values[1, 0] == 5.0
+    store.close()
+
+
+def test_existing_store_keeps_its_partition_scheme(tmp_path):
+    path = str(tmp_path / "pv.db")
+    store = TimeSeriesStore(path, partition=DAILY)
+    store.insert([utc(2023, 6, 6, 12)], [[1.0, 20.0]])
+    store.close()
+
+    # Opened with the defaults, as export does
+    store = TimeSeriesStore(path, channels=())
+    assert store.partition == DAILY
+    store.insert([utc(2023, 6, 7, 12)], [[2.0, 21.0]])
+    assert store.partitions_between(0, 2 ** 62) == ["samples_20230606", "samples_20230607"]
+    store.close()
+
+
+def test_store_writer_batches_rows_into_partitions(tmp_path):
+    store = TimeSeriesStore(str(tmp_path / "pv.db"))
+    t0 = int(utc(2023, 6, 30, 23, 59) * 1000)
+    with store.writer(batch_size=3, flush_interval=0.1) as writer:
+        writer.write_many([(t0 + 30000 * i, 1.0, 20.0) for i in range(5)])
+        assert writer.flush(timeout=5)
+        assert writer.rows_written == 5
+    assert store.partitions_between(0, 2 ** 62) == ["samples_202306", "samples_202307"]
+    store.close()
+
+
+def test_to_epoch_ms_accepts_seconds_datetimes_and_datetime64():
+    moment = datetime.datetime(2023, 6, 6, 12, tzinfo=datetime.timezone.utc)
+    assert to_epoch_ms(moment) == 1686052800000
+    assert to_epoch_ms(1686052800.0015) == 1686052800002
+    assert to_epoch_ms(np.array(["2023-06-06T12:00:00.250"], dtype="datetime64[ms]")).tolist() == [
+        1686052800250]
+    assert to_epoch_ms(np.array([1.0, 2.5])).tolist() == [1000, 2500]
+
+
+def test_import_legacy_db(tmp_path):
+    path = str(tmp_path / "Muhammed_2023_06_06__05_30_00.db")
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute("CREATE TABLE Muhammed_2023_06_06__05_30_00 (id INTEGER PRIMARY KEY, "
+                     "timestamp DATETIME, current_amperes REAL, voltage_volts REAL)")
+        conn.executemany("INSERT INTO Muhammed_2023_06_06__05_30_00 (timestamp, current_amperes, "
+                         "voltage_volts) VALUES (?, ?, ?)",
+                         [("2023-06-06 12:00:05.000000", 2.5, 24.0),
+                          ("2023-06-06 12:00:00.000000", 2.4, 23.9)])
+    conn.close()
+
+    store = TimeSeriesStore(str(tmp_path / "pv.db"), channels=["voltage", "current"])
+    assert import_legacy_db(store, path) == 2
+    ts_ms, values = store.query(0, 2 ** 40)
+    start = datetime.datetime(2023, 6, 6, 12).timestamp()  # local time, like the old scripts
+    assert ts_ms.tolist() == [round(start * 1000), round(start * 1000) + 5000]
+    assert values.tolist() == [[23.9, 2.4], [24.0, 2.5]]
+    store.close()
+
+
+def test_aggregates_round_trip(tmp_path):
+    store = TimeSeriesStore(str(tmp_path / "pv.db"))
+    engine = AggregationEngine(periods=(60,))
+    records = engine.add_block(np.arange(0.0, 120.0), np.ones((120, 2))) + engine.flush()
+    store.write_aggregates(records)
+    assert store.query_aggregates(3600, 0, 10 ** 6) == {}
+
+    minutes = store.query_aggregates(60, 0, 200)
+    assert minutes["start_ms"].tolist() == [0, 60000]
+    assert minutes["count"].tolist() == [60, 60]
+    assert minutes["power_mean"].tolist() == [1.0, 1.0]
+    # replace=True overwrites a bucket instead of merging into it
+    store.write_aggregates([records[1]._replace(count=5, current_max=2.0)], replace=True)
+    minutes = store.query_aggregates(60, 0, 200)
+    assert minutes["count"].tolist() == [60, 5]
+    assert minutes["current_max"].tolist() == [1.0, 2.0]
+    store.close()
+
+
+def test_bucket_written_again_is_merged(tmp_path):
+    store = TimeSeriesStore(str(tmp_path / "pv.db"))
+    timestamps = utc(2023, 6, 6, 12) + np.arange(60.0)
+    values = np.column_stack([np.linspace(1.0, 2.0, 60), np.full(60, 20.0)])
+    # The minute is split by a restart: each run flushes its part of the bucket
+    for part in (slice(0, 25), slice(25, 60)):
+        engine = AggregationEngine(periods=(60,))
+        engine.add_block(timestamps[part], values[part])
+        store.write_aggregates(engine.flush())
+
+    engine = AggregationEngine(periods=(60,))
+    engine.add_block(timestamps, values)
+    whole = engine.flush()[0]
+    stored = store.query_aggregates(60, timestamps[0], timestamps[-1] + 1)
+    assert stored["count"].tolist() == [60]
+    for field in ("current_min", "current_max", "current_mean", "voltage_mean", "power_max"):
+        assert stored[field][0] == pytest.approx(getattr(whole, field))
+    # Only the interval across the restart is not integrated
+    assert stored["energy_wh"][0] == pytest.approx(whole.energy_wh * 58 / 59, rel=1e-2)
+    store.close()
+
+
+def test_rebuild_aggregates_from_samples(tmp_path):
+    store = TimeSeriesStore(str(tmp_path / "pv.db"))
+    timestamps = utc(2023, 6, 6, 12) + 5.0 * np.arange(24)  # two minutes
+    values = np.column_stack([np.full(24, 2.0), np.full(24, 30.0)])
+    store.insert(timestamps, values)
+    # The first minute was merged twice; the rebuild replaces it
+    store.write_aggregates(store.rebuild_aggregates(timestamps[0], timestamps[4] + 0.001)[:1])
+    records = store.rebuild_aggregates(timestamps[5], timestamps[-1] + 0.001)
+
+    assert [record.period for record in records] == [60, 60, 3600]
+    minutes = store.query_aggregates(60, timestamps[0], timestamps[-1] + 1)
+    assert minutes["count"].tolist() == [12, 12]
+    assert minutes["power_mean"].tolist() == [60.0, 60.0]
+    hour = store.query_aggregates(3600, timestamps[0], timestamps[-1] + 1)
+    assert hour["count"].tolist() == [24]
+    assert hour["energy_wh"][0] == pytest.approx(60.0 * 115 / 3600)
+    store.close()
@@ -0,0 +1,120 @@
+import json
+import time
+
+import numpy as np
+import pytest
+
+from pv_acquisition import cli, device
+from pv_acquisition.simulator import FakeLJM
+from pv_acquisition.store import TimeSeriesStore
+from pv_acquisition.supervisor import (DeviceSupervisor, device_config, load_device_configs,
+                                       supervise_into_store)
+
+
+class FailingWriter:
+    """write_rows that raises ``failures`` times, then keeps the rows."""
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.rows = []
+
+    def __call__(self, rows):
+        if self.failures > 0:
+            self.failures -= 1
+            raise OSError("disk full")
+        self.rows.extend(rows)
+
+
+def test_rows_are_merged_and_late_devices_become_nan():
+    rows = []
+    devices = [device_config("a", interval=1.0), device_config("b", interval=1.0)]
+    supervisor = DeviceSupervisor(None, devices, rows.extend, merge_delay=2.0)
+    assert supervisor.columns == ["a_current", "a_voltage", "b_current", "b_voltage"]
+
+    now_ms = int(time.time()) * 1000
+    supervisor._add(devices[1], now_ms, [2.0, 21.0])
+    supervisor._add(devices[0], now_ms, [1.0, 20.0])
+    assert rows == [(now_ms, 1.0, 20.0, 2.0, 21.0)]
+
+    old_ms = now_ms - 5000  # older than merge_delay, written without device b
+    supervisor._add(devices[0], old_ms, [3.0, 22.0])
+    assert rows[1][:3] == (old_ms, 3.0, 22.0)
+    assert np.isnan(rows[1][3:]).all()
+    assert supervisor.rows_written == 2
+
+
+def test_expected_devices_follow_their_interval():
+    devices = [device_config("fast", interval=1.0), device_config("slow", interval=5.0)]
+    supervisor = DeviceSupervisor(None, devices, None)
+    assert supervisor._expected(10000) == 2
+    assert supervisor._expected(11000) == 1
+
+
+def test_duplicate_device_names_are_rejected():
+    with pytest.raises(ValueError):
+        DeviceSupervisor(None, [device_config("a"), device_config("a")], None)
+
+
+def test_load_device_configs(tmp_path):
+    path = tmp_path / "devices.json"
+    path.write_text(json.dumps([
+        {"name": "east", "identifier": 470012345, "interval": 2,
+         "channels": [{"name": "irradiance", "ain": 2, "scale": 1000.0, "unit": "W/m2"}]},
+        {"name": "west"},
+    ]))
+    east, west = load_device_configs(str(path))
+    assert (east.identifier, east.interval, east.channels.names) == ("470012345", 2.0, ["irradiance"])
+    assert east.channels.scales.tolist() == [1000.0]
+    assert (west.identifier, west.interval, west.channels.names) == ("ANY", 5.0, ["current", "voltage"])
+
+
+def test_devices_are_supervised_into_a_store(tmp_path):
+    devices = [device_config("east", interval=0.2), device_config("west", interval=0.2)]
+    database = str(tmp_path / "plant.db")
+    supervisor = supervise_into_store(FakeLJM(), devices, database, duration=1.5)
+    stats = supervisor.stats()
+    assert stats["pending"] == 0
+    assert all(device["connected"] is False and device["samples"] >= 3
+               for device in stats["devices"].values())
+
+    store = TimeSeriesStore(database, channels=())
+    timestamps, values = store.query(0, 2e9)
+    store.close()
+    assert len(timestamps) == supervisor.rows_written >= 3
+    assert np.all(np.diff(timestamps) == 200)
+    assert values.shape[1] == 4
+
+
+def test_rows_stay_pending_until_written():
+    writer = FailingWriter(failures=1)
+    devices = [device_config("a", interval=1.0), device_config("b", interval=1.0)]
+    supervisor = DeviceSupervisor(None, devices, writer)
+
+    ts_ms = (int(time.time()) + 10) * 1000  # recent, so only complete rows are written
+    supervisor._add(devices[0], ts_ms, [1.0, 20.0])
+    assert supervisor.stats()["pending"] == 1
+    supervisor._add(devices[1], ts_ms, [2.0, 21.0])  # complete row, the write fails
+    assert supervisor.rows_written == 0
+    assert supervisor.stats()["pending"] == 1
+
+    supervisor._emit(force=True)
+    assert supervisor.rows_written == 1
+    assert supervisor.stats()["pending"] == 0
+    assert writer.rows == [(ts_ms, 1.0, 20.0, 2.0, 21.0)]
+
+
+def test_supervise_command(tmp_path, monkeypatch):
+    monkeypatch.setattr(device, "load_ljm", FakeLJM)
+    config = tmp_path / "devices.json"
+    config.write_text(json.dumps([{"name": "east", "interval": 0.2}, {"name": "west", "interval": 0.2}]))
+    database = str(tmp_path / "plant.db")
+
+    cli.main(["supervise", str(config), "--database", database, "--duration", "1.5"])
+
+    store = TimeSeriesStore(database, channels=())
+    timestamps, values = store.query(0, 2e9)
+    assert store.channels == ["east_current", "east_voltage", "west_current", "west_voltage"]
+    store.close()
+    assert len(timestamps) >= 3
+    assert np.all(np.diff(timestamps) == 200)
+    assert not np.isnan(values[1:-1]).any()